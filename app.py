@@ -1,26 +1,188 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-import io
-import matplotlib.pyplot as plt
-import seaborn as sns
-from db_config import init_db, connect_db
-from data_operations import get_ventes, get_produits, get_clients, insert_vente, insert_produit, insert_client
-from visualizations import plot_ventes_par_periode, plot_top_produits, plot_repartition
-
-# Initialisation de la base de données
-init_db()
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import TimeoutError as DelaiDepasse, wait
+from data_operations import (get_page_ventes, cle_page, get_bornes_dates, get_produits, get_clients, insert_vente,
+                             insert_produit, insert_client, agreger_par_periode, agreger_top_produits,
+                             agreger_repartition, get_kpis, rechercher_produits, rechercher_clients, estimer_kpis,
+                             estimer_par_periode, estimer_top_produits, estimer_repartition, classement_clients,
+                             classement_produits, historique_client, CRITERES_CLASSEMENT)
+from db_config import TAUX_ECHANTILLON
+from export import FORMATS_EXPORT, exporter_ventes
+from import_donnees import importer_fichier
+from instrumentation import demarrer_execution, mesurer, terminer_execution
+from precalcul import FENETRES, affiner, bornes_fenetre, demarrer_precalcul, etat_precalcul
+from visualizations import (plot_ventes_par_periode, plot_top_produits, plot_repartition, plot_par_produit,
+                            rendre_en_cache)
+
+# Choix de période libre dans la barre latérale (les autres fenêtres sont précalculées)
+FENETRE_PERSONNALISEE = "Personnalisée"
+
+# Modes de rendu des graphiques
+RENDU_IMAGE = "Matplotlib (image)"
+RENDU_NATIF = "Natif (vectoriel)"
+
+# Taille maximale d'un export servi par le bouton de téléchargement : le fichier est envoyé au
+# navigateur en un seul message, entièrement en mémoire (limite server.maxMessageSize de Streamlit)
+TAILLE_MAX_TELECHARGEMENT = 200 * 1024 * 1024
+
+# Erreurs d'écriture affichées à l'utilisateur : données invalides, file d'écriture saturée, base verrouillée
+ERREURS_ECRITURE = (ValueError, DelaiDepasse, sqlite3.OperationalError)
 
 
 # --- Fonctions utilitaires ---
-@st.cache_data
-def convert_to_excel(df):
-    """Convertit un DataFrame en fichier Excel pour le téléchargement"""
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False)
-    output.seek(0)
-    return output
+def preparer_export(format_export, filtres):
+    """Génère le fichier d'export dans un fichier temporaire, à la demande uniquement"""
+    extension, _ = FORMATS_EXPORT[format_export]
+    with tempfile.NamedTemporaryFile(suffix=f".{extension}", delete=False) as fichier:
+        chemin = fichier.name
+    try:
+        with mesurer(f"export.{extension}") as span:
+            exporter_ventes(format_export, chemin, **filtres)
+            span.attributs['octets'] = os.path.getsize(chemin)
+    except BaseException:
+        os.remove(chemin)
+        raise
+    return chemin
+
+
+def afficher_graphique(fonction_plot, donnees, *args, serie_native=None, **kwargs):
+    """Affiche un graphique à partir de données agrégées et retourne le tableau associé
+
+    En rendu natif, les données sont tracées par Streamlit côté navigateur (vectoriel) ;
+    sinon l'image matplotlib est rendue une fois puis servie depuis le cache de figures.
+    """
+    if serie_native is not None and st.session_state.get("rendu_graphiques") == RENDU_NATIF:
+        st.bar_chart(serie_native)
+        return donnees
+
+    image, tableau = rendre_en_cache(fonction_plot, donnees, *args, **kwargs)
+    if image is not None:
+        st.image(image)
+    return tableau
+
+
+def calculer(affinages, fonction, estimation, *args, **kwargs):
+    """Retourne (résultat, estimé) : le résultat exact s'il est déjà connu ; en aperçu rapide,
+    sinon, l'estimation sur échantillon, le calcul exact étant lancé en arrière-plan
+
+    Le résultat d'un calcul exact terminé est affiché tel quel au rerun suivant, même si des
+    écritures ont changé la version des données entre-temps : sous un flux continu de ventes,
+    le cache ne le retrouverait jamais et l'aperçu relancerait le calcul indéfiniment.
+    """
+    if not st.session_state.get("apercu"):
+        return fonction(*args, **kwargs), False
+    trouve, valeur = fonction.consulter(*args, **kwargs)
+    if trouve:
+        return valeur, False
+    exacts = st.session_state.setdefault("valeurs_exactes", {})
+    cle = repr((fonction.__name__, args, sorted(kwargs.items())))
+    future = exacts.get(cle)
+    if future is not None and future.done() and future.exception() is None:
+        # Affiché pendant ce rerun puis oublié par attendre_affinages
+        return future.result(), False
+    if future is None or future.done():
+        future = exacts[cle] = affiner(fonction, *args, **kwargs)
+    affinages.append(future)
+    return estimation(*args, **kwargs), True
+
+
+def legende_estimation(estime):
+    if estime:
+        st.caption("⚡ Valeurs estimées sur échantillon — barres d'erreur et colonnes *_marge : "
+                   "intervalle de confiance à 95 %. Valeurs exactes en cours de calcul.")
+
+
+def attendre_affinages(affinages):
+    """Attend les calculs exacts lancés par l'aperçu rapide, puis réaffiche avec les valeurs exactes
+
+    L'aperçu est déjà envoyé au navigateur pendant l'attente ; toute interaction de
+    l'utilisateur interrompt l'attente au profit du nouveau rerun, qui réaffiche une seule fois
+    les résultats terminés (voir calculer).
+    """
+    # Résultats exacts déjà affichés, ou lancés pour des filtres abandonnés depuis
+    exacts = st.session_state.get("valeurs_exactes", {})
+    for cle in [cle for cle, future in exacts.items() if future not in affinages]:
+        del exacts[cle]
+    if not affinages:
+        return
+    statut = st.sidebar.empty()
+    debut = time.monotonic()
+    while wait(affinages, timeout=0.25).not_done:
+        statut.caption(f"⏳ Calcul des valeurs exactes… {time.monotonic() - debut:.0f} s")
+    statut.empty()
+    erreurs = [future.exception() for future in affinages if future.exception() is not None]
+    if erreurs:
+        st.sidebar.error(f"Erreur lors du calcul des valeurs exactes : {erreurs[0]}")
+        return
+    st.rerun()
+
+
+def afficher_page_ventes(filtres, nb_total):
+    """Affiche les ventes filtrées page par page : seule la page visible est lue en base"""
+    col_tri, col_ordre, col_taille = st.columns(3)
+    tri = col_tri.selectbox("Trier par", ["date_vente", "id"],
+                            format_func=lambda x: "Date" if x == "date_vente" else "Identifiant")
+    descendant = col_ordre.selectbox("Ordre", ["Décroissant", "Croissant"]) == "Décroissant"
+    taille_page = col_taille.selectbox("Lignes par page", [50, 100, 500], index=1)
+
+    # Pile des clés de début de page, réinitialisée dès que les filtres ou le tri changent
+    signature = (repr(sorted(filtres.items())), tri, descendant, taille_page)
+    if st.session_state.get("pagination_signature") != signature:
+        st.session_state["pagination_signature"] = signature
+        st.session_state["pagination_cles"] = [None]
+    cles = st.session_state["pagination_cles"]
+
+    df_page = get_page_ventes(cles[-1], taille_page, tri, descendant, **filtres)
+    cle_suivante = cle_page(df_page, tri)
+    df_page['date_vente'] = pd.to_datetime(df_page['date_vente'], errors='coerce')
+    st.dataframe(df_page, height=300)
+
+    nb_pages = max(1, -(-nb_total // taille_page))
+    col_prec, col_info, col_suiv = st.columns([1, 2, 1])
+    col_info.caption(f"Page {len(cles)} / {nb_pages} — {nb_total:,} ventes")
+    if col_prec.button("◀ Précédente", disabled=len(cles) == 1):
+        cles.pop()
+        st.rerun()
+    if col_suiv.button("Suivante ▶", disabled=len(df_page) < taille_page or len(cles) >= nb_pages):
+        cles.append(cle_suivante)
+        st.rerun()
+
+
+def afficher_panneau_diagnostic():
+    """Panneau d'administration : chronologie des mesures du rerun courant et profil cProfile"""
+    spans, rapport_profil = terminer_execution()
+    with st.sidebar.expander("⏱️ Diagnostic des performances"):
+        etat = etat_precalcul()
+        if not etat['actif']:
+            st.caption("Précalcul des agrégats désactivé (VENTES_PRECALCUL=0).")
+        elif etat['erreur']:
+            st.caption(f"Précalcul des agrégats en échec : {etat['erreur']}")
+        elif etat['duree_s'] is not None:
+            st.caption(f"Agrégats précalculés : {etat['resultats']} résultats en {etat['duree_s'] * 1000:.0f} ms")
+        st.checkbox("Mesurer les temps d'exécution", key="diagnostic")
+        st.checkbox("Profiler avec cProfile", key="profilage", disabled=not st.session_state.get("diagnostic"))
+        if spans.empty:
+            st.caption("Activez la mesure pour voir la chronologie du prochain affichage.")
+            return
+
+        import matplotlib.pyplot as plt
+
+        fig, ax = plt.subplots(figsize=(4, 0.3 * len(spans) + 1))
+        ax.barh(range(len(spans)), spans['duree_ms'], left=spans['debut_ms'], color='skyblue')
+        ax.set_yticks(range(len(spans)), spans['nom'], fontsize=7)
+        ax.invert_yaxis()
+        ax.set_xlabel("ms depuis le début du rerun")
+        plt.tight_layout()
+        st.pyplot(fig)
+        plt.close(fig)
+        st.dataframe(spans.drop(columns=['debut_ms']).round(2), hide_index=True)
+        if rapport_profil:
+            st.code(rapport_profil)
 
 
 def login():
@@ -47,29 +209,30 @@ def main():
         login()
         return
 
+    demarrer_execution(st.session_state.get("diagnostic", False), st.session_state.get("profilage", False))
+    demarrer_precalcul()
+
     st.title("📊 Dashboard Analyse des Ventes")
 
     # Onglets
     tabs = ["📈 Tableau de bord", "➕ Ajouter des données", "🔍 Analyse approfondie"]
     selected_tab = st.sidebar.radio("Navigation", tabs)
+    st.sidebar.radio("Rendu des graphiques", [RENDU_IMAGE, RENDU_NATIF], key="rendu_graphiques")
 
-    # Récupération des données
-    df_ventes = get_ventes()
+    # Récupération des données de référence
     df_produits = get_produits()
     df_clients = get_clients()
 
     # Filtres communs
-    with st.sidebar:
+    with st.sidebar, mesurer("filtres"):
         st.header("🔍 Filtres")
 
         # Filtre de date - Version sécurisée
         try:
-            df_ventes['date_vente'] = pd.to_datetime(df_ventes['date_vente'], errors='coerce')
-            df_ventes = df_ventes.dropna(subset=['date_vente'])
-
-            if not df_ventes.empty:
-                min_date = df_ventes['date_vente'].min().date()
-                max_date = df_ventes['date_vente'].max().date()
+            min_date, max_date = get_bornes_dates()
+            if min_date is not None and max_date is not None:
+                min_date = pd.to_datetime(min_date).date()
+                max_date = pd.to_datetime(max_date).date()
             else:
                 min_date = datetime.now().date() - pd.Timedelta(days=30)
                 max_date = datetime.now().date()
@@ -79,129 +242,122 @@ def main():
             min_date = datetime.now().date() - pd.Timedelta(days=30)
             max_date = datetime.now().date()
 
-        date_range = st.date_input("Période", [min_date, max_date])
-
-        if not df_ventes.empty:
-            selected_cat = st.multiselect("Catégories", df_ventes["categorie"].unique())
-            selected_prod = st.multiselect("Produits", df_ventes["produit"].unique())
-            selected_client = st.multiselect("Clients", df_ventes["client"].dropna().unique())
+        fenetre = st.selectbox("Fenêtre", [FENETRE_PERSONNALISEE] + FENETRES)
+        bornes = bornes_fenetre(fenetre) if fenetre != FENETRE_PERSONNALISEE else None
+        if bornes is not None:
+            date_range = list(bornes)
+            st.caption(f"Du {bornes[0]:%d/%m/%Y} au {bornes[1]:%d/%m/%Y}")
+        else:
+            date_range = st.date_input("Période", [min_date, max_date])
+        st.checkbox("⚡ Aperçu rapide", key="apercu",
+                    help=f"Estime d'abord KPI et graphiques sur un échantillon de {TAUX_ECHANTILLON:.0%} des ventes, "
+                         "puis affiche les valeurs exactes dès qu'elles sont calculées")
+
+        if not df_produits.empty:
+            selected_cat = st.multiselect("Catégories", sorted(df_produits["categorie"].unique()))
+            selected_prod = st.multiselect("Produits", sorted(df_produits["nom"].unique()))
+            selected_client = st.multiselect("Clients", sorted(df_clients["nom"].dropna().unique()))
         else:
             selected_cat = []
             selected_prod = []
             selected_client = []
             st.warning("Aucune donnée disponible pour les filtres")
 
-    # Application des filtres
-    filtered_df = df_ventes.copy()
-
-    if len(date_range) == 2 and not df_ventes.empty:
-        try:
-            filtered_df = filtered_df[
-                (filtered_df['date_vente'].dt.date >= date_range[0]) &
-                (filtered_df['date_vente'].dt.date <= date_range[1])
-                ]
-        except Exception as e:
-            st.error(f"Erreur lors du filtrage par date : {str(e)}")
-            filtered_df = df_ventes.copy()
+    # Application des filtres directement dans la requête SQL
+    filtres = {
+        'categories': selected_cat,
+        'produits': selected_prod,
+        'clients': selected_client,
+    }
+    if len(date_range) == 2:
+        filtres['date_debut'], filtres['date_fin'] = date_range
 
-    if selected_cat:
-        filtered_df = filtered_df[filtered_df["categorie"].isin(selected_cat)]
-    if selected_prod:
-        filtered_df = filtered_df[filtered_df["produit"].isin(selected_prod)]
-    if selected_client:
-        filtered_df = filtered_df[filtered_df["client"].isin(selected_client)]
+    # Calculs exacts lancés en arrière-plan par l'aperçu rapide pendant ce rerun
+    affinages = []
 
     # Onglet Tableau de bord
     if selected_tab == tabs[0]:
         # KPI
-        total_ventes = filtered_df['montant'].sum()
-        total_quantite = filtered_df['quantite'].sum()
-        avg_vente = filtered_df['montant'].mean()
+        kpis, estime = calculer(affinages, get_kpis, estimer_kpis, **filtres)
+        total_ventes = kpis['total_ventes']
+        total_quantite = int(round(kpis['total_quantite']))
+        avg_vente = kpis['moyenne_vente']
 
+        approx = "≈ " if estime else ""
         col1, col2, col3 = st.columns(3)
-        col1.metric("💰 Total ventes", f"{total_ventes:,.2f} €")
-        col2.metric("📦 Quantité vendue", f"{total_quantite:,}")
-        col3.metric("📊 Moyenne par vente", f"{avg_vente:,.2f} €")
+        col1.metric("💰 Total ventes", f"{approx}{total_ventes:,.2f} €")
+        col2.metric("📦 Quantité vendue", f"{approx}{total_quantite:,}")
+        col3.metric("📊 Moyenne par vente", f"{approx}{avg_vente:,.2f} €")
+        if estime:
+            col1.caption(f"± {kpis['total_ventes_marge']:,.2f} €")
+            col2.caption(f"± {kpis['total_quantite_marge']:,.0f}")
+            col3.caption(f"± {kpis['moyenne_vente_marge']:,.2f} €")
+            st.caption(f"⚡ Estimation sur {kpis['echantillon']:,} ventes échantillonnées "
+                       "(intervalles de confiance à 95 %) ; valeurs exactes en cours de calcul.")
 
         st.subheader("📈 Données filtrées")
-        st.dataframe(filtered_df, height=300)
-
-        st.download_button(
-            "📥 Exporter Excel",
-            convert_to_excel(filtered_df),
-            file_name="ventes.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        afficher_page_ventes(filtres, int(round(kpis['nb_ventes'])))
+
+        col_format, col_export = st.columns([1, 3])
+        format_export = col_format.selectbox("Format d'export", list(FORMATS_EXPORT), label_visibility="collapsed")
+        if col_export.button("📥 Préparer l'export"):
+            try:
+                chemin_export = preparer_export(format_export, filtres)
+            except ImportError as ie:
+                st.error(str(ie))
+            else:
+                # Le fichier n'est lu qu'au clic, puis supprimé : rien ne reste sur disque ni en mémoire
+                # d'un rendu à l'autre, et le bouton disparaît au rendu suivant. Il est lu en entier
+                # pour être envoyé au navigateur, d'où la taille maximale
+                try:
+                    extension, mime = FORMATS_EXPORT[format_export]
+                    taille = os.path.getsize(chemin_export)
+                    if taille > TAILLE_MAX_TELECHARGEMENT:
+                        st.error(f"Export trop volumineux pour le navigateur ({taille / 1024 ** 2:,.0f} Mo, "
+                                 f"maximum {TAILLE_MAX_TELECHARGEMENT // 1024 ** 2} Mo) : restreignez les filtres "
+                                 "ou choisissez le format Parquet, plus compact.")
+                    else:
+                        with open(chemin_export, "rb") as fichier:
+                            st.download_button(
+                                f"📥 Télécharger ({format_export})",
+                                fichier.read(),
+                                file_name=f"ventes.{extension}",
+                                mime=mime
+                            )
+                finally:
+                    os.remove(chemin_export)
 
         # Visualisations rapides
         st.subheader("📊 Aperçu des ventes")
 
-        if filtered_df.empty:
+        df_par_produit, estime = calculer(affinages, agreger_top_produits, estimer_top_produits, None,
+                                          critere='montant', **filtres)
+        legende_estimation(estime)
+
+        if df_par_produit.empty:
             st.warning("⚠️ Aucune donnée disponible avec les filtres actuels.")
         else:
             col1, col2 = st.columns(2)
 
             with col1:
                 st.markdown("**Montant des ventes par produit**")
-                fig, ax = plt.subplots(figsize=(8, 4))
                 try:
-                    sns.barplot(
-                        data=filtered_df,
-                        x="produit",
-                        y="montant",
-                        estimator=sum,
-                        ci=None,
-                        ax=ax,
-                        palette="viridis"
+                    afficher_graphique(
+                        plot_par_produit, df_par_produit, 'montant',
+                        palette="viridis", ylabel="Montant total (€)", format_valeur="{:.2f}€",
+                        serie_native=df_par_produit['montant']
                     )
-                    plt.xticks(rotation=45)
-                    ax.set_ylabel("Montant total (€)")
-                    ax.set_xlabel("")
-
-                    for p in ax.patches:
-                        ax.annotate(
-                            f"{p.get_height():.2f}€",
-                            (p.get_x() + p.get_width() / 2., p.get_height()),
-                            ha='center',
-                            va='center',
-                            xytext=(0, 5),
-                            textcoords='offset points'
-                        )
-
-                    st.pyplot(fig)
-                    plt.close(fig)  # Fermeture explicite de la figure
                 except Exception as e:
                     st.error(f"Erreur lors de la génération du graphique : {str(e)}")
 
             with col2:
                 st.markdown("**Quantité vendue par produit**")
-                fig, ax = plt.subplots(figsize=(8, 4))
                 try:
-                    sns.barplot(
-                        data=filtered_df,
-                        x="produit",
-                        y="quantite",
-                        estimator=sum,
-                        ci=None,
-                        ax=ax,
-                        palette="magma"
+                    afficher_graphique(
+                        plot_par_produit, df_par_produit, 'quantite',
+                        palette="magma", ylabel="Quantité totale", format_valeur="{:.0f}",
+                        serie_native=df_par_produit['quantite']
                     )
-                    plt.xticks(rotation=45)
-                    ax.set_ylabel("Quantité totale")
-                    ax.set_xlabel("")
-
-                    for p in ax.patches:
-                        ax.annotate(
-                            f"{int(p.get_height())}",
-                            (p.get_x() + p.get_width() / 2., p.get_height()),
-                            ha='center',
-                            va='center',
-                            xytext=(0, 5),
-                            textcoords='offset points'
-                        )
-
-                    st.pyplot(fig)
-                    plt.close(fig)  # Fermeture explicite de la figure
                 except Exception as e:
                     st.error(f"Erreur lors de la génération du graphique : {str(e)}")
 
@@ -209,60 +365,61 @@ def main():
     elif selected_tab == tabs[1]:
         st.subheader("Ajouter de nouvelles données")
 
-        tab1, tab2, tab3 = st.tabs(["➕ Nouvelle vente", "🆕 Nouveau produit", "👤 Nouveau client"])
+        tab1, tab2, tab3, tab4 = st.tabs(["➕ Nouvelle vente", "🆕 Nouveau produit", "👤 Nouveau client",
+                                          "📤 Import en masse"])
 
         with tab1:
+            derniere_vente = st.session_state.pop("derniere_vente", None)
+            if derniere_vente:
+                st.success(f"✅ Vente n°{derniere_vente['id']} enregistrée ({derniere_vente['montant']:,.2f} €)")
+
+            # Recherche côté serveur : seules les options correspondant au préfixe sont chargées
+            col1, col2 = st.columns(2)
+            recherche_produit = col1.text_input("🔎 Rechercher un produit")
+            recherche_client = col2.text_input("🔎 Rechercher un client")
+            libelles_produits, prix_produits = rechercher_produits(recherche_produit)
+            libelles_clients = rechercher_clients(recherche_client)
+
             with st.form("form_vente"):
                 col1, col2 = st.columns(2)
 
                 with col1:
                     date = st.date_input("Date de vente", value=datetime.now())
 
-                    if not df_produits.empty:
+                    if libelles_produits:
                         produit_id = st.selectbox(
                             "Produit",
-                            options=df_produits['id'],
-                            format_func=lambda
-                                x: f"{df_produits[df_produits['id'] == x]['nom'].iloc[0]} - {df_produits[df_produits['id'] == x]['categorie'].iloc[0]}"
-                            if not df_produits[df_produits['id'] == x].empty else "Produit inconnu"
+                            options=list(libelles_produits),
+                            format_func=lambda x: libelles_produits.get(x, "Produit inconnu")
                         )
                     else:
                         st.warning("Aucun produit disponible.")
                         produit_id = None
 
-                    client_options = [None]
-                    if not df_clients.empty:
-                        client_options += df_clients['id'].tolist()
-
                     client_id = st.selectbox(
                         "Client (optionnel)",
-                        options=client_options,
-                        format_func=lambda x: df_clients[df_clients['id'] == x]['nom'].iloc[0]
-                        if x and not df_clients[df_clients['id'] == x].empty else "Aucun"
+                        options=[None] + list(libelles_clients),
+                        format_func=lambda x: libelles_clients.get(x, "Aucun") if x else "Aucun"
                     )
 
                 with col2:
                     quantite = st.number_input("Quantité", min_value=1, step=1)
 
-                    if produit_id is not None and not df_produits.empty:
-                        produit_data = df_produits[df_produits['id'] == produit_id]
-                        if not produit_data.empty:
-                            prix_unitaire = produit_data['prix_unitaire'].iloc[0]
-                            montant = quantite * prix_unitaire
-                            st.metric("Prix unitaire", f"{prix_unitaire:,.2f} €")
-                            st.metric("Montant total", f"{montant:,.2f} €")
-                        else:
-                            st.warning("Produit non trouvé")
-                            montant = 0
-                    else:
-                        montant = 0
+                    # Montant indicatif : le montant enregistré est recalculé en base au prix courant
+                    if produit_id is not None:
+                        prix_unitaire = prix_produits[produit_id]
+                        st.metric("Prix unitaire", f"{prix_unitaire:,.2f} €")
+                        st.metric("Montant total", f"{quantite * prix_unitaire:,.2f} €")
 
                 submit = st.form_submit_button("Enregistrer la vente")
                 if submit:
-                    if produit_id is not None and montant > 0:
-                        insert_vente(date, produit_id, client_id, quantite, montant)
-                        st.success("✅ Vente enregistrée avec succès !")
-                        st.rerun()
+                    if produit_id is not None:
+                        try:
+                            st.session_state["derniere_vente"] = insert_vente(date, produit_id, client_id,
+                                                                              int(quantite))
+                            st.rerun()
+                        except ERREURS_ECRITURE as e:
+                            st.error(f"Erreur : {str(e) or type(e).__name__}")
                     else:
                         st.error("Veuillez sélectionner un produit valide")
 
@@ -296,28 +453,56 @@ def main():
                     else:
                         st.error("Veuillez au moins remplir le nom et l'email")
 
+        with tab4:
+            with st.form("form_import"):
+                type_import = st.radio("Type de données", ["Ventes", "Produits", "Clients"], horizontal=True)
+                st.caption(
+                    "Colonnes attendues — ventes : date_vente, produit, quantite, client (optionnel), "
+                    "montant (optionnel) ; produits : nom, categorie, prix_unitaire ; "
+                    "clients : nom, email, telephone"
+                )
+                fichier = st.file_uploader("Fichier CSV ou Excel", type=["csv", "xlsx"])
+
+                submit = st.form_submit_button("Importer")
+                if submit:
+                    if fichier is None:
+                        st.error("Veuillez sélectionner un fichier")
+                    else:
+                        try:
+                            with st.spinner("Import en cours..."):
+                                rapport = importer_fichier(type_import.lower(), fichier, fichier.name)
+                            col1, col2, col3 = st.columns(3)
+                            col1.metric("✅ Lignes importées", f"{rapport['lignes_inserees']:,}")
+                            col2.metric("❌ Lignes rejetées", f"{rapport['lignes_rejetees']:,}")
+                            col3.metric("⚡ Lignes/s", f"{rapport['lignes_par_seconde']:,.0f}")
+                        except ERREURS_ECRITURE as e:
+                            st.error(f"Erreur : {str(e) or type(e).__name__}")
+
     # Onglet Analyse approfondie
     elif selected_tab == tabs[2]:
         st.subheader("Analyse approfondie des ventes")
 
         analysis_type = st.radio(
             "Type d'analyse",
-            ["📅 Par période", "🏆 Top produits", "📊 Répartition"],
+            ["📅 Par période", "🏆 Top produits", "📊 Répartition", "👥 Classements"],
             horizontal=True
         )
 
         if analysis_type == "📅 Par période":
-            periode = st.selectbox("Période", ["Mensuel", "Trimestriel", "Annuel"])
-            fig, df_period = plot_ventes_par_periode(filtered_df, periode)
-            st.pyplot(fig)
-            plt.close(fig)
+            periode = st.selectbox("Période", ["Mensuel", "Trimestriel", "Annuel", "Journalier"])
+            df_period, estime = calculer(affinages, agreger_par_periode, estimer_par_periode, periode, **filtres)
+            legende_estimation(estime)
+            df_period = afficher_graphique(
+                plot_ventes_par_periode, df_period, periode,
+                serie_native=df_period.set_index('periode')['montant']
+            )
             st.dataframe(df_period)
 
         elif analysis_type == "🏆 Top produits":
             top_n = st.slider("Nombre de produits à afficher", 3, 10, 5)
-            fig, df_top = plot_top_produits(filtered_df, top_n)
-            st.pyplot(fig)
-            plt.close(fig)
+            df_top, estime = calculer(affinages, agreger_top_produits, estimer_top_produits, top_n, **filtres)
+            legende_estimation(estime)
+            df_top = afficher_graphique(plot_top_produits, df_top, top_n, serie_native=df_top[['quantite', 'montant']])
             st.dataframe(df_top)
 
         elif analysis_type == "📊 Répartition":
@@ -327,19 +512,73 @@ def main():
                 horizontal=True
             )
 
-            if filtered_df.empty or 'montant' not in filtered_df.columns:
-                st.warning("⚠️ Pas de données disponibles ou colonne 'montant' manquante.")
+            by_type = 'categorie' if repartition_type == "Par catégorie" else 'client'
+            df_repartition, estime = calculer(affinages, agreger_repartition, estimer_repartition, by_type,
+                                              limit=10 if by_type == 'client' else None, **filtres)
+            legende_estimation(estime)
+
+            if df_repartition.empty:
+                st.warning("⚠️ Pas de données disponibles avec les filtres actuels.")
             else:
                 try:
-                    by_type = 'categorie' if repartition_type == "Par catégorie" else 'client'
-                    fig, df_repartition = plot_repartition(filtered_df, by=by_type)
-                    st.pyplot(fig)
-                    plt.close(fig)
+                    df_repartition = afficher_graphique(
+                        plot_repartition, df_repartition, by=by_type,
+                        serie_native=df_repartition.set_index(by_type)['montant']
+                    )
                     st.dataframe(df_repartition)
 
                 except ValueError as ve:
                     st.error(f"Erreur : {str(ve)}")
 
+        elif analysis_type == "👥 Classements":
+            # Lectures indexées des statistiques cumulées, sur tout l'historique (filtres non appliqués)
+            st.caption("Statistiques sur tout l'historique, tenues à jour à chaque enregistrement ; "
+                       "les filtres de la barre latérale ne s'appliquent pas.")
+            col_entite, col_critere, col_nombre = st.columns(3)
+            entite = col_entite.radio("Classement", ["Clients", "Produits"], horizontal=True)
+            critere = col_critere.selectbox("Critère", list(CRITERES_CLASSEMENT))
+            nombre = col_nombre.slider("Nombre de lignes", 5, 50, 10)
+
+            if entite == "Clients":
+                df_classement = classement_clients(critere, nombre)
+                nom_colonne = 'client'
+            else:
+                df_classement = classement_produits(critere, nombre)
+                nom_colonne = 'produit'
+
+            if df_classement.empty:
+                st.warning("⚠️ Aucune vente enregistrée.")
+            else:
+                colonne_graphique = critere if critere != 'derniere_vente' else 'montant_total'
+                df_graphique = df_classement.set_index(nom_colonne)
+                afficher_graphique(
+                    plot_par_produit, df_graphique, colonne_graphique,
+                    ylabel=colonne_graphique, format_valeur="{:,.0f}",
+                    serie_native=df_graphique[colonne_graphique]
+                )
+                st.dataframe(df_classement.drop(columns=[f'{nom_colonne}_id']), hide_index=True)
+
+                if entite == "Clients":
+                    st.markdown("**Historique d'un client**")
+                    clients_classes = dict(zip(df_classement['client_id'], df_classement['client']))
+                    client_id = st.selectbox("Client", list(clients_classes), format_func=clients_classes.get)
+                    fiche = df_classement.set_index('client_id').loc[client_id]
+                    col1, col2, col3, col4 = st.columns(4)
+                    col1.metric("💰 Chiffre d'affaires", f"{fiche['montant_total']:,.2f} €")
+                    col2.metric("🧾 Achats", f"{fiche['nb_ventes']:,}")
+                    col3.metric("🛒 Panier moyen", f"{fiche['panier_moyen']:,.2f} €")
+                    col4.metric("📅 Dernier achat", fiche['derniere_vente'])
+                    st.caption(f"Client depuis le {fiche['premiere_vente']} — 30 jours : "
+                               f"{fiche['montant_30j']:,.2f} €, 90 jours : {fiche['montant_90j']:,.2f} €")
+                    df_historique = historique_client(client_id)
+                    afficher_graphique(
+                        plot_ventes_par_periode, df_historique, 'Mensuel',
+                        serie_native=df_historique.set_index('periode')['montant']
+                    )
+
+    afficher_panneau_diagnostic()
+    attendre_affinages(affinages)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,361 @@
+import argparse
+import importlib.util
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import db_config
+
+CATEGORIES = [
+    'batiment', 'plomberie', 'electricite', 'peinture', 'outillage',
+    'jardin', 'quincaillerie', 'menuiserie', 'sanitaire', 'carrelage',
+]
+
+# Tailles prédéfinies des jeux de données
+TAILLES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+
+# Premier jour de l'historique généré (fixe pour que les bases soient reproductibles)
+DATE_DEBUT = date(2022, 1, 1)
+
+# Nombre maximal de ventes générées et insérées par transaction
+TAILLE_BLOC = 500_000
+
+
+def _poids_zipf(n, exposant, rng):
+    """Popularité décroissante (loi de Zipf) attribuée dans un ordre aléatoire"""
+    poids = 1.0 / np.arange(1, n + 1) ** exposant
+    rng.shuffle(poids)
+    return poids / poids.sum()
+
+
+def generer_base(chemin, nb_ventes, graine=42, nb_jours=3 * 365, nb_produits=None, nb_clients=None):
+    """Crée une base ventes.db synthétique et déterministe pour une graine donnée
+
+    Produits et clients suivent une popularité de type Zipf, les prix une loi log-normale,
+    les quantités une loi géométrique ; le volume quotidien combine une croissance lente,
+    une saisonnalité hebdomadaire (creux le dimanche) et annuelle. 30 % des ventes sont anonymes.
+    """
+    if os.path.exists(chemin):
+        raise ValueError(f"La base {chemin} existe déjà")
+
+    rng = np.random.default_rng(graine)
+    nb_produits = nb_produits or int(np.clip(nb_ventes // 500, 20, 20_000))
+    nb_clients = nb_clients or int(np.clip(nb_ventes // 50, 10, 200_000))
+
+    db_config.configurer_base(chemin)
+    db_config.init_db()
+    conn = db_config.connect_db(chemin)
+
+    categories = rng.choice(CATEGORIES, size=nb_produits, p=_poids_zipf(len(CATEGORIES), 0.8, rng))
+    prix = np.round(rng.lognormal(mean=3.0, sigma=1.0, size=nb_produits), 2) + 0.5
+    with conn:
+        conn.executemany(
+            "INSERT INTO produits (id, nom, categorie, prix_unitaire) VALUES (?, ?, ?, ?)",
+            [(i + 1, f"Produit {i + 1:05d}", str(categories[i]), float(prix[i])) for i in range(nb_produits)]
+        )
+        conn.executemany(
+            "INSERT INTO clients (id, nom, email, telephone) VALUES (?, ?, ?, ?)",
+            [(i + 1, f"Client {i + 1:06d}", f"client{i + 1}@exemple.fr", f"06{i + 1:08d}")
+             for i in range(nb_clients)]
+        )
+
+    # Répartition des ventes sur les jours de l'historique
+    jours = np.arange(nb_jours)
+    dates = [DATE_DEBUT + timedelta(days=int(j)) for j in jours]
+    jour_semaine = np.array([d.weekday() for d in dates])
+    volume = (1 + jours / nb_jours) * np.where(jour_semaine == 6, 0.3, 1.0) \
+        * (1 + 0.25 * np.sin(2 * np.pi * jours / 365.25))
+    ventes_par_jour = rng.multinomial(nb_ventes, volume / volume.sum())
+
+    popularite_produits = _poids_zipf(nb_produits, 1.1, rng)
+    popularite_clients = _poids_zipf(nb_clients, 0.9, rng)
+
+    query = "INSERT INTO ventes (date_vente, produit_id, client_id, quantite, montant) VALUES (?, ?, ?, ?, ?)"
+    debut = 0
+    while debut < nb_jours:
+        # Regroupement de jours consécutifs jusqu'à TAILLE_BLOC ventes
+        fin = debut
+        total = 0
+        while fin < nb_jours and (total == 0 or total + ventes_par_jour[fin] <= TAILLE_BLOC):
+            total += ventes_par_jour[fin]
+            fin += 1
+
+        n = int(total)
+        libelles = np.repeat([d.isoformat() for d in dates[debut:fin]], ventes_par_jour[debut:fin])
+        produit_ids = rng.choice(nb_produits, size=n, p=popularite_produits) + 1
+        client_ids = rng.choice(nb_clients, size=n, p=popularite_clients) + 1
+        anonymes = rng.random(n) < 0.3
+        quantites = rng.geometric(0.35, size=n)
+        montants = np.round(quantites * prix[produit_ids - 1], 2)
+
+        with conn:
+            conn.executemany(query, zip(
+                libelles.tolist(),
+                produit_ids.tolist(),
+                [None if a else c for a, c in zip(anonymes.tolist(), client_ids.tolist())],
+                quantites.tolist(),
+                montants.tolist(),
+            ))
+        debut = fin
+
+    conn.close()
+    db_config.reconstruire_ventes_daily()
+    db_config.reconstruire_echantillon()
+    return {'ventes': nb_ventes, 'produits': nb_produits, 'clients': nb_clients}
+
+
+def _mesurer(nom, fonction, repetitions):
+    """Exécute une étape plusieurs fois ; retourne la durée médiane et le pic mémoire Python
+
+    Les durées sont prises sans tracemalloc (qui ralentit fortement l'exécution) ;
+    le pic mémoire provient d'une exécution supplémentaire instrumentée.
+    """
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - debut)
+
+    tracemalloc.start()
+    resultat = fonction()
+    pic = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    lignes = len(resultat) if hasattr(resultat, '__len__') else None
+    mesure = {
+        'etape': nom,
+        'duree_s': statistics.median(durees),
+        'duree_min_s': min(durees),
+        'memoire_pic_mo': pic / 1e6,
+        'lignes': lignes,
+    }
+    print(f"{nom:<40} {mesure['duree_s'] * 1000:>10.1f} ms {mesure['memoire_pic_mo']:>10.1f} Mo")
+    return mesure
+
+
+def mesurer_demarrage(repetitions=3):
+    """Mesure l'import à froid de l'application dans un processus neuf (durée médiane en s)"""
+    dossier = os.path.dirname(os.path.abspath(__file__))
+    script = "import time; debut = time.perf_counter(); import app; print(time.perf_counter() - debut)"
+    durees = []
+    for _ in range(repetitions):
+        sortie = subprocess.run([sys.executable, "-c", script], cwd=dossier, capture_output=True, text=True,
+                                check=True)
+        durees.append(float(sortie.stdout.strip().splitlines()[-1]))
+    modules = subprocess.run(
+        [sys.executable, "-c", "import sys, app; print(' '.join(sorted(sys.modules)))"],
+        cwd=dossier, capture_output=True, text=True, check=True
+    ).stdout.split()
+    lourds = [m for m in ('matplotlib', 'seaborn', 'openpyxl', 'tkinter', 'turtle') if m in modules]
+    mesure = {'etape': 'demarrage_import_app', 'duree_s': statistics.median(durees), 'duree_min_s': min(durees),
+              'memoire_pic_mo': None, 'lignes': None, 'modules_lourds_charges': lourds}
+    print(f"{'demarrage_import_app':<40} {mesure['duree_s'] * 1000:>10.1f} ms   {lourds}")
+    return mesure
+
+
+def _rapport_memoire_chargement(ops):
+    """Mémoire par colonne du chargement complet, brut puis en types compacts (optimiser_types)"""
+    brut = ops.get_ventes_filtrees.sans_cache(optimiser=False)
+    rapport = ops.rapport_memoire(brut, ops.optimiser_types(brut))
+    print(rapport.to_string(float_format=lambda ratio: f"{ratio:.1f}"))
+    return json.loads(rapport.to_json(orient='index'))
+
+
+def _mesurer_pandas(ops, filtres, repetitions):
+    """Filtrage et agrégat pandas en mémoire sur l'instantané partagé, tels que les faisait le
+    tableau de bord avant le filtrage SQL"""
+    df = ops.get_ventes()
+
+    def filtre_pandas():
+        masque = (df['date_vente'].dt.date >= filtres['date_debut']) & \
+                 (df['date_vente'].dt.date <= filtres['date_fin'])
+        return df[masque & df['categorie'].isin(filtres['categories'])]
+
+    return [
+        _mesurer('filtre_pandas_90j_categorie', filtre_pandas, repetitions),
+        _mesurer(
+            'agregat_mensuel_pandas',
+            lambda: df.groupby(df['date_vente'].dt.to_period('M')).agg({'montant': 'sum', 'quantite': 'sum'}),
+            repetitions
+        ),
+    ]
+
+
+def executer_benchmarks(chemin, repetitions=3):
+    """Mesure chaque étape du tableau de bord (chargement, filtres, agrégats, rendu, export)"""
+    db_config.configurer_base(chemin)
+    import data_operations as ops
+    from export import exporter_ventes
+
+    max_date = pd.Timestamp(ops.get_bornes_dates.sans_cache()[1])
+    filtres = {
+        'date_debut': (max_date - pd.Timedelta(days=90)).date(),
+        'date_fin': max_date.date(),
+        'categories': [CATEGORIES[0]],
+    }
+
+    mesures = [mesurer_demarrage(repetitions)]
+    etapes = [
+        ('chargement_complet_brut', lambda: ops.get_ventes_filtrees.sans_cache(optimiser=False)),
+        ('chargement_complet_optimise', lambda: ops.get_ventes_filtrees.sans_cache()),
+        ('filtre_sql_90j_categorie', lambda: ops.get_ventes_filtrees.sans_cache(**filtres)),
+        ('kpis', lambda: ops.get_kpis.sans_cache(**filtres)),
+        ('agregat_mensuel', lambda: ops.agreger_par_periode.sans_cache('Mensuel')),
+        ('agregat_top_produits', lambda: ops.agreger_top_produits.sans_cache(10)),
+        ('agregat_repartition_client', lambda: ops.agreger_repartition.sans_cache('client', limit=10)),
+        ('page_ventes', lambda: ops.get_page_ventes.sans_cache(None, 100, 'date_vente', True, **filtres)),
+    ]
+    for nom, fonction in etapes:
+        mesures.append(_mesurer(nom, fonction, repetitions))
+    memoire_chargement = _rapport_memoire_chargement(ops)
+
+    # Instantané partagé de get_ventes : chargement complet, rafraîchissement sans écriture, puis
+    # ajout des 1 % dernières ventes (instantané ramené en arrière, seul le reliquat est relu par id)
+    mesures.append(_mesurer('instantane_chargement_complet', lambda: ops.InstantaneVentes().rafraichir(),
+                            repetitions))
+    instantane = ops.InstantaneVentes()
+    complet = instantane.rafraichir()
+    mesures.append(_mesurer('instantane_rafraichi_inchange', instantane.rafraichir, repetitions))
+    if len(complet):
+        conserve = complet.iloc[:len(complet) - max(1, len(complet) // 100)]
+
+        def ajouter_dernieres_ventes():
+            instantane.df = conserve
+            instantane.filigrane = int(conserve['id'].iloc[-1]) if len(conserve) else 0
+            instantane.version = None
+            return instantane.rafraichir()
+
+        mesures.append(_mesurer('instantane_ajout_1pct', ajouter_dernieres_ventes, repetitions))
+
+    # Agrégation de tout l'historique : chemin série, puis partitionné sur les cœurs disponibles ;
+    # seuil levé pour que le chemin parallèle soit mesuré quelle que soit la taille de la base
+    travailleurs, seuil = ops.TRAVAILLEURS, ops.SEUIL_PARALLELE
+    for nom, nb in (('agregat_annuel_serie', 1), ('agregat_annuel_parallele', max(2, os.cpu_count() or 1))):
+        ops.TRAVAILLEURS, ops.SEUIL_PARALLELE = nb, 0
+        try:
+            ops.agreger_par_periode.sans_cache('Annuel')  # démarrage du pool de processus hors mesure
+            mesure = _mesurer(nom, lambda: ops.agreger_par_periode.sans_cache('Annuel'), repetitions)
+        finally:
+            ops.TRAVAILLEURS, ops.SEUIL_PARALLELE = travailleurs, seuil
+        mesure['travailleurs'] = nb
+        mesures.append(mesure)
+
+    # Même agrégat par l'archive colonnaire Parquet, exportée dans un dossier temporaire
+    pyarrow_disponible = importlib.util.find_spec('pyarrow') is not None
+    if not pyarrow_disponible:
+        print("Archive Parquet et export Parquet ignorés : pyarrow absent")
+    if pyarrow_disponible:
+        import stockage
+
+        with tempfile.TemporaryDirectory() as dossier:
+            archive = stockage.archive(os.path.join(dossier, 'archive'))
+            mesures.append(_mesurer('export_archive_parquet', lambda: archive.synchroniser(reconstruire=True), 1))
+            moteur, dossier_defaut = db_config.MOTEUR_ANALYTIQUE, db_config.ARCHIVE_PARQUET
+            db_config.MOTEUR_ANALYTIQUE, db_config.ARCHIVE_PARQUET = 'parquet', archive.dossier
+            try:
+                mesures.append(_mesurer('agregat_annuel_parquet',
+                                        lambda: ops.agreger_par_periode.sans_cache('Annuel'), repetitions))
+            finally:
+                db_config.MOTEUR_ANALYTIQUE, db_config.ARCHIVE_PARQUET = moteur, dossier_defaut
+
+    mesures.extend(_mesurer_pandas(ops, filtres, repetitions))
+
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        from visualizations import plot_ventes_par_periode, plot_top_produits, plot_repartition
+    except ImportError as e:
+        print(f"Rendu ignoré : {e}")
+    else:
+        def rendre(fonction, donnees, *args, **kwargs):
+            fig, tableau = fonction(donnees, *args, **kwargs)
+            if fig is not None:
+                fig.savefig(io.BytesIO(), format='png')
+                plt.close(fig)
+            return tableau
+
+        agregats = {
+            'periode': ops.agreger_par_periode.sans_cache('Mensuel'),
+            'top': ops.agreger_top_produits.sans_cache(10),
+            'repartition': ops.agreger_repartition.sans_cache('categorie'),
+        }
+        mesures.append(_mesurer('rendu_periode', lambda: rendre(plot_ventes_par_periode, agregats['periode'],
+                                                                'Mensuel'), repetitions))
+        mesures.append(_mesurer('rendu_top_produits', lambda: rendre(plot_top_produits, agregats['top'], 10),
+                                repetitions))
+        mesures.append(_mesurer('rendu_repartition', lambda: rendre(plot_repartition, agregats['repartition']),
+                                repetitions))
+
+    formats = ['CSV', 'Excel'] + (['Parquet'] if pyarrow_disponible else [])
+    for format_export in formats:
+        def exporter():
+            with tempfile.TemporaryFile() as fichier:
+                exporter_ventes(format_export, fichier, **filtres)
+        mesures.append(_mesurer(f'export_{format_export.lower()}_90j_categorie', exporter, 1))
+
+    # Plans d'exécution : une requête qui ne passe plus par un index fausse toutes les mesures ci-dessus
+    plans = ops.verifier_plans_index()
+    sans_index = [nom for nom, plan in plans.items() if not plan['utilise_index']]
+    print(f"Plans d'exécution : {len(plans) - len(sans_index)}/{len(plans)} requêtes indexées"
+          + (f", sans index : {', '.join(sans_index)}" if sans_index else ""))
+
+    with db_config.connexion() as conn:
+        nb_ventes = conn.execute("SELECT COUNT(*) FROM ventes").fetchone()[0]
+
+    return {
+        'base': os.path.abspath(chemin),
+        'nb_ventes': nb_ventes,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'plateforme': platform.platform(),
+        'repetitions': repetitions,
+        'mesures': mesures,
+        'memoire_chargement': memoire_chargement,
+        'plans_index': plans,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Jeux de données synthétiques et mesures de performance",
+        epilog="Exemple : python benchmark.py generer --ventes 1m --base bench_1m.db && "
+               "python benchmark.py executer --base bench_1m.db --sortie resultats_1m.json"
+    )
+    commandes = parser.add_subparsers(dest='commande', required=True)
+
+    parser_generer = commandes.add_parser('generer', help="Génère une base de ventes synthétique")
+    parser_generer.add_argument('--ventes', default='10k',
+                                help="Nombre de ventes ou taille prédéfinie (10k, 1m, 10m)")
+    parser_generer.add_argument('--base', required=True, help="Chemin de la base à créer")
+    parser_generer.add_argument('--graine', type=int, default=42)
+
+    parser_executer = commandes.add_parser('executer', help="Mesure les étapes du tableau de bord")
+    parser_executer.add_argument('--base', required=True)
+    parser_executer.add_argument('--sortie', default='resultats_benchmark.json',
+                                 help="Fichier JSON des résultats")
+    parser_executer.add_argument('--repetitions', type=int, default=3)
+
+    args = parser.parse_args()
+    if args.commande == 'generer':
+        nb_ventes = TAILLES.get(args.ventes.lower()) or int(args.ventes)
+        debut = time.perf_counter()
+        resume = generer_base(args.base, nb_ventes, args.graine)
+        print(f"{resume} générés en {time.perf_counter() - debut:.1f} s")
+    else:
+        resultats = executer_benchmarks(args.base, args.repetitions)
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            json.dump(resultats, fichier, indent=2, ensure_ascii=False)
+        print(f"Résultats écrits dans {args.sortie}")
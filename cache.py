@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import pandas as pd
+from db_config import connexion, lire_version
+
+# Nombre maximal de résultats conservés et durée de vie d'une entrée (secondes)
+TAILLE_MAX = 256
+TTL_S = 300
+
+# Délai entre deux relectures du compteur de version en base, pour voir les écritures
+# des autres processus ; les écritures locales invalident immédiatement
+INTERVALLE_VERIFICATION_S = 2.0
+
+
+class CacheLRU:
+    """Cache thread-safe borné en taille (éviction LRU) et en durée de vie (TTL)"""
+
+    def __init__(self, taille_max=TAILLE_MAX, ttl=TTL_S):
+        self.taille_max = taille_max
+        self.ttl = ttl
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def obtenir(self, cle):
+        """Retourne (True, valeur) si la clé est présente et non expirée, (False, None) sinon"""
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is None:
+                return False, None
+            expire_a, valeur = entree
+            if expire_a < time.monotonic():
+                del self._entrees[cle]
+                return False, None
+            self._entrees.move_to_end(cle)
+            return True, valeur
+
+    def stocker(self, cle, valeur):
+        with self._verrou:
+            self._entrees[cle] = (time.monotonic() + self.ttl, valeur)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+
+
+_cache = CacheLRU()
+_version = {'valeur': None, 'lue_a': 0.0}
+_verrou_version = threading.Lock()
+
+# Résultats publiés par le précalcul en arrière-plan, sans TTL ni éviction,
+# remplacés en bloc à chaque publication
+_publications = {}
+
+# Fonctions appelées après chaque écriture locale (ex. réveil du précalcul)
+_abonnes = []
+
+
+def version_donnees():
+    """Retourne la version courante des données, relue en base au plus toutes les quelques secondes"""
+    with _verrou_version:
+        maintenant = time.monotonic()
+        if _version['valeur'] is None or maintenant - _version['lue_a'] > INTERVALLE_VERIFICATION_S:
+            with connexion() as conn:
+                _version['valeur'] = lire_version(conn)
+            _version['lue_a'] = maintenant
+        return _version['valeur']
+
+
+def invalider():
+    """Force la relecture de la version après une écriture locale"""
+    with _verrou_version:
+        _version['valeur'] = None
+    for abonne in list(_abonnes):
+        abonne()
+
+
+def abonner(fonction):
+    """Enregistre une fonction sans argument appelée après chaque invalidation"""
+    if fonction not in _abonnes:
+        _abonnes.append(fonction)
+
+
+def publier(resultats):
+    """Remplace les résultats précalculés servis en priorité par les fonctions en cache
+
+    `resultats` associe des clés construites par `cle_cache` à leur valeur.
+    """
+    global _publications
+    _publications = dict(resultats)
+
+
+def nb_publications():
+    return len(_publications)
+
+
+def _figer(valeur):
+    """Convertit les arguments (listes, dictionnaires) en une forme hachable pour la clé du cache"""
+    if isinstance(valeur, (list, tuple, set, pd.Index, pd.Series)):
+        return tuple(_figer(v) for v in valeur)
+    if isinstance(valeur, dict):
+        return tuple(sorted((k, _figer(v)) for k, v in valeur.items()))
+    return valeur
+
+
+def _copie(valeur):
+    """Copie superficielle pour que l'appelant ne modifie pas la valeur partagée du cache"""
+    if isinstance(valeur, (pd.DataFrame, pd.Series)):
+        return valeur.copy(deep=False)
+    if isinstance(valeur, dict):
+        return dict(valeur)
+    return valeur
+
+
+def cle_cache(fonction, args, kwargs, version):
+    """Clé d'un appel : nom de la fonction, paramètres figés et version des données"""
+    return fonction.__qualname__, _figer(args), _figer(kwargs), version
+
+
+def en_cache(fonction):
+    """Mémorise le résultat d'une fonction de lecture selon ses paramètres et la version des données"""
+    def _lire(cle):
+        publications = _publications
+        if cle in publications:
+            return True, _copie(publications[cle])
+        trouve, valeur = _cache.obtenir(cle)
+        return trouve, _copie(valeur)
+
+    def consulter(*args, **kwargs):
+        """Retourne (True, valeur) si le résultat est déjà connu, (False, None) sans le calculer sinon"""
+        return _lire(cle_cache(fonction, args, kwargs, version_donnees()))
+
+    @wraps(fonction)
+    def enveloppe(*args, **kwargs):
+        cle = cle_cache(fonction, args, kwargs, version_donnees())
+        trouve, valeur = _lire(cle)
+        if not trouve:
+            valeur = fonction(*args, **kwargs)
+            _cache.stocker(cle, valeur)
+            valeur = _copie(valeur)
+        return valeur
+
+    enveloppe.sans_cache = fonction
+    enveloppe.consulter = consulter
+    return enveloppe
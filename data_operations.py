@@ -1,57 +1,657 @@
+import threading
+from datetime import date
+
 import pandas as pd
-from db_config import connect_db
+from cache import en_cache, invalider, version_donnees
+from db_config import (TAUX_ECHANTILLON, connexion, expliquer_requete, incrementer_version, requete_stats,
+                       stats_a_jour)
+from ecriture import attendre_ventes, soumettre_vente
+from instrumentation import instrumenter
+from parallele import TRAVAILLEURS, executer_partitions
+from requetes import (PERIODES_SQL, REPARTITIONS_SQL, SOMME_CENTIMES, TABLE_ROLLUP, agreger, requete_agregat,
+                      requete_ventes)
+from stockage import StockageSQLite, moteur_analytique
+
+
+def optimiser_types(df):
+    """Convertit un DataFrame de ventes en représentation compacte
+
+    Textes répétés en catégories, dates en datetime64, entiers réduits au plus petit type.
+    Les montants restent en float64 : en float32 les centimes ne sont plus exacts au-delà
+    de quelques dizaines de milliers d'euros et les totaux divergeraient des KPI.
+    """
+    df = df.copy()
+    for col in ('produit', 'categorie', 'client'):
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    if 'date_vente' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['date_vente']):
+        df['date_vente'] = pd.to_datetime(df['date_vente'], errors='coerce', format='ISO8601')
+    for col in ('id', 'quantite'):
+        if col in df.columns and pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+
+def rapport_memoire(df_avant, df_apres):
+    """Compare la mémoire occupée par colonne (en octets) avant et après optimisation"""
+    avant = df_avant.memory_usage(deep=True, index=False)
+    apres = df_apres.memory_usage(deep=True, index=False)
+    rapport = pd.DataFrame({
+        'type_avant': df_avant.dtypes.astype(str),
+        'type_apres': df_apres.dtypes.astype(str),
+        'octets_avant': avant,
+        'octets_apres': apres,
+    })
+    rapport.loc['total'] = ['', '', avant.sum(), apres.sum()]
+    rapport['ratio'] = rapport['octets_avant'] / rapport['octets_apres'].where(rapport['octets_apres'] > 0)
+    return rapport
+
+
+@en_cache
+@instrumenter('sql.get_ventes_filtrees')
+def get_ventes_filtrees(date_debut=None, date_fin=None, categories=None, produits=None, clients=None,
+                        colonnes=None, limit=None, optimiser=True):
+    """Récupère les ventes correspondant aux filtres, en ne transférant que les lignes utiles
+
+    Par défaut le résultat est en représentation compacte (voir optimiser_types).
+    """
+    query, params = requete_ventes(date_debut, date_fin, categories, produits, clients, colonnes, limit)
+    with connexion() as conn:
+        df = pd.read_sql(query, conn, params=params)
+    return optimiser_types(df) if optimiser else df
+
+
+# Colonnes sur lesquelles la pagination par clé peut trier (départagées par v.id)
+COLONNES_TRI = {
+    'date_vente': 'v.date_vente',
+    'id': 'v.id',
+}
+
+
+@en_cache
+@instrumenter('sql.get_page_ventes')
+def get_page_ventes(apres=None, taille_page=100, tri='date_vente', descendant=False, **filtres):
+    """Récupère une page de ventes par pagination sur clé (keyset)
+
+    `apres` est la clé (valeur de tri, id) de la dernière ligne de la page précédente :
+    SQLite reprend directement à cette position au lieu de parcourir les lignes sautées.
+    """
+    if tri not in COLONNES_TRI:
+        raise ValueError(f"Tri inconnu: {tri}")
+    sens, comparaison = ("DESC", "<") if descendant else ("ASC", ">")
+    expression = COLONNES_TRI[tri]
+
+    condition, params_condition = None, ()
+    if apres is not None:
+        if tri == 'id':
+            condition, params_condition = f"v.id {comparaison} ?", (apres[1],)
+        else:
+            condition, params_condition = f"({expression}, v.id) {comparaison} (?, ?)", tuple(apres)
+
+    ordre = f"v.id {sens}" if tri == 'id' else f"{expression} {sens}, v.id {sens}"
+    query, params = requete_ventes(limit=taille_page, condition=condition, params_condition=params_condition,
+                                    ordre=ordre, **filtres)
+    with connexion() as conn:
+        df = pd.read_sql(query, conn, params=params)
+    return df
+
+
+def cle_page(df_page, tri='date_vente'):
+    """Retourne la clé (valeur de tri, id) de la dernière ligne d'une page, point de départ de la suivante"""
+    if df_page.empty:
+        return None
+    derniere = df_page.iloc[-1]
+    valeur = derniere[tri]
+    # Conversion des scalaires numpy en types Python pour les paramètres SQLite
+    if hasattr(valeur, 'item'):
+        valeur = valeur.item()
+    return valeur, int(derniere['id'])
+
+
+@en_cache
+@instrumenter('sql.get_bornes_dates')
+def get_bornes_dates():
+    """Récupère la première et la dernière date de vente enregistrées"""
+    with connexion() as conn:
+        min_date, max_date = conn.execute("SELECT MIN(date_vente), MAX(date_vente) FROM ventes").fetchone()
+    return min_date, max_date
+
+
+class InstantaneVentes:
+    """Copie compacte de toutes les ventes, partagée par le processus et rafraîchie par ajout
+
+    La table ventes n'évolue que par insertions : à chaque rafraîchissement, seules les ventes
+    d'identifiant supérieur au filigrane (dernier id chargé) sont lues puis ajoutées. Un
+    rechargement complet n'a lieu que si le compteur `generation` a changé, c'est-à-dire
+    après une modification ou suppression (ventes, produits ou clients).
+    """
+
+    def __init__(self):
+        self.df = None
+        self.filigrane = 0
+        self.version = None
+        self.generation = None
+        self._verrou = threading.Lock()
+
+    def _lire(self, apres_id=0):
+        query, params = requete_ventes(condition="v.id > ?", params_condition=(apres_id,), ordre="v.id")
+        with connexion() as conn:
+            return optimiser_types(pd.read_sql(query, conn, params=params))
 
+    def _ajouter(self, df_nouvelles):
+        # Les nouvelles valeurs sont ajoutées aux catégories existantes (codes déjà attribués inchangés)
+        colonnes = {}
+        for col in self.df.columns:
+            ancienne = self.df[col]
+            nouvelle = df_nouvelles[col]
+            if isinstance(ancienne.dtype, pd.CategoricalDtype):
+                valeurs = pd.Index(nouvelle.dropna().astype(object).unique())
+                manquantes = valeurs.difference(ancienne.cat.categories)
+                if len(manquantes):
+                    ancienne = ancienne.cat.add_categories(manquantes)
+                nouvelle = nouvelle.astype(object).astype(ancienne.dtype)
+            colonnes[col] = pd.concat([ancienne, nouvelle], ignore_index=True)
+        return pd.DataFrame(colonnes)
+
+    def rafraichir(self):
+        """Met l'instantané à jour et le retourne"""
+        with self._verrou:
+            version, generation = version_donnees()
+            if self.df is not None and version == self.version:
+                return self.df
+
+            if self.df is None or generation != self.generation:
+                self.df = self._lire()
+            else:
+                nouvelles = self._lire(self.filigrane)
+                if not nouvelles.empty:
+                    self.df = self._ajouter(nouvelles)
+
+            if not self.df.empty:
+                self.filigrane = int(self.df['id'].iloc[-1])
+            self.version, self.generation = version, generation
+            return self.df
+
+
+_instantane = InstantaneVentes()
+
+
+@instrumenter('sql.get_ventes')
 def get_ventes():
     """Récupère toutes les ventes avec les informations des produits et clients"""
-    conn = connect_db()
-    query = '''
-    SELECT v.id, v.date_vente, p.nom as produit, p.categorie, 
-           c.nom as client, v.quantite, v.montant
-    FROM ventes v
-    JOIN produits p ON v.produit_id = p.id
-    LEFT JOIN clients c ON v.client_id = c.id
+    return _instantane.rafraichir().copy(deep=False)
+
+
+# Taille de l'agrégat journalier à partir de laquelle l'agrégation est partitionnée
+SEUIL_PARALLELE = 200000
+
+
+@en_cache
+def _taille_rollup():
+    with connexion() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {TABLE_ROLLUP}").fetchone()[0]
+
+
+def _partitions_dates(filtres, nb):
+    """Découpe la période filtrée en au plus `nb` intervalles de dates contigus et disjoints
+
+    Les partitions extrêmes restent ouvertes quand les filtres ne bornent pas la période,
+    pour couvrir aussi les ventes écrites depuis la lecture des bornes.
+    """
+    min_date, max_date = get_bornes_dates()
+    if min_date is None:
+        return [filtres]
+    debut = pd.Timestamp(min_date).normalize()
+    fin = pd.Timestamp(max_date).normalize()
+    if filtres.get('date_debut') is not None:
+        debut = max(debut, pd.Timestamp(filtres['date_debut']))
+    if filtres.get('date_fin') is not None:
+        fin = min(fin, pd.Timestamp(filtres['date_fin']))
+    jours = (fin - debut).days + 1
+    if jours <= 1:
+        return [filtres]
+
+    nb = min(nb, jours)
+    bornes = [debut + pd.Timedelta(days=jours * i // nb) for i in range(nb + 1)]
+    partitions = []
+    for i in range(nb):
+        partition = dict(filtres, date_debut=bornes[i], date_fin=bornes[i + 1] - pd.Timedelta(days=1))
+        if i == 0:
+            partition['date_debut'] = filtres.get('date_debut')
+        if i == nb - 1:
+            partition['date_fin'] = filtres.get('date_fin')
+        partitions.append(partition)
+    return partitions
+
+
+def _utiliser_parallele():
+    return TRAVAILLEURS > 1 and _taille_rollup() >= SEUIL_PARALLELE
+
+
+def _agreger_parallele(expression, nom, filtres, condition=None):
+    """Agrégation map-reduce : sommes partielles par partition de dates, calculées par un pool
+    de processus en lecture seule, puis fusionnées par clé
+
+    Retourne les colonnes `nom`, montant, quantite et nb_ventes, sans ordre particulier ;
+    les montants sont fusionnés en centimes entiers pour égaler exactement le chemin série.
+    """
+    selection = (f"{expression} AS {nom}, {SOMME_CENTIMES} AS centimes, "
+                 "SUM(v.quantite) AS quantite, SUM(v.nb_ventes) AS nb_ventes")
+    requetes = [requete_agregat(selection, expression, partition, condition)
+                for partition in _partitions_dates(filtres, TRAVAILLEURS)]
+    with connexion() as conn:
+        chemin = conn.execute("PRAGMA database_list").fetchone()[2]
+    parties = executer_partitions(chemin, requetes, TRAVAILLEURS)
+
+    df = pd.DataFrame([ligne for partie in parties for ligne in partie],
+                      columns=[nom, 'centimes', 'quantite', 'nb_ventes'])
+    df = df.groupby(nom, sort=False, as_index=False).sum()
+    df.insert(1, 'montant', df.pop('centimes') / 100.0)
+    return df
+
+
+def _agreger_rapide(axe, expression, nom, filtres, condition=None):
+    """Sommes par clé (nom, montant, quantite, nb_ventes) calculées par le moteur analytique choisi
+    (VENTES_MOTEUR) ou, pour SQLite, par le chemin parallèle ; None quand la requête SQL série,
+    avec son tri et sa limite propres, convient mieux
+    """
+    moteur = moteur_analytique()
+    if not isinstance(moteur, StockageSQLite):
+        return moteur.agreger(axe, **filtres)
+    if _utiliser_parallele():
+        return _agreger_parallele(expression, nom, filtres, condition)
+    return None
+
+
+@en_cache
+@instrumenter('sql.get_kpis')
+def get_kpis(**filtres):
+    """Calcule le montant total, la quantité totale et la moyenne par vente"""
+    df = _agreger_rapide('total', "'total'", 'total', filtres)
+    if df is not None and not df.empty:
+        kpis = {'total_ventes': df['montant'].iloc[0], 'total_quantite': int(df['quantite'].iloc[0]),
+                'nb_ventes': int(df['nb_ventes'].iloc[0])}
+    else:
+        df = agreger(
+            f"COALESCE({SOMME_CENTIMES}, 0) / 100.0 AS total_ventes, "
+            "COALESCE(SUM(v.quantite), 0) AS total_quantite, COALESCE(SUM(v.nb_ventes), 0) AS nb_ventes",
+            None, filtres
+        )
+        kpis = df.iloc[0].to_dict()
+    kpis['moyenne_vente'] = kpis['total_ventes'] / kpis['nb_ventes'] if kpis['nb_ventes'] else 0.0
+    return kpis
+
+
+@en_cache
+@instrumenter('sql.agreger_par_periode')
+def agreger_par_periode(periode, **filtres):
+    """Calcule le montant et la quantité vendus par mois, trimestre ou année"""
+    if periode not in PERIODES_SQL:
+        raise ValueError(f"Période inconnue: {periode}")
+    expression = PERIODES_SQL[periode]
+    df = _agreger_rapide(periode, expression, 'periode', filtres)
+    if df is not None and not df.empty:
+        return df.drop(columns='nb_ventes').sort_values('periode', ignore_index=True)
+    return agreger(
+        f"{expression} AS periode, {SOMME_CENTIMES} / 100.0 AS montant, SUM(v.quantite) AS quantite",
+        expression, filtres, ordre="periode"
+    )
+
+
+@en_cache
+@instrumenter('sql.agreger_top_produits')
+def agreger_top_produits(top_n=5, critere='quantite', **filtres):
+    """Retourne les top produits triés par quantité ou montant"""
+    if critere not in ('quantite', 'montant'):
+        raise ValueError(f"Critère de tri inconnu: {critere}")
+    if _lecture_stats_possible('produits', filtres):
+        # Tout l'historique sans filtre : lecture indexée des statistiques par produit
+        colonne = 'quantite_totale' if critere == 'quantite' else 'centimes_total'
+        return _lire_stats(
+            'produit', "p.nom AS produit, s.quantite_totale AS quantite, s.centimes_total / 100.0 AS montant",
+            "JOIN produits p ON p.id = s.produit_id", f"s.{colonne} DESC, produit", top_n
+        ).set_index('produit')
+    df = _agreger_rapide('produit', "p.nom", 'produit', filtres)
+    if df is not None and not df.empty:
+        df = df[['produit', 'quantite', 'montant']].sort_values([critere, 'produit'], ascending=[False, True])
+        df = df.head(top_n) if top_n is not None else df
+        return df.set_index('produit')
+    # Départage par nom pour un classement déterministe, identique au chemin parallèle
+    df = agreger(
+        f"p.nom AS produit, SUM(v.quantite) AS quantite, {SOMME_CENTIMES} / 100.0 AS montant",
+        "p.nom", filtres, ordre=f"{critere} DESC, produit", limit=top_n
+    )
+    return df.set_index('produit')
+
+
+@en_cache
+@instrumenter('sql.agreger_repartition')
+def agreger_repartition(by='categorie', limit=None, **filtres):
+    """Calcule le montant total par catégorie ou par client"""
+    if by not in REPARTITIONS_SQL:
+        raise ValueError(f"Répartition inconnue: {by}")
+    expression = REPARTITIONS_SQL[by]
+    condition = f"{expression} IS NOT NULL"
+    if by == 'client' and _lecture_stats_possible('clients', filtres):
+        return _lire_stats(
+            'client', "c.nom AS client, s.centimes_total / 100.0 AS montant",
+            "JOIN clients c ON c.id = s.client_id WHERE c.nom IS NOT NULL", "s.centimes_total DESC, client", limit
+        )
+    df = _agreger_rapide(by, expression, by, filtres, condition)
+    if df is not None and not df.empty:
+        df = df[[by, 'montant']].sort_values(['montant', by], ascending=[False, True], ignore_index=True)
+        return df.head(limit) if limit is not None else df
+    return agreger(
+        f"{expression} AS {by}, {SOMME_CENTIMES} / 100.0 AS montant",
+        expression, filtres, condition=condition, ordre=f"montant DESC, {by}", limit=limit
+    )
+
+
+def _stats_a_jour():
+    with connexion() as conn:
+        return stats_a_jour(conn)
+
+
+@en_cache
+def _noms_uniques(table):
+    """Vrai si aucun nom n'est partagé par deux lignes (les agrégats regroupent par nom)"""
+    with connexion() as conn:
+        return conn.execute(f"SELECT COUNT(nom) = COUNT(DISTINCT nom) FROM {table}").fetchone()[0] == 1
+
+
+def _lecture_stats_possible(table, filtres):
+    """Vrai si un agrégat sur tout l'historique, sans filtre, peut être lu dans les statistiques à jour"""
+    if any(filtres.get(cle) for cle in ('categories', 'produits', 'clients')):
+        return False
+    min_date, max_date = get_bornes_dates()
+    if min_date is None:
+        return False
+    if filtres.get('date_debut') is not None and pd.Timestamp(filtres['date_debut']) > pd.Timestamp(min_date):
+        return False
+    if filtres.get('date_fin') is not None and \
+            pd.Timestamp(filtres['date_fin']) + pd.Timedelta(days=1) <= pd.Timestamp(max_date):
+        return False
+    return _noms_uniques(table) and _stats_a_jour()
+
+
+def _lire_stats(entite, selection, jointure, ordre, limit=None):
+    """Lit les statistiques clients ou produits (alias s), triées selon un index
+
+    Tant que le précalcul ne les a pas reconstruites (base migrée, modification ou suppression
+    de ventes, changement de jour), elles sont calculées à la volée depuis l'agrégat journalier,
+    sans prendre le verrou d'écriture.
+    """
+    source = f"stats_{entite}s" if _stats_a_jour() else f"({requete_stats(entite, date.today())})"
+    query = f"SELECT {selection} FROM {source} s {jointure} ORDER BY {ordre}"
+    params = []
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(int(limit))
+    with connexion() as conn:
+        return pd.read_sql(query, conn, params=params)
+
+
+# Critères de classement des statistiques clients et produits, et colonne indexée correspondante
+CRITERES_CLASSEMENT = {
+    'montant_total': 'centimes_total',
+    'montant_90j': 'centimes_90j',
+    'montant_30j': 'centimes_30j',
+    'nb_ventes': 'nb_ventes',
+    'derniere_vente': 'derniere_vente',
+}
+
+# Indicateurs exposés pour chaque client ou produit
+INDICATEURS_STATS = (
+    "s.centimes_total / 100.0 AS montant_total, s.quantite_totale, s.nb_ventes, "
+    "s.centimes_total / 100.0 / s.nb_ventes AS panier_moyen, s.premiere_vente, s.derniere_vente, "
+    "CASE WHEN s.nb_ventes > 1 THEN (julianday(s.derniere_vente) - julianday(s.premiere_vente)) / (s.nb_ventes - 1) "
+    "END AS jours_entre_ventes, s.centimes_30j / 100.0 AS montant_30j, s.centimes_90j / 100.0 AS montant_90j"
+)
+
+
+@en_cache
+@instrumenter('sql.classement_clients')
+def classement_clients(critere='montant_total', limit=10):
+    """Meilleurs clients selon un critère des statistiques (chiffre d'affaires, 30/90 jours...)"""
+    if critere not in CRITERES_CLASSEMENT:
+        raise ValueError(f"Critère de classement inconnu: {critere}")
+    return _lire_stats('client', f"c.id AS client_id, c.nom AS client, {INDICATEURS_STATS}",
+                       "JOIN clients c ON c.id = s.client_id", f"s.{CRITERES_CLASSEMENT[critere]} DESC, client", limit)
+
+
+@en_cache
+@instrumenter('sql.classement_produits')
+def classement_produits(critere='montant_total', limit=10):
+    """Meilleurs produits selon un critère des statistiques"""
+    if critere not in CRITERES_CLASSEMENT:
+        raise ValueError(f"Critère de classement inconnu: {critere}")
+    return _lire_stats('produit', f"p.id AS produit_id, p.nom AS produit, p.categorie, {INDICATEURS_STATS}",
+                       "JOIN produits p ON p.id = s.produit_id", f"s.{CRITERES_CLASSEMENT[critere]} DESC, produit",
+                       limit)
+
+
+@en_cache
+@instrumenter('sql.historique_client')
+def historique_client(client_id, periode='Mensuel'):
+    """Ventes d'un client par période, lues via l'index client de l'agrégat journalier"""
+    if periode not in PERIODES_SQL:
+        raise ValueError(f"Période inconnue: {periode}")
+    expression = PERIODES_SQL[periode]
+    query = f'''
+    SELECT {expression} AS periode, {SOMME_CENTIMES} / 100.0 AS montant, SUM(v.quantite) AS quantite
+    FROM {TABLE_ROLLUP} v
+    WHERE v.client_id = ?
+    GROUP BY {expression}
+    ORDER BY periode
     '''
-    df = pd.read_sql(query, conn)
-    conn.close()
+    with connexion() as conn:
+        return pd.read_sql(query, conn, params=[int(client_id)])
+
+
+# Table d'échantillon lue par l'aperçu rapide, et quantile normal des intervalles de confiance à 95 %
+TABLE_ECHANTILLON = 'ventes_echantillon'
+Z_95 = 1.96
+
+
+def _estimer(expression, nom, filtres, condition=None, ordre=None):
+    """Estime par groupe les sommes de montant et de quantité à partir de l'échantillon
+
+    Estimateur de Horvitz-Thompson d'un tirage de Bernoulli de taux p : somme / p, de variance
+    estimée (1 - p) / p² x somme des carrés. Les colonnes *_marge donnent la demi-largeur de
+    l'intervalle de confiance à 95 %.
+    """
+    p = TAUX_ECHANTILLON
+    df = agreger(
+        f"{expression} AS {nom}, SUM(v.montant) AS montant, SUM(v.montant * v.montant) AS montant_carres, "
+        "SUM(v.quantite) AS quantite, SUM(v.quantite * v.quantite) AS quantite_carres, COUNT(*) AS echantillon",
+        expression, filtres, condition, ordre, source=TABLE_ECHANTILLON
+    )
+    for colonne in ('montant', 'quantite'):
+        df[f'{colonne}_marge'] = Z_95 * ((1 - p) * df.pop(f'{colonne}_carres')) ** 0.5 / p
+        df[colonne] = df[colonne] / p
     return df
 
+
+@en_cache
+@instrumenter('sql.estimer_kpis')
+def estimer_kpis(**filtres):
+    """Estimation rapide des KPI sur l'échantillon, avec les marges à 95 % (clés *_marge)"""
+    p = TAUX_ECHANTILLON
+    ligne = agreger(
+        "COUNT(*) AS n, COALESCE(SUM(v.montant), 0) AS somme, COALESCE(SUM(v.montant * v.montant), 0) AS carres, "
+        "COALESCE(SUM(v.quantite), 0) AS quantite, COALESCE(SUM(v.quantite * v.quantite), 0) AS quantite_carres",
+        None, filtres, source=TABLE_ECHANTILLON
+    ).iloc[0]
+    n = int(ligne['n'])
+    # Moyenne par vente : moyenne de l'échantillon, erreur type écart-type / racine(n)
+    variance = (ligne['carres'] - ligne['somme'] ** 2 / n) / (n - 1) if n > 1 else 0.0
+    return {
+        'total_ventes': ligne['somme'] / p,
+        'total_ventes_marge': Z_95 * ((1 - p) * ligne['carres']) ** 0.5 / p,
+        'total_quantite': ligne['quantite'] / p,
+        'total_quantite_marge': Z_95 * ((1 - p) * ligne['quantite_carres']) ** 0.5 / p,
+        'nb_ventes': n / p,
+        'nb_ventes_marge': Z_95 * ((1 - p) * n) ** 0.5 / p,
+        'moyenne_vente': ligne['somme'] / n if n else 0.0,
+        'moyenne_vente_marge': Z_95 * (max(variance, 0.0) / n) ** 0.5 if n else 0.0,
+        'echantillon': n,
+    }
+
+
+@en_cache
+@instrumenter('sql.estimer_par_periode')
+def estimer_par_periode(periode, **filtres):
+    """Estimation rapide de agreger_par_periode, avec les colonnes montant_marge et quantite_marge"""
+    if periode not in PERIODES_SQL:
+        raise ValueError(f"Période inconnue: {periode}")
+    df = _estimer(PERIODES_SQL[periode], 'periode', filtres, ordre='periode')
+    return df[['periode', 'montant', 'quantite', 'montant_marge', 'quantite_marge', 'echantillon']]
+
+
+@en_cache
+@instrumenter('sql.estimer_top_produits')
+def estimer_top_produits(top_n=5, critere='quantite', **filtres):
+    """Estimation rapide de agreger_top_produits (classement sur les valeurs estimées)"""
+    if critere not in ('quantite', 'montant'):
+        raise ValueError(f"Critère de tri inconnu: {critere}")
+    df = _estimer("p.nom", 'produit', filtres)
+    df = df.sort_values([critere, 'produit'], ascending=[False, True])
+    df = df.head(top_n) if top_n is not None else df
+    return df.set_index('produit')[['quantite', 'montant', 'quantite_marge', 'montant_marge', 'echantillon']]
+
+
+@en_cache
+@instrumenter('sql.estimer_repartition')
+def estimer_repartition(by='categorie', limit=None, **filtres):
+    """Estimation rapide de agreger_repartition, avec la colonne montant_marge"""
+    if by not in REPARTITIONS_SQL:
+        raise ValueError(f"Répartition inconnue: {by}")
+    expression = REPARTITIONS_SQL[by]
+    df = _estimer(expression, by, filtres, condition=f"{expression} IS NOT NULL")
+    df = df.sort_values(['montant', by], ascending=[False, True], ignore_index=True)
+    df = df.head(limit) if limit is not None else df
+    return df[[by, 'montant', 'montant_marge', 'echantillon']]
+
+
+@en_cache
+@instrumenter('sql.get_produits')
 def get_produits():
     """Récupère tous les produits"""
-    conn = connect_db()
-    df = pd.read_sql("SELECT * FROM produits", conn)
-    conn.close()
+    with connexion() as conn:
+        df = pd.read_sql("SELECT * FROM produits", conn)
     return df
 
+@en_cache
+@instrumenter('sql.get_clients')
 def get_clients():
     """Récupère tous les clients"""
-    conn = connect_db()
-    df = pd.read_sql("SELECT * FROM clients", conn)
-    conn.close()
+    with connexion() as conn:
+        df = pd.read_sql("SELECT * FROM clients", conn)
     return df
 
-def insert_vente(date, produit_id, client_id, quantite, montant):
-    """Insère une nouvelle vente"""
-    conn = connect_db()
-    cursor = conn.cursor()
-    query = "INSERT INTO ventes (date_vente, produit_id, client_id, quantite, montant) VALUES (?, ?, ?, ?, ?)"
-    cursor.execute(query, (date, produit_id, client_id, quantite, montant))
-    conn.commit()
-    conn.close()
+# Nombre maximal d'options renvoyées par les recherches des sélecteurs
+LIMITE_RECHERCHE = 200
+
 
+def _condition_prefixe(prefixe):
+    """Condition de recherche par préfixe insensible à la casse, exploitable par les index NOCASE"""
+    if not prefixe:
+        return "", []
+    # Borne haute : le préfixe suivi du plus grand caractère Unicode
+    return "WHERE nom >= ? COLLATE NOCASE AND nom < ? COLLATE NOCASE", [prefixe, prefixe + '\U0010ffff']
+
+
+@en_cache
+@instrumenter('sql.rechercher_produits')
+def rechercher_produits(prefixe='', limit=LIMITE_RECHERCHE):
+    """Recherche les produits dont le nom commence par le préfixe (id -> libellé, id -> prix)"""
+    condition, params = _condition_prefixe(prefixe.strip())
+    query = f"SELECT id, nom, categorie, prix_unitaire FROM produits {condition} ORDER BY nom COLLATE NOCASE LIMIT ?"
+    with connexion() as conn:
+        lignes = conn.execute(query, params + [int(limit)]).fetchall()
+    libelles = {id_: f"{nom} - {categorie}" for id_, nom, categorie, _ in lignes}
+    prix = {id_: prix_unitaire for id_, _, _, prix_unitaire in lignes}
+    return libelles, prix
+
+
+@en_cache
+@instrumenter('sql.rechercher_clients')
+def rechercher_clients(prefixe='', limit=LIMITE_RECHERCHE):
+    """Recherche les clients dont le nom commence par le préfixe (id -> nom)"""
+    condition, params = _condition_prefixe(prefixe.strip())
+    query = f"SELECT id, nom FROM clients {condition} ORDER BY nom COLLATE NOCASE LIMIT ?"
+    with connexion() as conn:
+        return dict(conn.execute(query, params + [int(limit)]).fetchall())
+
+
+@instrumenter('sql.insert_vente')
+def insert_vente(date, produit_id, client_id, quantite):
+    """Enregistre une vente via la file d'écriture groupée
+
+    Le montant est calculé à partir du prix unitaire du produit en base.
+    Retourne {'id', 'montant'} ; lève ValueError si le produit, le client ou la quantité est invalide,
+    et TimeoutError si la vente n'a pas été validée à temps (elle est alors annulée, jamais insérée).
+    """
+    return attendre_ventes([soumettre_vente(date, produit_id, client_id, quantite)])[0]
+
+@instrumenter('sql.insert_produit')
 def insert_produit(nom, categorie, prix_unitaire):
     """Insère un nouveau produit"""
-    conn = connect_db()
-    cursor = conn.cursor()
     query = "INSERT INTO produits (nom, categorie, prix_unitaire) VALUES (?, ?, ?)"
-    cursor.execute(query, (nom, categorie, prix_unitaire))
-    conn.commit()
-    conn.close()
+    with connexion() as conn:
+        with conn:
+            conn.execute(query, (nom, categorie, prix_unitaire))
+            incrementer_version(conn)
+    invalider()
 
+@instrumenter('sql.insert_client')
 def insert_client(nom, email, telephone):
     """Insère un nouveau client"""
-    conn = connect_db()
-    cursor = conn.cursor()
     query = "INSERT INTO clients (nom, email, telephone) VALUES (?, ?, ?)"
-    cursor.execute(query, (nom, email, telephone))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    with connexion() as conn:
+        with conn:
+            conn.execute(query, (nom, email, telephone))
+            incrementer_version(conn)
+    invalider()
+
+
+def _etape_indexee(etape):
+    """Vrai si une étape du plan lit une table par un index (ou la clé primaire d'une table WITHOUT ROWID)"""
+    return 'USING' in etape and ('INDEX' in etape or 'PRIMARY KEY' in etape)
+
+
+def verifier_plans_index():
+    """Vérifie via EXPLAIN QUERY PLAN que les requêtes du tableau de bord utilisent les index
+
+    Couvre les lectures filtrées de ventes, les agrégats filtrés de l'agrégat journalier,
+    l'historique d'un client et les classements des statistiques.
+    """
+    annee = {'date_debut': '2000-01-01', 'date_fin': '2000-12-31'}
+    mensuel = PERIODES_SQL['Mensuel']
+    somme = f"{SOMME_CENTIMES} AS centimes"
+    requetes = {
+        'periode': requete_ventes(**annee),
+        'produit': requete_ventes(produits=['?'], **annee),
+        'client': requete_ventes(clients=['?']),
+        'categorie': requete_ventes(categories=['?']),
+        'rollup_periode': requete_agregat(f"{mensuel} AS periode, {somme}", mensuel, annee),
+        'rollup_produit': requete_agregat(f"p.nom AS produit, {somme}", "p.nom", dict(annee, produits=['?'])),
+        'rollup_client': requete_agregat(f"p.nom AS produit, {somme}", "p.nom", {'clients': ['?']}),
+        'rollup_categorie': requete_agregat(f"p.nom AS produit, {somme}", "p.nom", {'categories': ['?']}),
+        'historique_client': (f"SELECT {mensuel} AS periode, {somme} FROM {TABLE_ROLLUP} v "
+                              f"WHERE v.client_id = ? GROUP BY {mensuel}", [0]),
+        'classement_clients': ("SELECT client_id FROM stats_clients s ORDER BY s.centimes_total DESC LIMIT 10", []),
+        'classement_produits': ("SELECT produit_id FROM stats_produits s ORDER BY s.centimes_90j DESC LIMIT 10", []),
+    }
+    resultats = {}
+    with connexion() as conn:
+        plans = {nom: expliquer_requete(conn, query, params) for nom, (query, params) in requetes.items()}
+    for nom, plan in plans.items():
+        resultats[nom] = {
+            'plan': plan,
+            # Un parcours de ventes ou de l'agrégat est un scan complet ; celui d'un index de classement s'arrête au LIMIT
+            'utilise_index': any(_etape_indexee(etape) for etape in plan)
+                             and not any(etape.startswith('SCAN v') or (etape.startswith('SCAN') and 'INDEX' not in etape)
+                                         for etape in plan),
+        }
+    return resultats
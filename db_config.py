@@ -1,14 +1,134 @@
+import os
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
 
+# Chemin de la base, surchargeable par variable d'environnement ou via configurer_base()
+DB_PATH = os.environ.get('VENTES_DB_PATH', 'ventes.db')
 
-def connect_db():
-    """Établit une connexion à la base de données SQLite"""
-    return sqlite3.connect('ventes.db', check_same_thread=False)
+# Nombre maximal de connexions conservées dans le pool
+POOL_TAILLE = int(os.environ.get('VENTES_DB_POOL_TAILLE', '8'))
 
+# Part des ventes recopiées dans ventes_echantillon pour l'aperçu rapide ; la sélection
+# par hachage multiplicatif de l'id est déterministe, donc maintenable par lots
+TAUX_ECHANTILLON = 0.01
+CONDITION_ECHANTILLON = f"(id * 2654435761) % 4294967296 < {int(TAUX_ECHANTILLON * 4294967296)}"
 
-def init_db():
-    """Initialise la base de données avec les tables nécessaires"""
-    conn = connect_db()
+# Source des reconstructions de statistiques : l'agrégat journalier (client 0 = vente anonyme)
+TABLE_ROLLUP_STATS = 'ventes_daily'
+
+# Moteur des agrégats analytiques : 'sqlite' (requêtes sur ventes_daily) ou 'parquet'
+# (archive colonnaire des ventes par mois, complétée à la lecture, reconstruite par le précalcul, voir stockage.py)
+MOTEUR_ANALYTIQUE = os.environ.get('VENTES_MOTEUR', 'sqlite')
+
+# Dossier de l'archive Parquet ; par défaut à côté de la base (ventes.db -> ventes_parquet)
+ARCHIVE_PARQUET = os.environ.get('VENTES_ARCHIVE')
+
+# Réglages appliqués une seule fois à chaque nouvelle connexion
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -32768",
+    "PRAGMA temp_store = MEMORY",
+]
+
+
+def connect_db(chemin=None):
+    """Établit une nouvelle connexion réglée à la base de données SQLite (hors pool)"""
+    conn = sqlite3.connect(chemin or DB_PATH, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class PoolConnexions:
+    """Pool thread-safe de connexions SQLite réutilisées d'un appel à l'autre"""
+
+    def __init__(self, chemin, taille_max=POOL_TAILLE):
+        self.chemin = chemin
+        self._libres = queue.LifoQueue(maxsize=taille_max)
+
+    def acquerir(self):
+        """Retourne une connexion libre, ou en ouvre une nouvelle si le pool est vide"""
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            return connect_db(self.chemin)
+
+    def liberer(self, conn):
+        """Remet la connexion dans le pool après avoir annulé toute transaction restée ouverte"""
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._libres.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def fermer(self):
+        """Ferme toutes les connexions libres du pool"""
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_verrou = threading.Lock()
+_bases_initialisees = set()
+
+
+def configurer_base(chemin):
+    """Change la base utilisée par l'application et réinitialise le pool"""
+    global DB_PATH, _pool
+    with _verrou:
+        DB_PATH = chemin
+        if _pool is not None:
+            _pool.fermer()
+        _pool = None
+
+
+def _obtenir_pool():
+    global _pool
+    with _verrou:
+        if _pool is None or _pool.chemin != DB_PATH:
+            _pool = PoolConnexions(DB_PATH)
+        return _pool
+
+
+@contextmanager
+def connexion():
+    """Prête une connexion du pool le temps d'un bloc with
+
+    Le schéma est initialisé au premier emprunt. Les écritures se font dans un bloc
+    `with conn:` pour être validées (ou annulées) d'un seul tenant.
+    """
+    init_db()
+    pool = _obtenir_pool()
+    conn = pool.acquerir()
+    try:
+        yield conn
+    finally:
+        pool.liberer(conn)
+
+
+def init_db(force=False):
+    """Initialise la base de données avec les tables nécessaires (une seule fois par processus)"""
+    chemin = DB_PATH
+    if chemin in _bases_initialisees and not force:
+        return
+    with _verrou:
+        if chemin in _bases_initialisees and not force:
+            return
+        _creer_schema(chemin)
+        _bases_initialisees.add(chemin)
+
+
+def _creer_schema(chemin):
+    conn = connect_db(chemin)
     cursor = conn.cursor()
 
     # Table clients
@@ -46,4 +166,483 @@ def init_db():
     ''')
 
     conn.commit()
-    conn.close()
\ No newline at end of file
+    appliquer_migrations(conn)
+    conn.close()
+
+
+# Migrations successives du schéma, indexées par leur numéro de version (PRAGMA user_version)
+MIGRATIONS = [
+    (1, [
+        # Index couvrant pour les filtres et agrégations par période
+        "CREATE INDEX IF NOT EXISTS idx_ventes_date ON ventes(date_vente, produit_id, client_id, quantite, montant)",
+        "CREATE INDEX IF NOT EXISTS idx_ventes_produit_date ON ventes(produit_id, date_vente, client_id, quantite, montant)",
+        "CREATE INDEX IF NOT EXISTS idx_ventes_client_date ON ventes(client_id, date_vente, produit_id, quantite, montant)",
+        "CREATE INDEX IF NOT EXISTS idx_produits_categorie ON produits(categorie, nom)",
+        "CREATE INDEX IF NOT EXISTS idx_produits_nom ON produits(nom, categorie)",
+        "CREATE INDEX IF NOT EXISTS idx_clients_nom ON clients(nom)",
+    ]),
+    (2, [
+        # Agrégat journalier jour x produit x client (client 0 = vente anonyme)
+        '''
+        CREATE TABLE IF NOT EXISTS ventes_daily (
+            date_vente TEXT NOT NULL,
+            produit_id INTEGER NOT NULL,
+            client_id INTEGER NOT NULL DEFAULT 0,
+            montant REAL NOT NULL,
+            quantite INTEGER NOT NULL,
+            nb_ventes INTEGER NOT NULL,
+            PRIMARY KEY (date_vente, produit_id, client_id)
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_ventes_daily_produit ON ventes_daily(produit_id, date_vente)",
+        "CREATE INDEX IF NOT EXISTS idx_ventes_daily_client ON ventes_daily(client_id, date_vente)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_ventes_daily_insert AFTER INSERT ON ventes
+        BEGIN
+            INSERT INTO ventes_daily (date_vente, produit_id, client_id, montant, quantite, nb_ventes)
+            VALUES (COALESCE(date(NEW.date_vente), NEW.date_vente), NEW.produit_id, COALESCE(NEW.client_id, 0),
+                    NEW.montant, NEW.quantite, 1)
+            ON CONFLICT (date_vente, produit_id, client_id) DO UPDATE SET
+                montant = montant + excluded.montant,
+                quantite = quantite + excluded.quantite,
+                nb_ventes = nb_ventes + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_ventes_daily_delete AFTER DELETE ON ventes
+        BEGIN
+            UPDATE ventes_daily
+            SET montant = montant - OLD.montant, quantite = quantite - OLD.quantite, nb_ventes = nb_ventes - 1
+            WHERE date_vente = COALESCE(date(OLD.date_vente), OLD.date_vente)
+              AND produit_id = OLD.produit_id AND client_id = COALESCE(OLD.client_id, 0);
+            DELETE FROM ventes_daily
+            WHERE date_vente = COALESCE(date(OLD.date_vente), OLD.date_vente)
+              AND produit_id = OLD.produit_id AND client_id = COALESCE(OLD.client_id, 0) AND nb_ventes <= 0;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_ventes_daily_update AFTER UPDATE OF date_vente, produit_id, client_id, quantite, montant ON ventes
+        BEGIN
+            UPDATE ventes_daily
+            SET montant = montant - OLD.montant, quantite = quantite - OLD.quantite, nb_ventes = nb_ventes - 1
+            WHERE date_vente = COALESCE(date(OLD.date_vente), OLD.date_vente)
+              AND produit_id = OLD.produit_id AND client_id = COALESCE(OLD.client_id, 0);
+            DELETE FROM ventes_daily
+            WHERE date_vente = COALESCE(date(OLD.date_vente), OLD.date_vente)
+              AND produit_id = OLD.produit_id AND client_id = COALESCE(OLD.client_id, 0) AND nb_ventes <= 0;
+            INSERT INTO ventes_daily (date_vente, produit_id, client_id, montant, quantite, nb_ventes)
+            VALUES (COALESCE(date(NEW.date_vente), NEW.date_vente), NEW.produit_id, COALESCE(NEW.client_id, 0),
+                    NEW.montant, NEW.quantite, 1)
+            ON CONFLICT (date_vente, produit_id, client_id) DO UPDATE SET
+                montant = montant + excluded.montant,
+                quantite = quantite + excluded.quantite,
+                nb_ventes = nb_ventes + 1;
+        END
+        ''',
+        "DELETE FROM ventes_daily",
+        '''
+        INSERT INTO ventes_daily (date_vente, produit_id, client_id, montant, quantite, nb_ventes)
+        SELECT COALESCE(date(date_vente), date_vente), produit_id, COALESCE(client_id, 0),
+               SUM(montant), SUM(quantite), COUNT(*)
+        FROM ventes
+        GROUP BY 1, 2, 3
+        ''',
+    ]),
+    (3, [
+        # Les insertions mettent à jour ventes_daily explicitement (cumuler_ventes_daily), par lot
+        # pour les imports en masse : le trigger ligne à ligne divisait le débit d'insertion par deux
+        "DROP TRIGGER IF EXISTS trg_ventes_daily_insert",
+    ]),
+    (4, [
+        # Compteurs partagés entre processus : version_donnees change à chaque écriture,
+        # generation seulement lors des modifications et suppressions (changements non-ajout)
+        "CREATE TABLE IF NOT EXISTS meta (cle TEXT PRIMARY KEY, valeur INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO meta (cle, valeur) VALUES ('version_donnees', 0), ('generation', 0)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_ventes_update_version AFTER UPDATE ON ventes
+        BEGIN
+            UPDATE meta SET valeur = valeur + 1 WHERE cle IN ('version_donnees', 'generation');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_ventes_delete_version AFTER DELETE ON ventes
+        BEGIN
+            UPDATE meta SET valeur = valeur + 1 WHERE cle IN ('version_donnees', 'generation');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_produits_update_version AFTER UPDATE ON produits
+        BEGIN
+            UPDATE meta SET valeur = valeur + 1 WHERE cle IN ('version_donnees', 'generation');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_produits_delete_version AFTER DELETE ON produits
+        BEGIN
+            UPDATE meta SET valeur = valeur + 1 WHERE cle IN ('version_donnees', 'generation');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_clients_update_version AFTER UPDATE ON clients
+        BEGIN
+            UPDATE meta SET valeur = valeur + 1 WHERE cle IN ('version_donnees', 'generation');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_clients_delete_version AFTER DELETE ON clients
+        BEGIN
+            UPDATE meta SET valeur = valeur + 1 WHERE cle IN ('version_donnees', 'generation');
+        END
+        ''',
+    ]),
+    (5, [
+        # Recherche par préfixe insensible à la casse pour les sélecteurs du formulaire de vente
+        "CREATE INDEX IF NOT EXISTS idx_produits_nom_nocase ON produits(nom COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_clients_nom_nocase ON clients(nom COLLATE NOCASE)",
+    ]),
+    (6, [
+        # Échantillon des ventes pour l'aperçu rapide, mêmes colonnes que ventes ; les ajouts
+        # sont recopiés par lot (cumuler_echantillon), modifications et suppressions par trigger
+        '''
+        CREATE TABLE IF NOT EXISTS ventes_echantillon (
+            id INTEGER PRIMARY KEY,
+            date_vente TEXT NOT NULL,
+            produit_id INTEGER NOT NULL,
+            client_id INTEGER,
+            quantite INTEGER NOT NULL,
+            montant REAL NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_ventes_echantillon_date ON ventes_echantillon(date_vente)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_ventes_echantillon_delete AFTER DELETE ON ventes
+        BEGIN
+            DELETE FROM ventes_echantillon WHERE id = OLD.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_ventes_echantillon_update AFTER UPDATE OF date_vente, produit_id, client_id, quantite, montant ON ventes
+        BEGIN
+            UPDATE ventes_echantillon
+            SET date_vente = NEW.date_vente, produit_id = NEW.produit_id, client_id = NEW.client_id,
+                quantite = NEW.quantite, montant = NEW.montant
+            WHERE id = NEW.id;
+        END
+        ''',
+        "DELETE FROM ventes_echantillon",
+        f'''
+        INSERT INTO ventes_echantillon (id, date_vente, produit_id, client_id, quantite, montant)
+        SELECT id, date_vente, produit_id, client_id, quantite, montant FROM ventes WHERE {CONDITION_ECHANTILLON}
+        ''',
+    ]),
+    (7, [
+        # Statistiques cumulées par client et par produit (montants en centimes), tenues à jour
+        # par lot à chaque écriture ; construites par actualiser_stats (stats_generation = -1)
+        *[f'''
+        CREATE TABLE IF NOT EXISTS stats_{entite}s (
+            {entite}_id INTEGER PRIMARY KEY,
+            centimes_total INTEGER NOT NULL,
+            quantite_totale INTEGER NOT NULL,
+            nb_ventes INTEGER NOT NULL,
+            premiere_vente TEXT NOT NULL,
+            derniere_vente TEXT NOT NULL,
+            centimes_30j INTEGER NOT NULL DEFAULT 0,
+            centimes_90j INTEGER NOT NULL DEFAULT 0
+        )
+        ''' for entite in ('client', 'produit')],
+        *[f"CREATE INDEX IF NOT EXISTS idx_stats_{entite}s_{colonne} ON stats_{entite}s({colonne} DESC)"
+          for entite in ('client', 'produit')
+          for colonne in ('centimes_total', 'centimes_30j', 'centimes_90j', 'nb_ventes', 'derniere_vente')],
+        "CREATE INDEX IF NOT EXISTS idx_stats_produits_quantite ON stats_produits(quantite_totale DESC)",
+        "INSERT OR IGNORE INTO meta (cle, valeur) VALUES ('stats_generation', -1), ('stats_jour', 0)",
+    ]),
+    (8, [
+        # Montants de l'agrégat journalier aussi en centimes entiers, arrondis vente par vente :
+        # toutes les sommes (agrégats, statistiques, archive Parquet) suivent la même règle d'arrondi
+        "ALTER TABLE ventes_daily ADD COLUMN centimes INTEGER NOT NULL DEFAULT 0",
+        "DROP TRIGGER IF EXISTS trg_ventes_daily_delete",
+        "DROP TRIGGER IF EXISTS trg_ventes_daily_update",
+        '''
+        CREATE TRIGGER trg_ventes_daily_delete AFTER DELETE ON ventes
+        BEGIN
+            UPDATE ventes_daily
+            SET montant = montant - OLD.montant, centimes = centimes - CAST(ROUND(OLD.montant * 100) AS INTEGER),
+                quantite = quantite - OLD.quantite, nb_ventes = nb_ventes - 1
+            WHERE date_vente = COALESCE(date(OLD.date_vente), OLD.date_vente)
+              AND produit_id = OLD.produit_id AND client_id = COALESCE(OLD.client_id, 0);
+            DELETE FROM ventes_daily
+            WHERE date_vente = COALESCE(date(OLD.date_vente), OLD.date_vente)
+              AND produit_id = OLD.produit_id AND client_id = COALESCE(OLD.client_id, 0) AND nb_ventes <= 0;
+        END
+        ''',
+        '''
+        CREATE TRIGGER trg_ventes_daily_update AFTER UPDATE OF date_vente, produit_id, client_id, quantite, montant ON ventes
+        BEGIN
+            UPDATE ventes_daily
+            SET montant = montant - OLD.montant, centimes = centimes - CAST(ROUND(OLD.montant * 100) AS INTEGER),
+                quantite = quantite - OLD.quantite, nb_ventes = nb_ventes - 1
+            WHERE date_vente = COALESCE(date(OLD.date_vente), OLD.date_vente)
+              AND produit_id = OLD.produit_id AND client_id = COALESCE(OLD.client_id, 0);
+            DELETE FROM ventes_daily
+            WHERE date_vente = COALESCE(date(OLD.date_vente), OLD.date_vente)
+              AND produit_id = OLD.produit_id AND client_id = COALESCE(OLD.client_id, 0) AND nb_ventes <= 0;
+            INSERT INTO ventes_daily (date_vente, produit_id, client_id, montant, centimes, quantite, nb_ventes)
+            VALUES (COALESCE(date(NEW.date_vente), NEW.date_vente), NEW.produit_id, COALESCE(NEW.client_id, 0),
+                    NEW.montant, CAST(ROUND(NEW.montant * 100) AS INTEGER), NEW.quantite, 1)
+            ON CONFLICT (date_vente, produit_id, client_id) DO UPDATE SET
+                montant = montant + excluded.montant,
+                centimes = centimes + excluded.centimes,
+                quantite = quantite + excluded.quantite,
+                nb_ventes = nb_ventes + 1;
+        END
+        ''',
+        "DELETE FROM ventes_daily",
+        '''
+        INSERT INTO ventes_daily (date_vente, produit_id, client_id, montant, centimes, quantite, nb_ventes)
+        SELECT COALESCE(date(date_vente), date_vente), produit_id, COALESCE(client_id, 0),
+               SUM(montant), SUM(CAST(ROUND(montant * 100) AS INTEGER)), SUM(quantite), COUNT(*)
+        FROM ventes
+        GROUP BY 1, 2, 3
+        ''',
+        # Statistiques reconstruites par le prochain précalcul avec la nouvelle règle d'arrondi
+        "UPDATE meta SET valeur = -1 WHERE cle = 'stats_generation'",
+    ]),
+]
+
+
+def appliquer_migrations(conn):
+    """Met à jour le schéma d'une base existante jusqu'à la dernière version connue"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for numero, instructions in MIGRATIONS:
+        if numero <= version:
+            continue
+        with conn:
+            for instruction in instructions:
+                conn.execute(instruction)
+            conn.execute(f"PRAGMA user_version = {numero}")
+        version = numero
+    return version
+
+
+def expliquer_requete(conn, query, params=()):
+    """Retourne le plan d'exécution SQLite (EXPLAIN QUERY PLAN) d'une requête"""
+    return [ligne[3] for ligne in conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()]
+
+
+def incrementer_version(conn):
+    """Signale une écriture en incrémentant le compteur de version des données (dans la transaction)"""
+    conn.execute("UPDATE meta SET valeur = valeur + 1 WHERE cle = 'version_donnees'")
+
+
+def lire_version(conn):
+    """Lit les compteurs (version_donnees, generation) des données"""
+    valeurs = dict(conn.execute("SELECT cle, valeur FROM meta").fetchall())
+    return valeurs.get('version_donnees', 0), valeurs.get('generation', 0)
+
+
+def cumuler_ventes_daily(conn, id_min):
+    """Ajoute à ventes_daily les ventes d'identifiant supérieur à id_min (insérées en masse)"""
+    conn.execute('''
+    INSERT INTO ventes_daily (date_vente, produit_id, client_id, montant, centimes, quantite, nb_ventes)
+    SELECT COALESCE(date(date_vente), date_vente), produit_id, COALESCE(client_id, 0),
+           SUM(montant), SUM(CAST(ROUND(montant * 100) AS INTEGER)), SUM(quantite), COUNT(*)
+    FROM ventes
+    WHERE id > ?
+    GROUP BY 1, 2, 3
+    ON CONFLICT (date_vente, produit_id, client_id) DO UPDATE SET
+        montant = montant + excluded.montant,
+        centimes = centimes + excluded.centimes,
+        quantite = quantite + excluded.quantite,
+        nb_ventes = nb_ventes + excluded.nb_ventes
+    ''', (id_min,))
+
+
+def cumuler_echantillon(conn, id_min):
+    """Recopie dans ventes_echantillon les ventes échantillonnées d'identifiant supérieur à id_min"""
+    conn.execute(f'''
+    INSERT INTO ventes_echantillon (id, date_vente, produit_id, client_id, quantite, montant)
+    SELECT id, date_vente, produit_id, client_id, quantite, montant
+    FROM ventes
+    WHERE id > ? AND {CONDITION_ECHANTILLON}
+    ''', (id_min,))
+
+
+def _fenetres_glissantes(jour_ordinal):
+    """Bornes (début 30 j, début 90 j, lendemain) des cumuls glissants arrêtés au jour donné"""
+    jour = date.fromordinal(jour_ordinal)
+    return ((jour - timedelta(days=29)).isoformat(), (jour - timedelta(days=89)).isoformat(),
+            (jour + timedelta(days=1)).isoformat())
+
+
+def _selection_stats(entite, source, montant, nb_ventes, jour_ordinal):
+    """Requête SELECT des statistiques par client ou produit, depuis ventes ou ventes_daily"""
+    debut_30j, debut_90j, fin = _fenetres_glissantes(jour_ordinal)
+    jour_vente = "COALESCE(date(date_vente), date_vente)"
+    return f'''
+    SELECT {entite}_id, SUM({montant}) AS centimes_total, SUM(quantite) AS quantite_totale,
+           SUM({nb_ventes}) AS nb_ventes, MIN({jour_vente}) AS premiere_vente, MAX({jour_vente}) AS derniere_vente,
+           SUM(CASE WHEN date_vente >= '{debut_30j}' AND date_vente < '{fin}' THEN {montant} ELSE 0 END) AS centimes_30j,
+           SUM(CASE WHEN date_vente >= '{debut_90j}' AND date_vente < '{fin}' THEN {montant} ELSE 0 END) AS centimes_90j
+    FROM {source}
+    '''
+
+
+# Colonnes des tables stats_clients et stats_produits (hors identifiant), dans l'ordre de _selection_stats
+COLONNES_STATS = "centimes_total, quantite_totale, nb_ventes, premiere_vente, derniere_vente, centimes_30j, centimes_90j"
+
+# Montant d'une vente en centimes entiers ; l'agrégat journalier en cumule la somme (colonne centimes),
+# les statistiques arrondissent donc vente par vente qu'elles lisent ventes ou ventes_daily
+CENTIMES = "CAST(ROUND(montant * 100) AS INTEGER)"
+
+
+def requete_stats(entite, jour=None):
+    """Requête des statistiques complètes d'une entité ('client' ou 'produit') depuis l'agrégat journalier,
+    cumuls glissants arrêtés au jour donné (aujourd'hui par défaut)"""
+    jour_ordinal = (jour or date.today()).toordinal()
+    return f"{_selection_stats(entite, TABLE_ROLLUP_STATS, 'centimes', 'nb_ventes', jour_ordinal)} " \
+           f"WHERE {entite}_id != 0 GROUP BY {entite}_id"
+
+
+def _etat_stats(conn):
+    meta = dict(conn.execute("SELECT cle, valeur FROM meta").fetchall())
+    return meta['generation'], meta['stats_generation'], meta['stats_jour']
+
+
+def stats_a_jour(conn, jour=None):
+    """Vrai si les statistiques reflètent toutes les ventes et des cumuls glissants arrêtés au jour donné"""
+    generation, stats_generation, stats_jour = _etat_stats(conn)
+    return generation == stats_generation and stats_jour == (jour or date.today()).toordinal()
+
+
+def cumuler_stats(conn, id_min):
+    """Ajoute aux statistiques clients et produits les ventes d'identifiant supérieur à id_min"""
+    generation, stats_generation, jour_ordinal = _etat_stats(conn)
+    if generation != stats_generation or not jour_ordinal:
+        # Reconstruction complète en attente (base migrée, modification ou suppression) :
+        # elle lira ces ventes dans l'agrégat journalier
+        return
+    for entite in ('client', 'produit'):
+        selection = _selection_stats(entite, 'ventes', CENTIMES, 1, jour_ordinal)
+        conn.execute(f'''
+        INSERT INTO stats_{entite}s ({entite}_id, {COLONNES_STATS})
+        {selection} WHERE id > ? AND {entite}_id IS NOT NULL GROUP BY {entite}_id
+        ON CONFLICT ({entite}_id) DO UPDATE SET
+            centimes_total = centimes_total + excluded.centimes_total,
+            quantite_totale = quantite_totale + excluded.quantite_totale,
+            nb_ventes = nb_ventes + excluded.nb_ventes,
+            premiere_vente = MIN(premiere_vente, excluded.premiere_vente),
+            derniere_vente = MAX(derniere_vente, excluded.derniere_vente),
+            centimes_30j = centimes_30j + excluded.centimes_30j,
+            centimes_90j = centimes_90j + excluded.centimes_90j
+        ''', (id_min,))
+
+
+def cumuler_nouvelles_ventes(conn, id_min):
+    """Met à jour toutes les tables dérivées (agrégat journalier, échantillon, statistiques)
+    avec les ventes d'identifiant supérieur à id_min, dans la transaction d'insertion"""
+    cumuler_ventes_daily(conn, id_min)
+    cumuler_echantillon(conn, id_min)
+    cumuler_stats(conn, id_min)
+
+
+def actualiser_stats(conn, jour=None, forcer=False):
+    """Reconstruit les statistiques après une modification ou suppression de ventes, et recalcule
+    les cumuls glissants au changement de jour ; sans effet (lecture seule) si elles sont à jour
+
+    Appelée par le précalcul en arrière-plan et en ligne de commande, jamais lors d'une lecture :
+    la reconstruction garde le verrou d'écriture plusieurs secondes sur une grande base.
+    """
+    jour = jour or date.today()
+    jour_ordinal = jour.toordinal()
+    if not forcer and stats_a_jour(conn, jour):
+        return False
+
+    with conn:
+        # Verrou d'écriture pris avant de relire l'état : une seule actualisation à la fois
+        conn.execute("BEGIN IMMEDIATE")
+        generation, stats_generation, stats_jour = _etat_stats(conn)
+        if forcer or generation != stats_generation:
+            for entite in ('client', 'produit'):
+                conn.execute(f"DELETE FROM stats_{entite}s")
+                conn.execute(f"INSERT INTO stats_{entite}s ({entite}_id, {COLONNES_STATS}) "
+                             f"{requete_stats(entite, jour)}")
+        elif stats_jour != jour_ordinal:
+            # Sous-requête corrélée (UPDATE ... FROM exigerait SQLite 3.33) : les lignes de chaque
+            # client ou produit sont lues par l'index (entite_id, date_vente) de l'agrégat
+            debut_30j, debut_90j, fin = _fenetres_glissantes(jour_ordinal)
+            for entite in ('client', 'produit'):
+                conn.execute(f'''
+                UPDATE stats_{entite}s SET (centimes_30j, centimes_90j) = (
+                    SELECT COALESCE(SUM(CASE WHEN date_vente >= '{debut_30j}' THEN centimes ELSE 0 END), 0),
+                           COALESCE(SUM(centimes), 0)
+                    FROM {TABLE_ROLLUP_STATS} d
+                    WHERE d.{entite}_id = stats_{entite}s.{entite}_id
+                      AND date_vente >= '{debut_90j}' AND date_vente < '{fin}'
+                )
+                WHERE centimes_30j != 0 OR centimes_90j != 0 OR {entite}_id IN (
+                    SELECT {entite}_id FROM {TABLE_ROLLUP_STATS} WHERE date_vente >= '{debut_90j}' AND date_vente < '{fin}'
+                )
+                ''')
+        conn.execute("UPDATE meta SET valeur = ? WHERE cle = 'stats_generation'", (generation,))
+        conn.execute("UPDATE meta SET valeur = ? WHERE cle = 'stats_jour'", (jour_ordinal,))
+    return True
+
+
+def reconstruire_echantillon():
+    """Régénère la table d'échantillon (à relancer après un changement de TAUX_ECHANTILLON)"""
+    init_db()
+    conn = connect_db()
+    with conn:
+        conn.execute("DELETE FROM ventes_echantillon")
+        cumuler_echantillon(conn, 0)
+        incrementer_version(conn)
+    nb_lignes = conn.execute("SELECT COUNT(*) FROM ventes_echantillon").fetchone()[0]
+    conn.close()
+    return nb_lignes
+
+
+def reconstruire_ventes_daily():
+    """Régénère entièrement la table d'agrégats journaliers à partir de la table ventes"""
+    init_db()
+    conn = connect_db()
+    with conn:
+        conn.execute("DELETE FROM ventes_daily")
+        conn.execute('''
+        INSERT INTO ventes_daily (date_vente, produit_id, client_id, montant, centimes, quantite, nb_ventes)
+        SELECT COALESCE(date(date_vente), date_vente), produit_id, COALESCE(client_id, 0),
+               SUM(montant), SUM(CAST(ROUND(montant * 100) AS INTEGER)), SUM(quantite), COUNT(*)
+        FROM ventes
+        GROUP BY 1, 2, 3
+        ''')
+        # Les statistiques clients et produits seront reconstruites par le prochain précalcul
+        conn.execute("UPDATE meta SET valeur = -1 WHERE cle = 'stats_generation'")
+        incrementer_version(conn)
+    nb_lignes = conn.execute("SELECT COUNT(*) FROM ventes_daily").fetchone()[0]
+    conn.close()
+    return nb_lignes
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Administration de la base de ventes")
+    parser.add_argument("--rebuild-daily", action="store_true",
+                        help="Reconstruit la table d'agrégats journaliers ventes_daily")
+    parser.add_argument("--rebuild-sample", action="store_true",
+                        help="Reconstruit la table d'échantillon ventes_echantillon de l'aperçu rapide")
+    parser.add_argument("--rebuild-stats", action="store_true",
+                        help="Reconstruit les statistiques clients et produits (stats_clients, stats_produits)")
+    args = parser.parse_args()
+
+    init_db()
+    if args.rebuild_daily:
+        print(f"ventes_daily reconstruite : {reconstruire_ventes_daily()} lignes")
+    if args.rebuild_sample:
+        print(f"ventes_echantillon reconstruite : {reconstruire_echantillon()} lignes")
+    if args.rebuild_stats:
+        conn = connect_db()
+        actualiser_stats(conn, forcer=True)
+        nb_lignes = [conn.execute(f"SELECT COUNT(*) FROM stats_{entite}s").fetchone()[0]
+                     for entite in ('client', 'produit')]
+        conn.close()
+        print(f"statistiques reconstruites : {nb_lignes[0]} clients, {nb_lignes[1]} produits")
@@ -0,0 +1,152 @@
+import numbers
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as DelaiDepasse
+
+import pandas as pd
+from cache import invalider
+from db_config import connexion, cumuler_nouvelles_ventes, incrementer_version
+
+# Un groupe réunit les ventes arrivées pendant la transaction précédente ; DELAI_GROUPE_S ajoute
+# une attente optionnelle après la première vente (0 : validation dès que le thread est libre)
+DELAI_GROUPE_S = 0.0
+TAILLE_GROUPE_MAX = 500
+
+# Délai maximal d'attente du résultat d'une vente soumise à la file d'écriture
+DELAI_RESULTAT_S = 30.0
+
+
+def _jour(date):
+    """Date au format AAAA-MM-JJ, ou None si elle n'est pas interprétable"""
+    try:
+        return pd.Timestamp(date).strftime('%Y-%m-%d')
+    except (ValueError, TypeError):
+        return None
+
+
+class FileEcritureVentes:
+    """File d'écriture des ventes avec validation groupée (group commit)
+
+    Un thread unique vide la file : les ventes soumises pendant la validation précédente sont
+    insérées ensemble dans une seule transaction, donc une seule synchronisation disque.
+    Le montant est calculé ici à partir du prix du produit en base, et chaque vente reçoit
+    son propre résultat (identifiant et montant) ou sa propre erreur.
+    """
+
+    def __init__(self, delai=DELAI_GROUPE_S, taille_max=TAILLE_GROUPE_MAX):
+        self.delai = delai
+        self.taille_max = taille_max
+        self._file = queue.Queue()
+        self._thread = None
+        self._verrou = threading.Lock()
+
+    def soumettre(self, date, produit_id, client_id, quantite):
+        """Ajoute une vente à la file et retourne un Future résolu après validation"""
+        with self._verrou:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._boucle, name='ecriture-ventes', daemon=True)
+                self._thread.start()
+        future = Future()
+        self._file.put(((date, produit_id, client_id, quantite), future))
+        return future
+
+    def _collecter(self):
+        """Attend une première vente puis regroupe celles qui arrivent avant l'échéance"""
+        groupe = [self._file.get()]
+        echeance = time.monotonic() + self.delai
+        while len(groupe) < self.taille_max:
+            reste = echeance - time.monotonic()
+            try:
+                groupe.append(self._file.get(timeout=reste) if reste > 0 else self._file.get_nowait())
+            except queue.Empty:
+                break
+        return groupe
+
+    def _boucle(self):
+        while True:
+            groupe = self._collecter()
+            try:
+                self._valider(groupe)
+            except Exception as e:
+                # Transaction annulée : toutes les ventes du groupe sont en échec
+                for _, future in groupe:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _valider(self, groupe):
+        # Ventes annulées par attendre_ventes après expiration du délai : jamais insérées
+        groupe = [(vente, future) for vente, future in groupe if future.set_running_or_notify_cancel()]
+        if not groupe:
+            return
+        query = "INSERT INTO ventes (date_vente, produit_id, client_id, quantite, montant) VALUES (?, ?, ?, ?, ?)"
+        resultats = []
+        with connexion() as conn:
+            with conn:
+                produit_ids = list({vente[1] for vente, _ in groupe})
+                prix = dict(conn.execute(
+                    f"SELECT id, prix_unitaire FROM produits WHERE id IN ({', '.join('?' * len(produit_ids))})",
+                    produit_ids
+                ).fetchall())
+                client_ids = list({vente[2] for vente, _ in groupe if vente[2] is not None})
+                clients = {id_ for (id_,) in conn.execute(
+                    f"SELECT id FROM clients WHERE id IN ({', '.join('?' * len(client_ids))})", client_ids
+                )} if client_ids else set()
+
+                id_max = None
+                for (date_vente, produit_id, client_id, quantite), future in groupe:
+                    jour = _jour(date_vente)
+                    if jour is None:
+                        future.set_exception(ValueError(f"Date invalide: {date_vente}"))
+                    elif produit_id not in prix:
+                        future.set_exception(ValueError(f"Produit inconnu: {produit_id}"))
+                    elif client_id is not None and client_id not in clients:
+                        future.set_exception(ValueError(f"Client inconnu: {client_id}"))
+                    elif not isinstance(quantite, numbers.Integral) or quantite <= 0:
+                        future.set_exception(ValueError(f"Quantité invalide: {quantite}"))
+                    else:
+                        quantite = int(quantite)
+                        montant = round(quantite * prix[produit_id], 2)
+                        cursor = conn.execute(query, (jour, produit_id, client_id, quantite, montant))
+                        id_max = cursor.lastrowid - 1 if id_max is None else id_max
+                        resultats.append((future, {'id': cursor.lastrowid, 'montant': montant}))
+
+                if resultats:
+                    cumuler_nouvelles_ventes(conn, id_max)
+                    incrementer_version(conn)
+        if resultats:
+            invalider()
+        # Les résultats ne sont publiés qu'une fois la transaction validée
+        for future, resultat in resultats:
+            future.set_result(resultat)
+
+
+_file_ventes = FileEcritureVentes()
+
+
+def soumettre_vente(date, produit_id, client_id, quantite):
+    """Soumet une vente à la file d'écriture partagée du processus et retourne son Future"""
+    return _file_ventes.soumettre(date, produit_id, client_id, quantite)
+
+
+def attendre_ventes(futures, delai=DELAI_RESULTAT_S):
+    """Attend dans l'ordre les résultats de ventes soumises, au plus `delai` secondes au total
+
+    Passé le délai, la vente attendue et les suivantes, encore en file, sont annulées avant de
+    lever DelaiDepasse : elles ne seront jamais insérées et peuvent être soumises à nouveau sans
+    doublon. Une vente dont la transaction est déjà en cours est attendue jusqu'à son issue.
+    """
+    echeance = time.monotonic() + delai
+    resultats = []
+    for i, future in enumerate(futures):
+        try:
+            resultats.append(future.result(max(0.0, echeance - time.monotonic())))
+        except DelaiDepasse:
+            if not future.cancel():
+                resultats.append(future.result())
+                continue
+            # File traitée dans l'ordre : les ventes suivantes n'ont pas encore été prises
+            for suivante in futures[i + 1:]:
+                suivante.cancel()
+            raise DelaiDepasse(f"Délai d'écriture dépassé : {len(futures) - i} vente(s) non enregistrée(s)") from None
+    return resultats
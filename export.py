@@ -0,0 +1,107 @@
+import csv
+import io
+
+from db_config import connexion
+from requetes import COLONNES_VENTES, requete_ventes
+
+# Nombre de lignes lues depuis le curseur SQLite à chaque bloc
+TAILLE_BLOC = 50000
+
+# Lignes de données par feuille Excel (1 048 576 lignes au plus, en-tête compris)
+LIGNES_MAX_FEUILLE_EXCEL = 1_048_575
+
+# Formats proposés : extension du fichier et type MIME
+FORMATS_EXPORT = {
+    'Excel': ('xlsx', "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    'CSV': ('csv', "text/csv"),
+    'Parquet': ('parquet', "application/vnd.apache.parquet"),
+}
+
+
+def iterer_ventes(taille_bloc=TAILLE_BLOC, colonnes=None, **filtres):
+    """Parcourt les ventes filtrées par blocs de tuples, directement depuis le curseur SQLite"""
+    query, params = requete_ventes(colonnes=colonnes, **filtres)
+    with connexion() as conn:
+        curseur = conn.execute(query, params)
+        try:
+            while True:
+                lignes = curseur.fetchmany(taille_bloc)
+                if not lignes:
+                    break
+                yield lignes
+        finally:
+            curseur.close()
+
+
+def _exporter_excel(colonnes, blocs, destination):
+    from openpyxl import Workbook
+
+    # Classeur en écriture seule : les lignes sont écrites au fil de l'eau, pas gardées en mémoire
+    classeur = Workbook(write_only=True)
+    feuille = classeur.create_sheet("ventes")
+    feuille.append(colonnes)
+    lignes = 0
+    for bloc in blocs:
+        for ligne in bloc:
+            if lignes == LIGNES_MAX_FEUILLE_EXCEL:
+                # Feuille pleine : la suite part dans une nouvelle feuille (ventes_2, ...), en-tête répété
+                feuille = classeur.create_sheet(f"ventes_{len(classeur.worksheets) + 1}")
+                feuille.append(colonnes)
+                lignes = 0
+            feuille.append(ligne)
+            lignes += 1
+    classeur.save(destination)
+
+
+def _exporter_csv(colonnes, blocs, destination):
+    flux = io.TextIOWrapper(destination, encoding='utf-8', newline='', write_through=True)
+    try:
+        writer = csv.writer(flux)
+        writer.writerow(colonnes)
+        for bloc in blocs:
+            writer.writerows(bloc)
+    finally:
+        flux.detach()
+
+
+def _exporter_parquet(colonnes, blocs, destination):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("L'export Parquet nécessite le paquet pyarrow (pip install pyarrow)")
+
+    types = {
+        'id': pa.int64(), 'date_vente': pa.string(), 'produit': pa.string(), 'categorie': pa.string(),
+        'client': pa.string(), 'quantite': pa.int64(), 'montant': pa.float64(),
+    }
+    schema = pa.schema([(col, types[col]) for col in colonnes])
+    with pq.ParquetWriter(destination, schema) as writer:
+        for bloc in blocs:
+            valeurs = list(zip(*bloc))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(valeurs[i], type=schema.field(i).type) for i in range(len(colonnes))],
+                schema=schema
+            ))
+
+
+def exporter_ventes(format_export, destination, taille_bloc=TAILLE_BLOC, colonnes=None, **filtres):
+    """Exporte les ventes filtrées vers un fichier binaire (chemin ou objet fichier) en mémoire bornée"""
+    if format_export not in FORMATS_EXPORT:
+        raise ValueError(f"Format d'export inconnu: {format_export}")
+
+    colonnes = list(colonnes) if colonnes else list(COLONNES_VENTES)
+    blocs = iterer_ventes(taille_bloc, colonnes, **filtres)
+    try:
+        if format_export == 'Excel':
+            _exporter_excel(colonnes, blocs, destination)
+        elif format_export == 'CSV':
+            if isinstance(destination, str):
+                with open(destination, 'wb') as fichier:
+                    _exporter_csv(colonnes, blocs, fichier)
+            else:
+                _exporter_csv(colonnes, blocs, destination)
+        else:
+            _exporter_parquet(colonnes, blocs, destination)
+    finally:
+        blocs.close()
@@ -0,0 +1,177 @@
+import time
+
+import pandas as pd
+from cache import invalider
+from db_config import connexion, cumuler_nouvelles_ventes, incrementer_version
+
+# Nombre de lignes lues, validées et insérées par transaction
+TAILLE_LOT = 50000
+
+# Colonnes attendues dans les fichiers importés, par type de données
+COLONNES_IMPORT = {
+    'ventes': ['date_vente', 'produit', 'quantite'],
+    'produits': ['nom', 'categorie', 'prix_unitaire'],
+    'clients': ['nom'],
+}
+
+
+def lire_par_lots(fichier, nom_fichier, taille_lot=TAILLE_LOT):
+    """Lit un fichier CSV ou Excel par blocs de DataFrame sans le charger entièrement"""
+    if nom_fichier.lower().endswith('.csv'):
+        yield from pd.read_csv(fichier, chunksize=taille_lot, dtype=object, keep_default_na=False,
+                               skipinitialspace=True)
+    elif nom_fichier.lower().endswith(('.xlsx', '.xlsm')):
+        from openpyxl import load_workbook
+
+        classeur = load_workbook(fichier, read_only=True, data_only=True)
+        try:
+            lignes = classeur.active.iter_rows(values_only=True)
+            entete = [str(col).strip() for col in next(lignes, [])]
+            lot = []
+            for ligne in lignes:
+                lot.append(ligne)
+                if len(lot) >= taille_lot:
+                    yield pd.DataFrame(lot, columns=entete)
+                    lot = []
+            if lot:
+                yield pd.DataFrame(lot, columns=entete)
+        finally:
+            classeur.close()
+    else:
+        raise ValueError(f"Format de fichier non supporté: {nom_fichier}")
+
+
+def _texte(serie):
+    """Normalise une colonne texte : valeurs vides remplacées par NA"""
+    return serie.where(serie.notna() & (serie != ''))
+
+
+def _sans_na(serie):
+    """Convertit une colonne en objets Python, NA remplacés par None (pour sqlite3)"""
+    return serie.astype(object).where(serie.notna(), None)
+
+
+def _preparer_ventes(lot, produits, prix, clients):
+    """Valide un bloc de ventes et retourne les lignes à insérer et le nombre de rejets"""
+    dates = pd.to_datetime(lot['date_vente'], errors='coerce')
+    produit_ids = _texte(lot['produit']).map(produits)
+    quantites = pd.to_numeric(lot['quantite'], errors='coerce')
+
+    noms_clients = _texte(lot['client']) if 'client' in lot.columns else pd.Series(pd.NA, index=lot.index)
+    client_ids = noms_clients.map(clients)
+
+    if 'montant' in lot.columns:
+        montants = pd.to_numeric(lot['montant'], errors='coerce')
+    else:
+        montants = quantites * produit_ids.map(prix)
+
+    valides = (
+        dates.notna() & produit_ids.notna() & (quantites > 0) & (quantites == quantites.round())
+        & montants.notna()
+        # Un client renseigné mais inconnu rend la ligne invalide
+        & (noms_clients.isna() | client_ids.notna())
+    )
+    # Tri par date pour insérer dans l'index de date de manière quasi séquentielle
+    ordre = dates[valides].sort_values(kind='stable').index
+    lignes = list(zip(
+        dates[ordre].dt.strftime('%Y-%m-%d').tolist(),
+        produit_ids[ordre].astype('int64').tolist(),
+        _sans_na(client_ids[ordre].astype('Int64')).tolist(),
+        quantites[ordre].astype('int64').tolist(),
+        # Montants arrondis au centime comme dans la file d'écriture : une vente a le même montant
+        # quel que soit son chemin d'entrée
+        [round(montant, 2) for montant in montants[ordre].astype(float).tolist()],
+    ))
+    return lignes, int((~valides).sum())
+
+
+def _preparer_produits(lot):
+    """Valide un bloc de produits"""
+    noms = _texte(lot['nom'])
+    categories = _texte(lot['categorie'])
+    prix = pd.to_numeric(lot['prix_unitaire'], errors='coerce')
+    valides = noms.notna() & categories.notna() & (prix > 0)
+    lignes = list(zip(noms[valides], categories[valides], prix[valides].astype(float).tolist()))
+    return lignes, int((~valides).sum())
+
+
+def _preparer_clients(lot):
+    """Valide un bloc de clients"""
+    noms = _texte(lot['nom'])
+    valides = noms.notna()
+    autres = [_sans_na(_texte(lot[col]))[valides] if col in lot.columns else [None] * int(valides.sum())
+              for col in ('email', 'telephone')]
+    lignes = list(zip(noms[valides], *autres))
+    return lignes, int((~valides).sum())
+
+
+REQUETES_IMPORT = {
+    'ventes': "INSERT INTO ventes (date_vente, produit_id, client_id, quantite, montant) VALUES (?, ?, ?, ?, ?)",
+    'produits': "INSERT INTO produits (nom, categorie, prix_unitaire) VALUES (?, ?, ?)",
+    'clients': "INSERT INTO clients (nom, email, telephone) VALUES (?, ?, ?)",
+}
+
+
+def importer_fichier(type_donnees, fichier, nom_fichier, taille_lot=TAILLE_LOT):
+    """Importe en masse un fichier de ventes, produits ou clients
+
+    Les noms de produits et de clients sont résolus via des dictionnaires en mémoire,
+    et chaque bloc valide est inséré par executemany dans sa propre transaction.
+    Retourne un rapport avec le nombre de lignes insérées, rejetées et le débit.
+    """
+    if type_donnees not in REQUETES_IMPORT:
+        raise ValueError(f"Type de données inconnu: {type_donnees}")
+
+    debut = time.perf_counter()
+    lues = 0
+    inserees = 0
+    rejetees = 0
+
+    with connexion() as conn:
+        if type_donnees == 'ventes':
+            produits = {}
+            prix = {}
+            for id_, nom, prix_unitaire in conn.execute("SELECT id, nom, prix_unitaire FROM produits"):
+                produits.setdefault(nom.strip(), id_)
+                prix[id_] = prix_unitaire
+            clients = {}
+            for id_, nom in conn.execute("SELECT id, nom FROM clients"):
+                clients.setdefault(nom.strip(), id_)
+
+        for lot in lire_par_lots(fichier, nom_fichier, taille_lot):
+            lot.columns = [str(col).strip().lower() for col in lot.columns]
+            manquantes = [col for col in COLONNES_IMPORT[type_donnees] if col not in lot.columns]
+            if manquantes:
+                raise ValueError(f"Colonnes manquantes dans le fichier: {manquantes}")
+
+            if type_donnees == 'ventes':
+                lignes, rejets = _preparer_ventes(lot, produits, prix, clients)
+            elif type_donnees == 'produits':
+                lignes, rejets = _preparer_produits(lot)
+            else:
+                lignes, rejets = _preparer_clients(lot)
+
+            with conn:
+                if type_donnees == 'ventes':
+                    # Les tables dérivées (agrégat journalier, échantillon, statistiques) sont mises à jour une seule fois par lot ;
+                    # le verrou d'écriture est pris avant de lire MAX(id) pour qu'aucune autre insertion ne s'intercale
+                    conn.execute("BEGIN IMMEDIATE")
+                    id_max = conn.execute("SELECT COALESCE(MAX(id), 0) FROM ventes").fetchone()[0]
+                    conn.executemany(REQUETES_IMPORT[type_donnees], lignes)
+                    cumuler_nouvelles_ventes(conn, id_max)
+                else:
+                    conn.executemany(REQUETES_IMPORT[type_donnees], lignes)
+                incrementer_version(conn)
+            invalider()
+            lues += len(lot)
+            inserees += len(lignes)
+            rejetees += rejets
+
+    duree = time.perf_counter() - debut
+    return {
+        'lignes_lues': lues,
+        'lignes_inserees': inserees,
+        'lignes_rejetees': rejetees,
+        'duree_s': duree,
+        'lignes_par_seconde': inserees / duree if duree > 0 else 0.0,
+    }
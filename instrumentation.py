@@ -0,0 +1,135 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from functools import wraps
+
+import pandas as pd
+
+# Fichier JSON-lines où sont ajoutées les mesures de chaque exécution instrumentée
+JOURNAL_SPANS = os.environ.get('VENTES_JOURNAL_SPANS', 'spans.jsonl')
+
+# État de l'exécution (rerun Streamlit) courante, propre à chaque thread
+_local = threading.local()
+
+
+class _SpanInactif:
+    """Mesure factice utilisée quand l'instrumentation est désactivée"""
+
+    @property
+    def attributs(self):
+        return {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_SPAN_INACTIF = _SpanInactif()
+
+
+class Span:
+    """Intervalle de temps nommé, avec attributs libres (lignes, octets...)"""
+
+    def __init__(self, nom, attributs):
+        self.nom = nom
+        self.attributs = attributs
+
+    def __enter__(self):
+        self.debut = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        fin = time.perf_counter()
+        _local.spans.append({
+            'nom': self.nom,
+            'debut_ms': (self.debut - _local.origine) * 1000,
+            'duree_ms': (fin - self.debut) * 1000,
+            'erreur': exc_type.__name__ if exc_type else None,
+            **self.attributs,
+        })
+        return False
+
+
+def est_actif():
+    return getattr(_local, 'actif', False)
+
+
+def demarrer_execution(actif=False, profilage=False):
+    """Commence une nouvelle exécution : remet à zéro les mesures du thread courant"""
+    profil = getattr(_local, 'profil', None)
+    if profil is not None:
+        profil.disable()
+    _local.actif = actif
+    _local.spans = []
+    _local.origine = time.perf_counter()
+    _local.execution = uuid.uuid4().hex
+    _local.profil = None
+    if actif and profilage:
+        _local.profil = cProfile.Profile()
+        _local.profil.enable()
+
+
+def terminer_execution():
+    """Termine l'exécution courante ; retourne les mesures et le rapport cProfile éventuel"""
+    if not est_actif():
+        return pd.DataFrame(), None
+
+    rapport = None
+    if _local.profil is not None:
+        _local.profil.disable()
+        flux = io.StringIO()
+        pstats.Stats(_local.profil, stream=flux).sort_stats('cumulative').print_stats(25)
+        rapport = flux.getvalue()
+        _local.profil = None
+
+    spans = _local.spans
+    if JOURNAL_SPANS and spans:
+        horodatage = time.time()
+        with open(JOURNAL_SPANS, 'a', encoding='utf-8') as journal:
+            for span in spans:
+                journal.write(json.dumps({'execution': _local.execution, 'horodatage': horodatage, **span},
+                                         default=str) + '\n')
+    return pd.DataFrame(spans), rapport
+
+
+def mesurer(nom, **attributs):
+    """Mesure la durée d'un bloc `with` ; sans effet (et quasi gratuit) si l'instrumentation est inactive"""
+    if not getattr(_local, 'actif', False):
+        return _SPAN_INACTIF
+    return Span(nom, attributs)
+
+
+def _volume(resultat):
+    """Nombre de lignes et taille en octets d'un résultat, quand ils sont connus"""
+    if isinstance(resultat, (pd.DataFrame, pd.Series)):
+        usage = resultat.memory_usage(index=False)
+        return {'lignes': len(resultat), 'octets': int(usage.sum() if isinstance(usage, pd.Series) else usage)}
+    if isinstance(resultat, (list, tuple, dict)):
+        return {'lignes': len(resultat)}
+    return {}
+
+
+def instrumenter(nom=None):
+    """Décorateur : enregistre un span par appel avec le volume du résultat"""
+    def decorateur(fonction):
+        nom_span = nom or fonction.__name__
+
+        @wraps(fonction)
+        def enveloppe(*args, **kwargs):
+            if not getattr(_local, 'actif', False):
+                return fonction(*args, **kwargs)
+            with Span(nom_span, {}) as span:
+                resultat = fonction(*args, **kwargs)
+                span.attributs.update(_volume(resultat))
+            return resultat
+
+        return enveloppe
+
+    return decorateur
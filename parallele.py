@@ -0,0 +1,69 @@
+import multiprocessing
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+# Nombre de processus pour l'agrégation partitionnée (1 désactive le chemin parallèle)
+TRAVAILLEURS = int(os.environ.get('VENTES_TRAVAILLEURS', os.cpu_count() or 1))
+
+# Réglages de lecture des connexions des processus de calcul
+PRAGMAS_LECTURE = [
+    "PRAGMA query_only = ON",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -32768",
+    "PRAGMA temp_store = MEMORY",
+]
+
+_pool = {'executeur': None, 'taille': 0}
+_verrou = threading.Lock()
+
+# Connexions en lecture seule propres à chaque processus de calcul, par base
+_connexions = {}
+
+
+def _connexion_lecture(chemin):
+    conn = _connexions.get(chemin)
+    if conn is None:
+        conn = sqlite3.connect(f"{Path(chemin).resolve().as_uri()}?mode=ro", uri=True)
+        for pragma in PRAGMAS_LECTURE:
+            conn.execute(pragma)
+        _connexions[chemin] = conn
+    return conn
+
+
+def _executer_partition(chemin, query, params):
+    """Exécuté dans un processus de calcul : retourne les lignes d'une requête partielle"""
+    return _connexion_lecture(chemin).execute(query, params).fetchall()
+
+
+def obtenir_executeur(travailleurs=None):
+    """Pool de processus partagé par le processus, créé au premier appel (ou recréé si sa taille change)"""
+    travailleurs = travailleurs or TRAVAILLEURS
+    with _verrou:
+        if _pool['executeur'] is None or _pool['taille'] != travailleurs:
+            if _pool['executeur'] is not None:
+                _pool['executeur'].shutdown(wait=False)
+            # spawn plutôt que fork : le serveur a déjà des threads (Streamlit, précalcul)
+            _pool['executeur'] = ProcessPoolExecutor(travailleurs, mp_context=multiprocessing.get_context('spawn'))
+            _pool['taille'] = travailleurs
+        return _pool['executeur']
+
+
+def executer_partitions(chemin, requetes, travailleurs=None):
+    """Exécute des requêtes (query, params) en parallèle sur des connexions en lecture seule
+
+    Retourne la liste des lignes de chaque requête, dans l'ordre des requêtes.
+    Le pool de processus est créé au premier appel puis réutilisé.
+    """
+    executeur = obtenir_executeur(travailleurs)
+    try:
+        futures = [executeur.submit(_executer_partition, chemin, query, params) for query, params in requetes]
+        return [future.result() for future in futures]
+    except BrokenProcessPool:
+        # Processus de calcul tué : le pool sera recréé au prochain appel
+        with _verrou:
+            _pool['executeur'] = None
+        raise
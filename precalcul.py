@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pandas as pd
+from cache import abonner, cle_cache, publier, version_donnees
+from data_operations import (PERIODES_SQL, agreger_par_periode, agreger_repartition, agreger_top_produits,
+                             get_bornes_dates, get_kpis)
+from db_config import actualiser_stats, connexion
+from stockage import moteur_analytique
+
+# Précalcul en arrière-plan actif par défaut ; VENTES_PRECALCUL=0 le désactive
+PRECALCUL_ACTIF = os.environ.get('VENTES_PRECALCUL', '1') != '0'
+
+# Délai maximal entre deux vérifications de la version, pour suivre les écritures
+# des autres processus et le changement de jour des fenêtres glissantes
+INTERVALLE_S = 30.0
+
+# Fenêtres de dates standard dont les agrégats sont précalculés
+FENETRES = ["30 derniers jours", "Mois en cours", "Année en cours", "Tout l'historique"]
+
+# Tailles de top produits proposées dans l'onglet d'analyse
+TOPS_ANALYSE = range(3, 11)
+
+# Calculs exacts demandés par l'aperçu rapide, exécutés hors du rerun de l'utilisateur
+_affinage = ThreadPoolExecutor(max_workers=2, thread_name_prefix='affinage')
+_affinages_en_cours = {}
+_verrou_affinage = threading.Lock()
+
+
+def bornes_fenetre(fenetre, aujourd_hui=None):
+    """Retourne (date_debut, date_fin) d'une fenêtre standard, ou None si la base est vide"""
+    aujourd_hui = aujourd_hui or date.today()
+    if fenetre == "30 derniers jours":
+        return aujourd_hui - timedelta(days=29), aujourd_hui
+    if fenetre == "Mois en cours":
+        return aujourd_hui.replace(day=1), aujourd_hui
+    if fenetre == "Année en cours":
+        return aujourd_hui.replace(month=1, day=1), aujourd_hui
+    if fenetre == "Tout l'historique":
+        min_date, max_date = get_bornes_dates()
+        if min_date is None or max_date is None:
+            return None
+        # Même conversion que le sélecteur de période du tableau de bord
+        return pd.to_datetime(min_date).date(), pd.to_datetime(max_date).date()
+    raise ValueError(f"Fenêtre inconnue: {fenetre}")
+
+
+def filtres_fenetre(fenetre, aujourd_hui=None):
+    """Filtres du tableau de bord pour une fenêtre standard, sans catégorie, produit ni client"""
+    filtres = {'categories': [], 'produits': [], 'clients': []}
+    bornes = bornes_fenetre(fenetre, aujourd_hui)
+    if bornes is not None:
+        filtres['date_debut'], filtres['date_fin'] = bornes
+    return filtres
+
+
+def calculer_agregats(filtres):
+    """Calcule les agrégats affichés par défaut pour des filtres donnés
+
+    Retourne des tuples (fonction, args, kwargs, valeur) dont les paramètres reprennent
+    exactement les appels de app.py, pour que les clés de cache correspondent.
+    """
+    resultats = [(get_kpis, (), filtres, get_kpis.sans_cache(**filtres))]
+    for periode in PERIODES_SQL:
+        resultats.append((agreger_par_periode, (periode,), filtres,
+                          agreger_par_periode.sans_cache(periode, **filtres)))
+
+    par_montant = {'critere': 'montant', **filtres}
+    resultats.append((agreger_top_produits, (None,), par_montant, agreger_top_produits.sans_cache(None, **par_montant)))
+    # Les tops de l'analyse sont les premières lignes du classement complet par quantité
+    classement = agreger_top_produits.sans_cache(None, critere='quantite', **filtres)
+    for top_n in TOPS_ANALYSE:
+        resultats.append((agreger_top_produits, (top_n,), filtres, classement.head(top_n)))
+
+    for by, limit in (('categorie', None), ('client', 10)):
+        kwargs = {'limit': limit, **filtres}
+        resultats.append((agreger_repartition, (by,), kwargs, agreger_repartition.sans_cache(by, **kwargs)))
+    return resultats
+
+
+class Precalculateur:
+    """Thread de fond qui recalcule et publie les agrégats des fenêtres standard après chaque écriture"""
+
+    def __init__(self, fenetres=FENETRES, intervalle=INTERVALLE_S):
+        self.fenetres = list(fenetres)
+        self.intervalle = intervalle
+        self.etat = {'version': None, 'jour': None, 'resultats': 0, 'duree_s': None, 'calcule_a': None,
+                     'erreur': None}
+        self._reveil = threading.Event()
+        self._arret = threading.Event()
+        self._thread = None
+        self._verrou = threading.Lock()
+
+    def demarrer(self):
+        """Démarre le thread s'il ne tourne pas déjà (appelable à chaque rerun)"""
+        with self._verrou:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            abonner(self.signaler)
+            self._arret.clear()
+            self._thread = threading.Thread(target=self._boucle, name='precalcul-agregats', daemon=True)
+            self._thread.start()
+
+    def arreter(self, delai=None):
+        self._arret.set()
+        self._reveil.set()
+        if self._thread is not None:
+            self._thread.join(delai)
+
+    def signaler(self):
+        """Réveille le thread ; plusieurs signaux rapprochés donnent un seul recalcul"""
+        self._reveil.set()
+
+    def executer(self, force=False):
+        """Recalcule et publie les agrégats si la version ou le jour ont changé
+
+        Reconstruit aussi les statistiques clients et produits quand elles sont périmées
+        (modification ou suppression de ventes, changement de jour), ainsi que l'archive du
+        moteur analytique, hors des lectures.
+        """
+        # Version lue avant les données : les résultats sont au moins aussi récents que leur clé
+        version = version_donnees()
+        jour = date.today()
+        if not force and (version, jour) == (self.etat['version'], self.etat['jour']):
+            return False
+
+        debut = time.perf_counter()
+        with connexion() as conn:
+            actualiser_stats(conn, jour)
+        moteur_analytique().synchroniser()
+        resultats = {}
+        for fenetre in self.fenetres:
+            for fonction, args, kwargs, valeur in calculer_agregats(filtres_fenetre(fenetre, jour)):
+                resultats[cle_cache(fonction, args, kwargs, version)] = valeur
+        publier(resultats)
+        self.etat.update(version=version, jour=jour, resultats=len(resultats),
+                         duree_s=time.perf_counter() - debut, calcule_a=time.time(), erreur=None)
+        return True
+
+    def _boucle(self):
+        while not self._arret.is_set():
+            try:
+                self.executer()
+            except Exception as e:
+                # Le tableau de bord retombe sur le calcul à la demande ; nouvel essai au prochain réveil
+                self.etat['erreur'] = f"{type(e).__name__}: {e}"
+            self._reveil.wait(self.intervalle)
+            self._reveil.clear()
+
+
+_precalculateur = Precalculateur()
+
+
+def demarrer_precalcul():
+    """Démarre le précalcul une seule fois par processus serveur, s'il est activé"""
+    if PRECALCUL_ACTIF:
+        _precalculateur.demarrer()
+    return _precalculateur
+
+
+def etat_precalcul():
+    return dict(_precalculateur.etat, actif=PRECALCUL_ACTIF)
+
+
+def affiner(fonction, *args, **kwargs):
+    """Lance en arrière-plan le calcul exact d'une fonction en cache, une seule fois par appel
+
+    Retourne un Future ; une fois terminé, le résultat est servi par le cache de la fonction.
+    """
+    cle = cle_cache(fonction, args, kwargs, version_donnees())
+    with _verrou_affinage:
+        future = _affinages_en_cours.get(cle)
+        if future is None:
+            future = _affinage.submit(fonction, *args, **kwargs)
+            _affinages_en_cours[cle] = future
+            future.add_done_callback(lambda _: _affinages_en_cours.pop(cle, None))
+    return future
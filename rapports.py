@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import re
+import time
+import unicodedata
+from datetime import datetime
+
+import db_config
+import parallele
+from data_operations import (PERIODES_SQL, agreger_par_periode, agreger_repartition, agreger_top_produits,
+                             get_clients, get_produits)
+
+# Rapports disponibles, dans l'ordre des feuilles des classeurs
+RAPPORTS = ('periode', 'top_produits', 'repartition_categorie', 'repartition_client')
+
+FORMATS_IMAGES = ('png', 'pdf')
+FORMATS_TABLES = ('xlsx', 'parquet')
+
+# Dimensions pour lesquelles un jeu de filtres est généré par valeur
+DIMENSIONS = {'categorie': 'categories', 'produit': 'produits', 'client': 'clients'}
+
+CLES_FILTRES = ('categories', 'produits', 'clients', 'date_debut', 'date_fin')
+
+
+def nom_fichier(nom):
+    """Nom de fichier sûr (ASCII, sans séparateurs) dérivé du nom d'un jeu de filtres"""
+    ascii_ = unicodedata.normalize('NFKD', str(nom)).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', ascii_).strip('_.') or 'rapport'
+
+
+def ensembles_filtres(par=None, fenetre=None, date_debut=None, date_fin=None, fichier=None):
+    """Liste des jeux de filtres (nom, filtres) à produire
+
+    Les jeux viennent d'un fichier JSON (liste d'objets avec 'nom' et les clés de filtres,
+    'fenetre' optionnelle), ou d'une valeur par catégorie, produit ou client. La fenêtre ou
+    les dates communes s'appliquent aux jeux qui n'en précisent pas. Une fenêtre ne se combine
+    pas avec des dates explicites (ValueError).
+    """
+    from precalcul import bornes_fenetre
+
+    def periode(fenetre_jeu, debut, fin):
+        if fenetre_jeu:
+            if debut is not None or fin is not None:
+                raise ValueError(f"La fenêtre {fenetre_jeu!r} ne peut pas être combinée avec date_debut ou date_fin")
+            bornes = bornes_fenetre(fenetre_jeu)
+            return {} if bornes is None else dict(zip(('date_debut', 'date_fin'), bornes))
+        return {cle: valeur for cle, valeur in (('date_debut', debut), ('date_fin', fin)) if valeur is not None}
+
+    communs = periode(fenetre, date_debut, date_fin)
+    vide = {'categories': [], 'produits': [], 'clients': []}
+
+    if fichier:
+        with open(fichier, encoding='utf-8') as f:
+            definitions = json.load(f)
+        if not isinstance(definitions, list):
+            raise ValueError("Le fichier de filtres doit contenir une liste d'objets")
+        jeux = []
+        for i, definition in enumerate(definitions):
+            inconnues = set(definition) - set(CLES_FILTRES) - {'nom', 'fenetre'}
+            if inconnues:
+                raise ValueError(f"Clés de filtres inconnues: {sorted(inconnues)}")
+            filtres = {**vide, **communs, **{cle: definition[cle] for cle in CLES_FILTRES if cle in definition}}
+            if definition.get('fenetre'):
+                filtres.update(periode(definition['fenetre'], definition.get('date_debut'),
+                                       definition.get('date_fin')))
+            jeux.append((definition.get('nom', f"rapport_{i + 1}"), filtres))
+        return jeux
+
+    if par is None:
+        return [('global', {**vide, **communs})]
+    if par not in DIMENSIONS:
+        raise ValueError(f"Dimension inconnue: {par}")
+    if par == 'client':
+        valeurs = get_clients()['nom'].dropna().unique()
+    else:
+        valeurs = get_produits()['categorie' if par == 'categorie' else 'nom'].dropna().unique()
+    return [(valeur, {**vide, **communs, DIMENSIONS[par]: [valeur]}) for valeur in sorted(valeurs)]
+
+
+def calculer_rapports(filtres, rapports=RAPPORTS, periode='Mensuel', top_n=10):
+    """Agrégats d'un jeu de filtres : {rapport: (données, arguments du graphique)}
+
+    Les appels reprennent ceux de l'application, et passent donc par le même cache.
+    """
+    if periode not in PERIODES_SQL:
+        raise ValueError(f"Période inconnue: {periode}")
+    resultats = {}
+    for rapport in rapports:
+        if rapport == 'periode':
+            resultats[rapport] = (agreger_par_periode(periode, **filtres), (periode,))
+        elif rapport == 'top_produits':
+            resultats[rapport] = (agreger_top_produits(top_n, **filtres), (top_n,))
+        elif rapport == 'repartition_categorie':
+            resultats[rapport] = (agreger_repartition('categorie', **filtres), ('categorie',))
+        elif rapport == 'repartition_client':
+            resultats[rapport] = (agreger_repartition('client', limit=10, **filtres), ('client',))
+        else:
+            raise ValueError(f"Rapport inconnu: {rapport}")
+    return resultats
+
+
+def _tracer(rapport, donnees, args):
+    from visualizations import plot_repartition, plot_top_produits, plot_ventes_par_periode
+
+    if rapport == 'periode':
+        return plot_ventes_par_periode(donnees, *args)
+    if rapport == 'top_produits':
+        return plot_top_produits(donnees, *args)
+    return plot_repartition(donnees, by=args[0])
+
+
+def produire_jeu(dossier, nom, resultats, images=('png',), tables=('xlsx',)):
+    """Écrit les graphiques et tableaux d'un jeu de filtres ; retourne les chemins créés
+
+    Exécuté dans un processus de calcul : ne touche pas à la base, seulement aux agrégats reçus.
+    matplotlib n'est importé que si des images sont demandées.
+    """
+    if images:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+    os.makedirs(dossier, exist_ok=True)
+    base = os.path.join(dossier, nom_fichier(nom))
+    fichiers = []
+    tableaux = {}
+    for rapport, (donnees, args) in resultats.items():
+        tableaux[rapport] = donnees
+        if donnees.empty or not images:
+            continue
+        fig, tableau = _tracer(rapport, donnees, args)
+        if fig is None:
+            continue
+        tableaux[rapport] = tableau
+        for extension in images:
+            chemin = f"{base}_{rapport}.{extension}"
+            fig.savefig(chemin, format=extension, bbox_inches='tight')
+            fichiers.append(chemin)
+        plt.close(fig)
+
+    if 'xlsx' in tables:
+        import pandas as pd
+
+        chemin = f"{base}.xlsx"
+        with pd.ExcelWriter(chemin, engine='openpyxl') as classeur:
+            for rapport, tableau in tableaux.items():
+                tableau.to_excel(classeur, sheet_name=rapport, index=not tableau.index.equals(
+                    pd.RangeIndex(len(tableau))))
+        fichiers.append(chemin)
+    if 'parquet' in tables:
+        for rapport, tableau in tableaux.items():
+            chemin = f"{base}_{rapport}.parquet"
+            tableau.to_parquet(chemin)
+            fichiers.append(chemin)
+    return fichiers
+
+
+def generer_rapports(jeux, dossier, rapports=RAPPORTS, periode='Mensuel', top_n=10, images=('png',),
+                     tables=('xlsx',), travailleurs=None):
+    """Produit les rapports de plusieurs jeux de filtres en une passe
+
+    Les agrégats sont calculés dans ce processus sur une connexion du pool (et mis en cache
+    pour les jeux identiques) ; le rendu de chaque jeu part aussitôt vers le pool de processus,
+    pendant que le jeu suivant est agrégé. Retourne un index {nom: fichiers}.
+    """
+    inconnus = [f for f in (*images, *tables) if f not in FORMATS_IMAGES + FORMATS_TABLES]
+    if inconnus:
+        raise ValueError(f"Formats inconnus: {inconnus}")
+    noms = [nom_fichier(nom) for nom, _ in jeux]
+    if len(set(noms)) != len(noms):
+        raise ValueError("Plusieurs jeux de filtres donnent le même nom de fichier")
+
+    travailleurs = travailleurs or parallele.TRAVAILLEURS
+    executeur = parallele.obtenir_executeur(travailleurs) if travailleurs > 1 else None
+    en_cours = {}
+    index = {}
+    for nom, filtres in jeux:
+        resultats = calculer_rapports(filtres, rapports, periode, top_n)
+        if executeur is None:
+            index[nom] = produire_jeu(dossier, nom, resultats, images, tables)
+        else:
+            en_cours[nom] = executeur.submit(produire_jeu, dossier, nom, resultats, images, tables)
+    for nom, future in en_cours.items():
+        index[nom] = future.result()
+    return index
+
+
+if __name__ == "__main__":
+    # Rendu sans affichage, hérité par les processus de calcul
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+
+    parser = argparse.ArgumentParser(
+        description="Génération des rapports de ventes hors de l'application (graphiques et tableaux)",
+        epilog="Exemple (cron, chaque matin) : python rapports.py --par categorie --fenetre \"Mois en cours\" "
+               "--images png pdf --tables xlsx --sortie rapports/$(date +%%F)"
+    )
+    parser.add_argument('--base', help="Base de ventes (par défaut VENTES_DB_PATH ou ventes.db)")
+    parser.add_argument('--sortie', default='rapports', help="Dossier des fichiers produits")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--filtres', help="Fichier JSON : liste de jeux {nom, categories, produits, clients, "
+                                          "date_debut, date_fin, fenetre}")
+    source.add_argument('--par', choices=list(DIMENSIONS), help="Un jeu de filtres par valeur de la dimension")
+    dates = parser.add_mutually_exclusive_group()
+    dates.add_argument('--fenetre', help="Fenêtre standard (30 derniers jours, Mois en cours, Année en cours, "
+                                         "Tout l'historique)")
+    dates.add_argument('--debut', help="Date de début (AAAA-MM-JJ)")
+    parser.add_argument('--fin', help="Date de fin (AAAA-MM-JJ)")
+    parser.add_argument('--rapports', nargs='+', choices=RAPPORTS, default=list(RAPPORTS))
+    parser.add_argument('--periode', choices=list(PERIODES_SQL), default='Mensuel')
+    parser.add_argument('--top', type=int, default=10, help="Nombre de produits du top")
+    parser.add_argument('--images', nargs='*', choices=FORMATS_IMAGES, default=['png'])
+    parser.add_argument('--tables', nargs='*', choices=FORMATS_TABLES, default=['xlsx'])
+    parser.add_argument('--travailleurs', type=int, help="Processus de rendu (1 : rendu dans ce processus)")
+
+    args = parser.parse_args()
+    if args.fin and args.fenetre:
+        parser.error("--fin ne peut pas être combiné avec --fenetre")
+    if args.base:
+        db_config.configurer_base(args.base)
+
+    debut = time.perf_counter()
+    jeux = ensembles_filtres(args.par, args.fenetre, args.debut, args.fin, args.filtres)
+    index = generer_rapports(jeux, args.sortie, args.rapports, args.periode, args.top, args.images, args.tables,
+                             args.travailleurs)
+    chemin_index = os.path.join(args.sortie, 'index.json')
+    os.makedirs(args.sortie, exist_ok=True)
+    with open(chemin_index, 'w', encoding='utf-8') as fichier:
+        json.dump({'genere_le': datetime.now().isoformat(timespec='seconds'), 'rapports': index}, fichier,
+                  indent=2, ensure_ascii=False)
+    nb_fichiers = sum(len(fichiers) for fichiers in index.values())
+    print(f"{len(jeux)} jeux de filtres, {nb_fichiers} fichiers en {time.perf_counter() - debut:.1f} s "
+          f"(index : {chemin_index})")
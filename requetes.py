@@ -0,0 +1,129 @@
+import pandas as pd
+from db_config import connexion
+
+# Colonnes exposées par les requêtes de ventes et leur expression SQL
+COLONNES_VENTES = {
+    'id': 'v.id',
+    'date_vente': 'v.date_vente',
+    'produit': 'p.nom',
+    'categorie': 'p.categorie',
+    'client': 'c.nom',
+    'quantite': 'v.quantite',
+    'montant': 'v.montant',
+}
+
+
+def construire_filtres(date_debut=None, date_fin=None, categories=None, produits=None, clients=None):
+    """Construit la clause WHERE paramétrée correspondant aux filtres du tableau de bord"""
+    conditions = []
+    params = []
+
+    if date_debut is not None:
+        conditions.append("v.date_vente >= ?")
+        params.append(pd.Timestamp(date_debut).strftime('%Y-%m-%d'))
+    if date_fin is not None:
+        # Borne exclusive au lendemain pour inclure les dates stockées avec une heure
+        conditions.append("v.date_vente < ?")
+        params.append((pd.Timestamp(date_fin) + pd.Timedelta(days=1)).strftime('%Y-%m-%d'))
+
+    for colonne, valeurs in (("p.categorie", categories), ("p.nom", produits), ("c.nom", clients)):
+        if valeurs:
+            valeurs = list(valeurs)
+            conditions.append(f"{colonne} IN ({', '.join('?' * len(valeurs))})")
+            params.extend(valeurs)
+
+    clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return clause, params
+
+
+def requete_ventes(date_debut=None, date_fin=None, categories=None, produits=None, clients=None,
+                    colonnes=None, limit=None, condition=None, params_condition=(), ordre=None):
+    """Construit la requête de sélection des ventes filtrées et ses paramètres"""
+    colonnes = list(colonnes) if colonnes else list(COLONNES_VENTES)
+    inconnues = [col for col in colonnes if col not in COLONNES_VENTES]
+    if inconnues:
+        raise ValueError(f"Colonnes inconnues: {inconnues}")
+
+    clause, params = construire_filtres(date_debut, date_fin, categories, produits, clients)
+    if condition:
+        clause = f"{clause} AND {condition}" if clause else f"WHERE {condition}"
+        params.extend(params_condition)
+    selection = ", ".join(f"{COLONNES_VENTES[col]} AS {col}" for col in colonnes)
+
+    # La jointure clients n'est utile que si l'on projette ou filtre sur le client
+    jointure_clients = ""
+    if 'client' in colonnes or clients:
+        jointure_clients = "LEFT JOIN clients c ON v.client_id = c.id"
+
+    query = f'''
+    SELECT {selection}
+    FROM ventes v
+    JOIN produits p ON v.produit_id = p.id
+    {jointure_clients}
+    {clause}
+    '''
+    if ordre:
+        query += f" ORDER BY {ordre}"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(int(limit))
+    return query, params
+
+
+# Expressions de regroupement par période, alignées sur les libellés de pandas (to_period)
+PERIODES_SQL = {
+    'Journalier': "date(v.date_vente)",
+    'Mensuel': "strftime('%Y-%m', v.date_vente)",
+    'Trimestriel': "strftime('%Y', v.date_vente) || 'Q' || ((CAST(strftime('%m', v.date_vente) AS INTEGER) + 2) / 3)",
+    'Annuel': "strftime('%Y', v.date_vente)",
+}
+
+# Axes de répartition et leur expression SQL
+REPARTITIONS_SQL = {
+    'categorie': 'p.categorie',
+    'client': 'c.nom',
+}
+
+
+# Table d'agrégats journaliers, utilisable pour toute granularité d'un jour ou plus
+TABLE_ROLLUP = 'ventes_daily'
+
+# Somme des montants en centimes entiers, arrondis vente par vente dans l'agrégat journalier :
+# exacte, donc identique quel que soit l'ordre de sommation (requête unique ou fusion des
+# partitions du chemin parallèle), et égale aux statistiques et à l'archive Parquet
+SOMME_CENTIMES = "SUM(v.centimes)"
+
+
+def requete_agregat(selection, regroupement, filtres, condition=None, ordre=None, limit=None, source=TABLE_ROLLUP):
+    """Construit la requête GROUP BY sur les ventes filtrées et ses paramètres"""
+    clause, params = construire_filtres(**filtres)
+    if condition:
+        clause = f"{clause} AND {condition}" if clause else f"WHERE {condition}"
+
+    query = f'''
+    SELECT {selection}
+    FROM {source} v
+    JOIN produits p ON v.produit_id = p.id
+    LEFT JOIN clients c ON v.client_id = c.id
+    {clause}
+    '''
+    if regroupement:
+        query += f" GROUP BY {regroupement}"
+    if ordre:
+        query += f" ORDER BY {ordre}"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(int(limit))
+    return query, params
+
+
+def agreger(selection, regroupement, filtres, condition=None, ordre=None, limit=None, source=TABLE_ROLLUP):
+    """Exécute une requête GROUP BY sur les ventes filtrées et retourne le petit résultat agrégé
+
+    Par défaut la requête lit l'agrégat journalier, qui expose les mêmes colonnes que ventes
+    (date_vente, produit_id, client_id, quantite, montant) plus centimes et nb_ventes.
+    """
+    query, params = requete_agregat(selection, regroupement, filtres, condition, ordre, limit, source)
+    with connexion() as conn:
+        df = pd.read_sql(query, conn, params=params)
+    return df
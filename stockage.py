@@ -0,0 +1,538 @@
+import argparse
+import functools
+import json
+import operator
+import os
+import re
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+import pandas as pd
+
+import db_config
+from db_config import connexion, lire_version
+from ecriture import attendre_ventes, soumettre_vente
+from requetes import COLONNES_VENTES, PERIODES_SQL, REPARTITIONS_SQL, SOMME_CENTIMES, agreger, requete_ventes
+
+# Axes d'agrégation communs aux moteurs : total, produit, catégorie, client et périodes
+AXES = ('total', 'produit', *REPARTITIONS_SQL, *PERIODES_SQL)
+
+# État de l'archive (préfixe '_' : ignoré à la lecture du jeu de données Parquet)
+FICHIER_ETAT = '_etat.json'
+
+# Nombre de fichiers d'ajout d'un mois au-delà duquel le mois est compacté en un seul fichier
+PARTS_MAX = 16
+
+# Nombre de lignes lues depuis le curseur SQLite à chaque bloc lors de l'export
+TAILLE_BLOC = 100000
+
+# Ventes jointes aux noms, avec le jour normalisé comme dans ventes_daily
+REQUETE_ARCHIVE = '''
+SELECT v.id, v.date_vente, COALESCE(date(v.date_vente), v.date_vente) AS jour, p.nom AS produit,
+       p.categorie, c.nom AS client, v.quantite, v.montant
+FROM ventes v
+JOIN produits p ON v.produit_id = p.id
+LEFT JOIN clients c ON v.client_id = c.id
+WHERE v.id > ? AND v.id <= ?
+ORDER BY v.date_vente
+'''
+
+_FICHIER_PART = re.compile(r'part-(\d+)-(\d+)\.parquet$')
+
+
+def _parts_couvertes(parts):
+    """Parts (id_debut, id_fin, chemin) dont la plage d'ids est incluse dans celle d'une autre part
+    du même mois : déjà recopiées dans une part compactée, restes d'un compactage interrompu"""
+    return [part for part in parts
+            if any(autre is not part and autre[0] <= part[0] and part[1] <= autre[1] for autre in parts)]
+
+
+def _nom_axe(axe):
+    if axe not in AXES:
+        raise ValueError(f"Axe d'agrégation inconnu: {axe}")
+    return 'periode' if axe in PERIODES_SQL else axe
+
+
+class Stockage(ABC):
+    """Surface commune des moteurs : lecture des ventes filtrées, ajout de ventes, agrégats par axe
+
+    agreger retourne les colonnes de clé (nom de l'axe, ou 'periode'), montant, quantite et
+    nb_ventes, triées par clé ; les montants sont sommés en centimes entiers.
+    """
+
+    nom = None
+
+    @abstractmethod
+    def lire_ventes(self, colonnes=None, **filtres):
+        """Ventes filtrées, avec les colonnes demandées (toutes celles de COLONNES_VENTES par défaut)"""
+
+    @abstractmethod
+    def inserer_ventes(self, ventes):
+        """Enregistre des ventes (date, produit_id, client_id, quantite) ; retourne {'id', 'montant'} par vente"""
+
+    @abstractmethod
+    def agreger(self, axe, **filtres):
+        """Sommes par valeur de l'axe sur les ventes filtrées"""
+
+    def synchroniser(self):
+        """Met le moteur au niveau de la base de référence (hors des lectures) ; sans effet par défaut"""
+
+
+class StockageSQLite(Stockage):
+    """Base SQLite de référence : seule source des écritures"""
+
+    nom = 'sqlite'
+
+    def lire_ventes(self, colonnes=None, **filtres):
+        query, params = requete_ventes(colonnes=colonnes, **filtres)
+        with connexion() as conn:
+            return pd.read_sql(query, conn, params=params)
+
+    def inserer_ventes(self, ventes):
+        """Enregistre des ventes (date, produit_id, client_id, quantite) via la file d'écriture groupée"""
+        return attendre_ventes([soumettre_vente(*vente) for vente in ventes])
+
+    def agreger(self, axe, **filtres):
+        nom = _nom_axe(axe)
+        expressions = {'total': "'total'", 'produit': 'p.nom', **REPARTITIONS_SQL, **PERIODES_SQL}
+        expression = expressions[axe]
+        condition = f"{expression} IS NOT NULL" if axe in REPARTITIONS_SQL else None
+        return agreger(
+            f"{expression} AS {nom}, {SOMME_CENTIMES} / 100.0 AS montant, "
+            "SUM(v.quantite) AS quantite, SUM(v.nb_ventes) AS nb_ventes",
+            expression, filtres, condition=condition, ordre=nom
+        )
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('id', pa.int64()), ('date_vente', pa.string()), ('jour', pa.string()), ('produit', pa.string()),
+        ('categorie', pa.string()), ('client', pa.string()), ('quantite', pa.int64()), ('montant', pa.float64()),
+    ])
+
+
+def _expression_filtres(colonne_date, date_debut=None, date_fin=None, categories=None, produits=None, clients=None):
+    """Filtre pyarrow équivalent à requetes.construire_filtres, avec élagage des partitions mensuelles"""
+    import pyarrow.compute as pc
+
+    conditions = []
+    if date_debut is not None:
+        debut = pd.Timestamp(date_debut).strftime('%Y-%m-%d')
+        conditions += [pc.field('mois') >= debut[:7], pc.field(colonne_date) >= debut]
+    if date_fin is not None:
+        # Borne exclusive au lendemain, comme en SQL
+        fin = (pd.Timestamp(date_fin) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+        conditions += [pc.field('mois') <= fin[:7], pc.field(colonne_date) < fin]
+    for colonne, valeurs in (('categorie', categories), ('produit', produits), ('client', clients)):
+        if valeurs:
+            conditions.append(pc.field(colonne).isin(list(valeurs)))
+    return functools.reduce(operator.and_, conditions) if conditions else None
+
+
+@contextmanager
+def _verrou_fichier(chemin, attendre=True):
+    """Verrou exclusif entre processus (et entre threads) posé sur un fichier
+
+    Produit True une fois le verrou pris, ou False aussitôt s'il est déjà pris et que attendre
+    est faux. Le système lève le verrou si le processus meurt, contrairement à un fichier témoin.
+    """
+    with open(chemin, 'a+b') as fichier:
+        if os.name == 'nt':
+            import msvcrt
+
+            def prendre():
+                fichier.seek(0)
+                msvcrt.locking(fichier.fileno(), msvcrt.LK_NBLCK, 1)
+
+            def rendre():
+                fichier.seek(0)
+                msvcrt.locking(fichier.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            def prendre():
+                fcntl.flock(fichier, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+            def rendre():
+                fcntl.flock(fichier, fcntl.LOCK_UN)
+
+        while True:
+            try:
+                prendre()
+                break
+            except OSError:
+                if not attendre:
+                    yield False
+                    return
+                time.sleep(0.1)
+        try:
+            yield True
+        finally:
+            rendre()
+
+
+class ArchiveParquet(Stockage):
+    """Copie colonnaire de ventes, un dossier Parquet par mois (mois=AAAA-MM), pour les agrégats
+
+    L'archive est dérivée de la base SQLite. Chaque lecture y ajoute d'abord les nouvelles ventes ;
+    après une modification ou suppression de ventes, produits ou clients (compteur generation),
+    elle est reconstruite hors des lectures, par le précalcul en arrière-plan ou en ligne de
+    commande, et les lectures sont servies par SQLite en attendant. Les écritures dans le dossier
+    se font sous un verrou de fichier partagé par tous les processus.
+    """
+
+    nom = 'parquet'
+
+    def __init__(self, dossier):
+        self.dossier = dossier
+        self._jeu = (None, None)
+
+    def etat(self):
+        """État de la dernière synchronisation (base, generation, id_max, nb_ventes), ou None"""
+        try:
+            with open(os.path.join(self.dossier, FICHIER_ETAT), encoding='utf-8') as fichier:
+                return json.load(fichier)
+        except FileNotFoundError:
+            return None
+
+    def _comparer(self, conn, reconstruire=False):
+        """Compare l'archive à la base : retourne l'action nécessaire (None, 'ajout' ou
+        'reconstruction'), l'état de l'archive et les compteurs de la base"""
+        _, generation = lire_version(conn)
+        id_max = conn.execute("SELECT COALESCE(MAX(id), 0) FROM ventes").fetchone()[0]
+        base = os.path.abspath(conn.execute("PRAGMA database_list").fetchone()[2])
+        etat = self.etat()
+        a_jour = (not reconstruire and etat is not None and etat['base'] == base
+                  and etat['generation'] == generation and etat['id_max'] <= id_max)
+        if a_jour and etat['id_max'] == id_max:
+            action = None
+        elif a_jour:
+            action = 'ajout'
+        else:
+            action = 'reconstruction'
+        return action, etat, {'base': base, 'generation': generation, 'id_max': id_max}
+
+    def synchroniser(self, reconstruire=False, ajout_seul=False):
+        """Met l'archive au niveau de la base et retourne son état
+
+        Avec ajout_seul (lectures, insertions), seules les nouvelles ventes sont ajoutées : si
+        l'archive doit être reconstruite, ou si une autre synchronisation tient le verrou,
+        retourne None sans attendre.
+        """
+        with connexion() as conn:
+            action, etat, _ = self._comparer(conn, reconstruire)
+        if action is None:
+            return etat
+        if ajout_seul and action == 'reconstruction':
+            return None
+
+        chemin_verrou = f"{os.path.abspath(self.dossier)}.lock"
+        os.makedirs(os.path.dirname(chemin_verrou), exist_ok=True)
+        with _verrou_fichier(chemin_verrou, attendre=not ajout_seul) as pris:
+            if not pris:
+                return None
+            with connexion() as conn:
+                # Compteurs et lignes lus dans le même instantané, pris sous le verrou : aucune
+                # autre synchronisation n'a pu porter l'archive au-delà de cet instantané
+                conn.execute("BEGIN")
+                try:
+                    action, etat, base = self._comparer(conn, reconstruire)
+                    if action == 'ajout':
+                        nb_ajouts = self._ajouter(conn, etat['id_max'], base['id_max'])
+                        etat = dict(etat, id_max=base['id_max'], nb_ventes=etat['nb_ventes'] + nb_ajouts)
+                        self._ecrire_etat(self.dossier, etat)
+                    elif action == 'reconstruction':
+                        if ajout_seul:
+                            return None
+                        etat = self._reconstruire(conn, **base)
+                finally:
+                    conn.rollback()
+        return etat
+
+    def _ecrire_etat(self, dossier, etat):
+        temporaire = os.path.join(dossier, f".{FICHIER_ETAT}.tmp")
+        with open(temporaire, 'w', encoding='utf-8') as fichier:
+            json.dump(dict(etat, synchronise_a=time.time()), fichier)
+        os.replace(temporaire, os.path.join(dossier, FICHIER_ETAT))
+
+    def _exporter(self, conn, dossier, id_min, id_max):
+        """Écrit les ventes d'id dans ]id_min, id_max] dans un fichier par mois ; retourne le nombre de lignes"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        schema = _schema()
+        ecrivains = {}
+        nb_lignes = 0
+        curseur = conn.execute(REQUETE_ARCHIVE, (id_min, id_max))
+        try:
+            while True:
+                lignes = curseur.fetchmany(TAILLE_BLOC)
+                if not lignes:
+                    break
+                valeurs = list(zip(*lignes))
+                table = pa.Table.from_arrays(
+                    [pa.array(valeurs[i], type=schema.field(i).type) for i in range(len(schema))], schema=schema
+                )
+                mois = pc.utf8_slice_codeunits(table['jour'], 0, 7)
+                # Les lignes arrivent triées par date : en général un seul mois par bloc
+                for valeur in pc.unique(mois).to_pylist():
+                    if valeur not in ecrivains:
+                        dossier_mois = os.path.join(dossier, f"mois={valeur}")
+                        os.makedirs(dossier_mois, exist_ok=True)
+                        ecrivains[valeur] = pq.ParquetWriter(
+                            os.path.join(dossier_mois, f"part-{id_min + 1}-{id_max}.parquet"), schema
+                        )
+                    ecrivains[valeur].write_table(table.filter(pc.equal(mois, valeur)))
+                nb_lignes += len(lignes)
+        finally:
+            curseur.close()
+            for ecrivain in ecrivains.values():
+                ecrivain.close()
+        return nb_lignes
+
+    def _reconstruire(self, conn, base, generation, id_max):
+        temporaire = f"{self.dossier}.tmp"
+        shutil.rmtree(temporaire, ignore_errors=True)
+        os.makedirs(temporaire)
+        nb_ventes = self._exporter(conn, temporaire, 0, id_max)
+        etat = {'base': base, 'generation': generation, 'id_max': id_max, 'nb_ventes': nb_ventes}
+        self._ecrire_etat(temporaire, etat)
+
+        # Remplacement par renommage : les lecteurs voient l'ancienne ou la nouvelle archive
+        ancien = f"{self.dossier}.ancien"
+        shutil.rmtree(ancien, ignore_errors=True)
+        if os.path.exists(self.dossier):
+            os.rename(self.dossier, ancien)
+        os.rename(temporaire, self.dossier)
+        shutil.rmtree(ancien, ignore_errors=True)
+        return etat
+
+    def _fichiers_mois(self):
+        """Fichiers de données par dossier de mois : {dossier: [(id_debut, id_fin, chemin)]}"""
+        fichiers = {}
+        for entree in os.scandir(self.dossier):
+            if entree.is_dir() and entree.name.startswith('mois='):
+                fichiers[entree.path] = sorted(
+                    (int(m.group(1)), int(m.group(2)), os.path.join(entree.path, nom))
+                    for nom in os.listdir(entree.path) if (m := _FICHIER_PART.match(nom))
+                )
+        return fichiers
+
+    def _ajouter(self, conn, id_archive, id_max):
+        import pyarrow.parquet as pq
+
+        # Restes d'une synchronisation interrompue : fichiers d'un ajout dont l'état n'a pas été
+        # écrit, et parts déjà recopiées dans une part compactée plus large
+        for parts in self._fichiers_mois().values():
+            couvertes = _parts_couvertes(parts)
+            for part in parts:
+                if part[1] > id_archive or part in couvertes:
+                    os.remove(part[2])
+
+        # Compactage des mois fragmentés par de nombreux petits ajouts, avant l'export : une part
+        # compactée ne contient que des ventes déjà enregistrées dans l'état de l'archive. Une
+        # interruption entre le renommage et les suppressions laisse des parts couvertes,
+        # ignorées à la lecture puis supprimées ci-dessus
+        for dossier_mois, parts in self._fichiers_mois().items():
+            if len(parts) > PARTS_MAX:
+                table = pq.read_table([chemin for _, _, chemin in parts], schema=_schema())
+                temporaire = os.path.join(dossier_mois, '.compactage.parquet')
+                pq.write_table(table, temporaire)
+                compacte = os.path.join(dossier_mois, f"part-{parts[0][0]}-{parts[-1][1]}.parquet")
+                os.replace(temporaire, compacte)
+                for _, _, chemin in parts:
+                    if chemin != compacte:
+                        os.remove(chemin)
+
+        return self._exporter(conn, self.dossier, id_archive, id_max)
+
+    def _jeu_donnees(self):
+        """Jeu de données Parquet de l'archive à jour, réutilisé tant qu'elle ne change pas ;
+        None tant qu'elle attend une reconstruction ou qu'une autre synchronisation est en cours"""
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        etat = self.synchroniser(ajout_seul=True)
+        if etat is None:
+            return None
+        cle, jeu = self._jeu
+        if cle != (etat['generation'], etat['id_max']):
+            # Fichiers listés explicitement, sans les parts couvertes par un compactage en cours
+            # ou interrompu : chaque vente n'est lue qu'une fois
+            chemins = [chemin for parts in self._fichiers_mois().values()
+                       for _, _, chemin in sorted(set(parts) - set(_parts_couvertes(parts)))]
+            partitionnement = ds.partitioning(pa.schema([('mois', pa.string())]), flavor='hive')
+            jeu = ds.dataset(chemins, schema=_schema().append(pa.field('mois', pa.string())), format='parquet',
+                             partitioning=partitionnement, partition_base_dir=self.dossier)
+            self._jeu = ((etat['generation'], etat['id_max']), jeu)
+        return jeu
+
+    def lire_ventes(self, colonnes=None, **filtres):
+        colonnes = list(colonnes) if colonnes else list(COLONNES_VENTES)
+        inconnues = [col for col in colonnes if col not in COLONNES_VENTES]
+        if inconnues:
+            raise ValueError(f"Colonnes inconnues: {inconnues}")
+        jeu = self._jeu_donnees()
+        if jeu is None:
+            return StockageSQLite().lire_ventes(colonnes, **filtres)
+        table = jeu.to_table(columns=colonnes, filter=_expression_filtres('date_vente', **filtres))
+        return table.to_pandas()
+
+    def inserer_ventes(self, ventes):
+        """Enregistre les ventes dans la base SQLite puis les reporte dans l'archive"""
+        resultats = StockageSQLite().inserer_ventes(ventes)
+        self.synchroniser(ajout_seul=True)
+        return resultats
+
+    def agreger(self, axe, **filtres):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        nom = _nom_axe(axe)
+        jeu = self._jeu_donnees()
+        if jeu is None:
+            return StockageSQLite().agreger(axe, **filtres)
+        source = 'jour' if axe in PERIODES_SQL else axe
+        colonnes = ['montant', 'quantite'] + ([] if axe == 'total' else [source])
+        table = jeu.to_table(columns=colonnes, filter=_expression_filtres('jour', **filtres))
+        if axe in REPARTITIONS_SQL:
+            table = table.filter(pc.is_valid(table[source]))
+
+        # Même arrondi vente par vente que db_config.CENTIMES : ROUND de SQLite arrondit les demis en s'éloignant de zéro
+        centimes = pc.cast(pc.round(pc.multiply(table['montant'], 100), round_mode='half_towards_infinity'),
+                           pa.int64())
+        if axe == 'total':
+            cle = pa.repeat('total', len(table))
+        elif axe in ('Mensuel', 'Annuel'):
+            cle = pc.utf8_slice_codeunits(table['jour'], 0, 7 if axe == 'Mensuel' else 4)
+        elif axe == 'Trimestriel':
+            trimestre = pc.divide(pc.add(pc.cast(pc.utf8_slice_codeunits(table['jour'], 5, 7), pa.int64()), 2), 3)
+            cle = pc.binary_join_element_wise(pc.utf8_slice_codeunits(table['jour'], 0, 4),
+                                              pc.cast(trimestre, pa.string()), 'Q')
+        else:
+            cle = table[source]
+
+        groupes = pa.table({'cle': cle, 'centimes': centimes, 'quantite': table['quantite']}).group_by('cle').aggregate(
+            [('centimes', 'sum'), ('quantite', 'sum'), ('centimes', 'count')]
+        )
+        df = pd.DataFrame({
+            nom: groupes['cle'].to_pandas(),
+            'montant': groupes['centimes_sum'].to_pandas() / 100.0,
+            'quantite': groupes['quantite_sum'].to_pandas(),
+            'nb_ventes': groupes['centimes_count'].to_pandas(),
+        })
+        return df.sort_values(nom, ignore_index=True)
+
+
+_archives = {}
+_verrou_archives = threading.Lock()
+
+
+def dossier_archive():
+    """Dossier de l'archive Parquet de la base courante"""
+    return db_config.ARCHIVE_PARQUET or f"{os.path.splitext(db_config.DB_PATH)[0]}_parquet"
+
+
+def archive(dossier=None):
+    """Archive Parquet partagée par le processus (une instance par dossier)"""
+    dossier = dossier or dossier_archive()
+    with _verrou_archives:
+        if dossier not in _archives:
+            _archives[dossier] = ArchiveParquet(dossier)
+        return _archives[dossier]
+
+
+def moteur_analytique():
+    """Moteur choisi pour les agrégats (VENTES_MOTEUR)"""
+    if db_config.MOTEUR_ANALYTIQUE == 'sqlite':
+        return StockageSQLite()
+    if db_config.MOTEUR_ANALYTIQUE == 'parquet':
+        return archive()
+    raise ValueError(f"Moteur analytique inconnu: {db_config.MOTEUR_ANALYTIQUE}")
+
+
+def jeux_parite():
+    """Jeux de filtres du contrôle de parité : sans filtre, une catégorie, un client, 90 derniers jours"""
+    with connexion() as conn:
+        categorie, = conn.execute("SELECT MIN(categorie) FROM produits").fetchone()
+        client, = conn.execute("SELECT MIN(nom) FROM clients").fetchone()
+        max_date, = conn.execute("SELECT MAX(date_vente) FROM ventes").fetchone()
+
+    jeux = [{}]
+    if categorie is not None:
+        jeux.append({'categories': [categorie]})
+    if client is not None:
+        jeux.append({'clients': [client]})
+    if max_date is not None:
+        fin = pd.Timestamp(max_date).normalize()
+        jeux.append({'date_debut': fin - pd.Timedelta(days=89), 'date_fin': fin})
+    return jeux
+
+
+def verifier_parite(reference=None, candidat=None, jeux=None):
+    """Compare lectures et agrégats de deux moteurs sur chaque axe et jeu de filtres
+
+    Retourne la liste des écarts ({'axe', 'filtres', 'detail'}) ; vide si les moteurs concordent.
+    Les montants sont comparés en centimes, les lectures triées par id.
+    """
+    reference = reference or StockageSQLite()
+    candidat = candidat or archive()
+    jeux = jeux_parite() if jeux is None else jeux
+    # Une archive en attente de reconstruction serait lue via SQLite : la parité ne prouverait rien
+    for moteur in (reference, candidat):
+        moteur.synchroniser()
+
+    def normaliser(df, cle):
+        df = df.sort_values(cle, ignore_index=True)
+        if 'montant' in df.columns:
+            df['montant'] = (df['montant'] * 100).round().astype('int64')
+        return df.astype({col: object for col in df.columns if df[col].dtype.kind not in 'if'})
+
+    ecarts = []
+    for filtres in jeux:
+        comparaisons = [('lecture', 'id', lambda moteur: moteur.lire_ventes(**filtres))]
+        comparaisons += [(axe, _nom_axe(axe), lambda moteur, axe=axe: moteur.agreger(axe, **filtres)) for axe in AXES]
+        for axe, cle, calcul in comparaisons:
+            try:
+                pd.testing.assert_frame_equal(normaliser(calcul(reference), cle), normaliser(calcul(candidat), cle),
+                                              check_dtype=False)
+            except AssertionError as e:
+                ecarts.append({'axe': axe, 'filtres': filtres, 'detail': str(e)})
+    return ecarts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Archive colonnaire Parquet des ventes : export, synchronisation et contrôle de parité",
+        epilog="Exemple : python stockage.py --base ventes.db exporter && python stockage.py parite ; "
+               "VENTES_MOTEUR=parquet streamlit run app.py"
+    )
+    parser.add_argument('--base', help="Base de ventes (par défaut VENTES_DB_PATH ou ventes.db)")
+    parser.add_argument('--dossier', help="Dossier de l'archive (par défaut <base>_parquet)")
+    commandes = parser.add_subparsers(dest='commande', required=True)
+    parser_exporter = commandes.add_parser('exporter', help="Crée ou met à jour l'archive depuis la base")
+    parser_exporter.add_argument('--reconstruire', action='store_true', help="Réécrit toute l'archive")
+    commandes.add_parser('parite', help="Compare lectures et agrégats de la base et de l'archive")
+
+    args = parser.parse_args()
+    if args.base:
+        db_config.configurer_base(args.base)
+    archive_parquet = archive(args.dossier)
+
+    debut = time.perf_counter()
+    if args.commande == 'exporter':
+        etat = archive_parquet.synchroniser(reconstruire=args.reconstruire)
+        print(f"Archive {archive_parquet.dossier} : {etat['nb_ventes']} ventes (id <= {etat['id_max']}) "
+              f"en {time.perf_counter() - debut:.1f} s")
+    else:
+        ecarts = verifier_parite(candidat=archive_parquet)
+        for ecart in ecarts:
+            print(f"Écart {ecart['axe']} {ecart['filtres']} :\n{ecart['detail']}\n")
+        print(f"Parité {'KO' if ecarts else 'OK'} ({len(ecarts)} écarts) en {time.perf_counter() - debut:.1f} s")
+        raise SystemExit(1 if ecarts else 0)
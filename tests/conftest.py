@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# Modules de l'application à la racine du dépôt ; pas de précalcul en arrière-plan pendant les tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('VENTES_PRECALCUL', '0')
+
+import cache  # noqa: E402
+import data_operations  # noqa: E402
+import db_config  # noqa: E402
+
+PRODUITS = [(1, 'Marteau', 'outillage', 12.5), (2, 'Tuyau', 'plomberie', 3.2), (3, 'Pinceau', 'peinture', 4.75)]
+CLIENTS = [(1, 'Dupont', None, None), (2, 'Martin', None, None)]
+
+
+@pytest.fixture
+def base(tmp_path, monkeypatch):
+    """Base vide (schéma et migrations appliqués) dans un dossier temporaire, caches vidés"""
+    chemin = str(tmp_path / 'ventes.db')
+    precedente = db_config.DB_PATH
+    # data_operations a copié TRAVAILLEURS à l'import : c'est sa copie qui décide du chemin parallèle
+    monkeypatch.setattr(data_operations, 'TRAVAILLEURS', 1)
+    db_config.configurer_base(chemin)
+    db_config.init_db()
+    cache._cache.vider()
+    cache.publier({})
+    cache.invalider()
+    yield chemin
+    db_config.configurer_base(precedente)
+    cache._cache.vider()
+    cache.invalider()
+
+
+@pytest.fixture
+def base_ancienne(tmp_path, monkeypatch):
+    """Base au schéma d'origine (avant toute migration) contenant déjà des ventes, migrée par init_db"""
+    chemin = str(tmp_path / 'ancienne.db')
+    conn = sqlite3.connect(chemin)
+    conn.executescript('''
+    CREATE TABLE clients (id INTEGER PRIMARY KEY AUTOINCREMENT, nom TEXT NOT NULL, email TEXT, telephone TEXT);
+    CREATE TABLE produits (id INTEGER PRIMARY KEY AUTOINCREMENT, nom TEXT NOT NULL, categorie TEXT NOT NULL,
+                           prix_unitaire REAL NOT NULL);
+    CREATE TABLE ventes (id INTEGER PRIMARY KEY AUTOINCREMENT, date_vente DATE NOT NULL, produit_id INTEGER NOT NULL,
+                         client_id INTEGER, quantite INTEGER NOT NULL, montant REAL NOT NULL);
+    INSERT INTO produits (nom, categorie, prix_unitaire) VALUES ('Marteau', 'outillage', 12.5), ('Vis', 'quincaillerie', 0.1);
+    INSERT INTO clients (nom) VALUES ('Dupont');
+    ''')
+    conn.executemany("INSERT INTO ventes (date_vente, produit_id, client_id, quantite, montant) VALUES (?, ?, ?, ?, ?)",
+                     [('2024-03-01', 1, 1, 2, 25.0), ('2024-03-01 14:30:00', 1, 1, 1, 12.5),
+                      ('2024-03-02', 2, None, 10, 1.0)] + [('2024-04-01', 2, 1, 1, 0.1)] * 300)
+    conn.commit()
+    conn.close()
+
+    precedente = db_config.DB_PATH
+    monkeypatch.setattr(data_operations, 'TRAVAILLEURS', 1)
+    db_config.configurer_base(chemin)
+    db_config.init_db()
+    cache._cache.vider()
+    cache.invalider()
+    yield chemin
+    db_config.configurer_base(precedente)
+    cache._cache.vider()
+    cache.invalider()
+
+
+def inserer_ventes(ventes):
+    """Insère des ventes (date, produit_id, client_id, quantite) en mettant à jour les tables dérivées"""
+    prix = {id_: prix_unitaire for id_, _, _, prix_unitaire in PRODUITS}
+    with db_config.connexion() as conn:
+        with conn:
+            id_max = conn.execute("SELECT COALESCE(MAX(id), 0) FROM ventes").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO ventes (date_vente, produit_id, client_id, quantite, montant) VALUES (?, ?, ?, ?, ?)",
+                [(jour, produit_id, client_id, quantite, quantite * prix[produit_id])
+                 for jour, produit_id, client_id, quantite in ventes]
+            )
+            db_config.cumuler_nouvelles_ventes(conn, id_max)
+            db_config.incrementer_version(conn)
+    cache.invalider()
+
+
+@pytest.fixture
+def base_remplie(base):
+    """Base avec trois produits, deux clients et quelques ventes réparties sur 2023 et 2024"""
+    with db_config.connexion() as conn:
+        with conn:
+            conn.executemany("INSERT INTO produits (id, nom, categorie, prix_unitaire) VALUES (?, ?, ?, ?)", PRODUITS)
+            conn.executemany("INSERT INTO clients (id, nom, email, telephone) VALUES (?, ?, ?, ?)", CLIENTS)
+    inserer_ventes([
+        (f"{annee}-{mois:02d}-{jour:02d}", 1 + (mois + jour) % 3, [1, 2, None][(mois * jour) % 3], 1 + jour % 4)
+        for annee in (2023, 2024) for mois in range(1, 13) for jour in (1, 9, 17, 25)
+    ])
+    return base
@@ -0,0 +1,27 @@
+import db_config
+from conftest import inserer_ventes
+
+SELECTION = f"SELECT id, date_vente, produit_id, client_id, quantite, montant FROM ventes " \
+            f"WHERE {db_config.CONDITION_ECHANTILLON} ORDER BY id"
+
+
+def _echantillon(conn):
+    return conn.execute("SELECT id, date_vente, produit_id, client_id, quantite, montant "
+                        "FROM ventes_echantillon ORDER BY id").fetchall()
+
+
+def test_echantillon_construit_depuis_les_ventes_existantes(base_ancienne):
+    conn = db_config.connect_db(base_ancienne)
+    # Exactement les ventes retenues par le hachage de l'id
+    assert _echantillon(conn) == conn.execute(SELECTION).fetchall()
+    conn.close()
+
+
+def test_echantillon_suit_les_insertions(base_remplie):
+    inserer_ventes([('2024-07-01', 1 + i % 3, [1, 2, None][i % 3], 1 + i % 4) for i in range(500)])
+    with db_config.connexion() as conn:
+        attendu = conn.execute(SELECTION).fetchall()
+        assert attendu and _echantillon(conn) == attendu
+    assert db_config.reconstruire_echantillon() == len(attendu)
+    with db_config.connexion() as conn:
+        assert _echantillon(conn) == attendu
@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+import db_config
+from ecriture import DelaiDepasse, FileEcritureVentes, attendre_ventes
+
+
+def _version(conn):
+    return db_config.lire_version(conn)[0]
+
+
+def _nb_ventes(conn):
+    return conn.execute("SELECT (SELECT COUNT(*) FROM ventes), (SELECT SUM(nb_ventes) FROM ventes_daily)").fetchone()
+
+
+def test_ventes_validees_en_groupe(base_remplie):
+    file = FileEcritureVentes(delai=0.2)
+    with db_config.connexion() as conn:
+        version = _version(conn)
+        futures = [file.soumettre('2025-02-01', 1 + i % 3, 1, 1 + i) for i in range(6)]
+        resultats = attendre_ventes(futures)
+        # Une seule transaction pour les six ventes : identifiants consécutifs, une seule version
+        ids = [resultat['id'] for resultat in resultats]
+        assert ids == list(range(ids[0], ids[0] + 6))
+        assert _version(conn) == version + 1
+        assert resultats[1]['montant'] == 2 * 3.2
+        assert conn.execute("SELECT SUM(nb_ventes) FROM ventes_daily WHERE date_vente = '2025-02-01'").fetchone()[0] == 6
+
+
+def test_erreur_isolee_dans_le_groupe(base_remplie):
+    file = FileEcritureVentes(delai=0.2)
+    futures = [file.soumettre('2025-02-01', 1, 1, 1), file.soumettre('2025-02-01', 99, 1, 1),
+               file.soumettre('2025-02-01', 2, 7, 1), file.soumettre('2025-02-01', 2, None, 1.5),
+               file.soumettre('pas une date', 2, None, 1), file.soumettre('2025-02-01', 3, None, 2)]
+    attendus = [None, 'Produit inconnu', 'Client inconnu', 'Quantité invalide', 'Date invalide', None]
+    for future, erreur in zip(futures, attendus):
+        if erreur is None:
+            assert future.result(5)['id'] > 0
+        else:
+            with pytest.raises(ValueError, match=erreur):
+                future.result(5)
+    with db_config.connexion() as conn:
+        assert conn.execute("SELECT produit_id FROM ventes WHERE date_vente = '2025-02-01' ORDER BY id").fetchall() \
+            == [(1,), (3,)]
+
+
+def test_vente_annulee_apres_delai_jamais_inseree(base_remplie):
+    file = FileEcritureVentes(delai=0.5)
+    with db_config.connexion() as conn:
+        avant = _nb_ventes(conn)
+    futures = [file.soumettre('2025-03-01', 1, 1, 1), file.soumettre('2025-03-01', 2, 2, 1)]
+    with pytest.raises(DelaiDepasse):
+        attendre_ventes(futures, delai=0.05)
+    assert all(future.cancelled() for future in futures)
+    # Le groupe est collecté puis écarté ; la vente suivante est validée normalement
+    time.sleep(0.6)
+    assert attendre_ventes([file.soumettre('2025-03-02', 3, None, 1)])[0]['id'] > 0
+    with db_config.connexion() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM ventes WHERE date_vente = '2025-03-01'").fetchone()[0] == 0
+        assert _nb_ventes(conn) == (avant[0] + 1, avant[1] + 1)
@@ -0,0 +1,17 @@
+import pytest
+
+import export
+
+
+def test_excel_une_feuille_par_tranche_de_lignes(base_remplie, monkeypatch, tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    monkeypatch.setattr(export, 'LIGNES_MAX_FEUILLE_EXCEL', 40)
+    chemin = str(tmp_path / 'ventes.xlsx')
+    export.exporter_ventes('Excel', chemin, taille_bloc=25, colonnes=['id', 'quantite'])
+    classeur = openpyxl.load_workbook(chemin, read_only=True)
+    assert classeur.sheetnames == ['ventes', 'ventes_2', 'ventes_3']
+    feuilles = [list(feuille.values) for feuille in classeur.worksheets]
+    assert [len(lignes) for lignes in feuilles] == [41, 41, 17]
+    assert all(lignes[0] == ('id', 'quantite') for lignes in feuilles)
+    assert [ligne[0] for lignes in feuilles for ligne in lignes[1:]] == list(range(1, 97))
+    classeur.close()
@@ -0,0 +1,36 @@
+import pandas as pd
+
+import data_operations as ops
+import db_config
+from conftest import inserer_ventes
+
+
+def _relu():
+    return ops.InstantaneVentes().rafraichir()
+
+
+def test_instantane_complete_par_ajout(base_remplie):
+    instantane = ops.InstantaneVentes()
+    assert len(instantane.rafraichir()) == 96
+    filigrane = instantane.filigrane
+    with db_config.connexion() as conn:
+        with conn:
+            conn.execute("INSERT INTO clients (id, nom) VALUES (3, 'Bernard')")
+    inserer_ventes([('2025-01-02', 1, 3, 10), ('2025-01-03', 2, None, 1)])
+    df = instantane.rafraichir()
+    # Seules les ventes d'id supérieur au filigrane ont été ajoutées, nouvelles catégories comprises
+    assert instantane.filigrane == filigrane + 2
+    pd.testing.assert_frame_equal(df, _relu(), check_categorical=False)
+    assert 'Bernard' in df['client'].cat.categories
+
+
+def test_instantane_recharge_apres_suppression(base_remplie):
+    instantane = ops.InstantaneVentes()
+    instantane.rafraichir()
+    with db_config.connexion() as conn:
+        with conn:
+            conn.execute("DELETE FROM ventes WHERE id <= 10")
+    ops.invalider()
+    df = instantane.rafraichir()
+    assert len(df) == 86
+    pd.testing.assert_frame_equal(df, _relu(), check_categorical=False)
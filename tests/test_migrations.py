@@ -0,0 +1,26 @@
+import db_config
+
+
+def _tables(conn):
+    return {nom for (nom,) in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")}
+
+
+def test_base_neuve_a_la_derniere_version(base):
+    conn = db_config.connect_db(base)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == db_config.MIGRATIONS[-1][0]
+    assert {'ventes_daily', 'ventes_echantillon', 'meta', 'stats_clients', 'stats_produits',
+            'idx_ventes_date', 'idx_ventes_daily_client', 'idx_stats_clients_centimes_total'} <= _tables(conn)
+    meta = dict(conn.execute("SELECT cle, valeur FROM meta").fetchall())
+    assert meta == {'version_donnees': 0, 'generation': 0, 'stats_generation': -1, 'stats_jour': 0}
+    # Ré-appliquer les migrations est sans effet
+    assert db_config.appliquer_migrations(conn) == db_config.MIGRATIONS[-1][0]
+    conn.close()
+
+
+def test_migration_base_existante(base_ancienne):
+    conn = db_config.connect_db(base_ancienne)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == db_config.MIGRATIONS[-1][0]
+    # Index ajoutés sans toucher aux ventes existantes
+    assert {'idx_ventes_date', 'idx_ventes_produit_date', 'idx_ventes_client_date'} <= _tables(conn)
+    assert conn.execute("SELECT COUNT(*), SUM(quantite) FROM ventes").fetchone() == (303, 313)
+    conn.close()
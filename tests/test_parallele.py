@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+import data_operations as ops
+import parallele
+from requetes import PERIODES_SQL
+
+FILTRES = [{}, {'date_debut': '2023-03-10', 'date_fin': '2024-08-20', 'categories': ['outillage', 'peinture']}]
+
+
+def _agregats(filtres):
+    resultats = {'kpis': ops.get_kpis.sans_cache(**filtres)}
+    for periode in PERIODES_SQL:
+        resultats[periode] = ops.agreger_par_periode.sans_cache(periode, **filtres)
+    for critere in ('quantite', 'montant'):
+        resultats[f'top_{critere}'] = ops.agreger_top_produits.sans_cache(None, critere, **filtres)
+    for by in ('categorie', 'client'):
+        resultats[f'repartition_{by}'] = ops.agreger_repartition.sans_cache(by, **filtres)
+    return resultats
+
+
+@pytest.fixture
+def pool():
+    yield
+    executeur = parallele._pool['executeur']
+    if executeur is not None:
+        executeur.shutdown()
+    parallele._pool['executeur'] = None
+
+
+@pytest.mark.parametrize('filtres', FILTRES)
+def test_parallele_egal_serie(base_remplie, pool, monkeypatch, filtres):
+    serie = _agregats(filtres)
+    monkeypatch.setattr(ops, 'TRAVAILLEURS', 2)
+    monkeypatch.setattr(ops, 'SEUIL_PARALLELE', 0)
+    assert ops._utiliser_parallele()
+    parallele_ = _agregats(filtres)
+    assert parallele._pool['taille'] == 2
+    assert parallele_.pop('kpis') == serie.pop('kpis')
+    for nom, attendu in serie.items():
+        pd.testing.assert_frame_equal(parallele_[nom], attendu, check_dtype=False, obj=nom)
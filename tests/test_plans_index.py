@@ -0,0 +1,16 @@
+import db_config
+from data_operations import verifier_plans_index
+
+
+def test_requetes_du_tableau_de_bord_indexees(base_remplie):
+    plans = verifier_plans_index()
+    assert {'rollup_periode', 'rollup_produit', 'rollup_client', 'rollup_categorie', 'historique_client'} <= set(plans)
+    assert [nom for nom, plan in plans.items() if not plan['utilise_index']] == []
+
+
+def test_index_manquant_detecte(base_remplie):
+    with db_config.connexion() as conn:
+        conn.execute("DROP INDEX idx_ventes_daily_client")
+    plans = verifier_plans_index()
+    assert not plans['historique_client']['utilise_index']
+    assert plans['rollup_periode']['utilise_index']
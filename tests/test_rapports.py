@@ -0,0 +1,24 @@
+import json
+
+import pandas as pd
+import pytest
+
+import rapports
+
+
+def test_fenetre_et_dates_incompatibles(base_remplie, tmp_path):
+    with pytest.raises(ValueError, match="fenêtre"):
+        rapports.ensembles_filtres(fenetre="Mois en cours", date_fin='2024-06-30')
+    fichier = tmp_path / 'filtres.json'
+    fichier.write_text(json.dumps([{'nom': 'juin', 'fenetre': "Mois en cours", 'date_debut': '2024-06-01'}]),
+                       encoding='utf-8')
+    with pytest.raises(ValueError, match="fenêtre"):
+        rapports.ensembles_filtres(fichier=str(fichier))
+
+
+def test_tableaux_sans_images(tmp_path):
+    pytest.importorskip('pyarrow')
+    resultats = {'repartition_categorie': (pd.DataFrame({'categorie': ['outillage'], 'montant': [12.5]}),
+                                           ('categorie',))}
+    fichiers = rapports.produire_jeu(str(tmp_path), 'global', resultats, images=(), tables=('parquet',))
+    assert fichiers == [str(tmp_path / 'global_repartition_categorie.parquet')]
@@ -0,0 +1,45 @@
+import db_config
+from conftest import inserer_ventes
+
+# Agrégat journalier recalculé directement depuis ventes, pour comparaison
+ATTENDU = f'''
+SELECT COALESCE(date(date_vente), date_vente), produit_id, COALESCE(client_id, 0),
+       ROUND(SUM(montant), 6), SUM({db_config.CENTIMES}), SUM(quantite), COUNT(*)
+FROM ventes GROUP BY 1, 2, 3 ORDER BY 1, 2, 3
+'''
+
+
+def _rollup(conn):
+    return conn.execute("SELECT date_vente, produit_id, client_id, ROUND(montant, 6), centimes, quantite, nb_ventes "
+                        "FROM ventes_daily ORDER BY 1, 2, 3").fetchall()
+
+
+def test_rollup_construit_depuis_les_ventes_existantes(base_ancienne):
+    conn = db_config.connect_db(base_ancienne)
+    # Dates ramenées au jour, ventes anonymes sous le client 0
+    assert conn.execute(
+        "SELECT date_vente, produit_id, client_id, montant, quantite, nb_ventes FROM ventes_daily "
+        "WHERE date_vente < '2024-04-01' ORDER BY 1, 2, 3"
+    ).fetchall() == [('2024-03-01', 1, 1, 37.5, 3, 2), ('2024-03-02', 2, 0, 1.0, 10, 1)]
+    assert _rollup(conn) == conn.execute(ATTENDU).fetchall()
+    conn.close()
+
+
+def test_rollup_suit_insertions_modifications_et_suppressions(base_remplie):
+    inserer_ventes([('2024-06-09 10:00:00', 2, 1, 5), ('2024-06-09', 2, 1, 1), ('2024-06-10', 3, None, 2)])
+    with db_config.connexion() as conn:
+        with conn:
+            conn.execute("UPDATE ventes SET quantite = quantite + 1, montant = montant * 2 WHERE id % 5 = 0")
+            conn.execute("UPDATE ventes SET date_vente = '2022-12-31', client_id = NULL WHERE id % 7 = 0")
+            conn.execute("DELETE FROM ventes WHERE id % 11 = 0")
+        assert _rollup(conn) == conn.execute(ATTENDU).fetchall()
+        # Aucun groupe vidé ne subsiste
+        assert conn.execute("SELECT COUNT(*) FROM ventes_daily WHERE nb_ventes <= 0").fetchone()[0] == 0
+
+
+def test_reconstruction_identique(base_remplie):
+    with db_config.connexion() as conn:
+        avant = _rollup(conn)
+    assert db_config.reconstruire_ventes_daily() == len(avant)
+    with db_config.connexion() as conn:
+        assert _rollup(conn) == avant
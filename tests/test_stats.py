@@ -0,0 +1,126 @@
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+import data_operations as ops
+import db_config
+from conftest import inserer_ventes
+
+ENTITES = ('client', 'produit')
+
+
+def _stats(conn, entite):
+    return conn.execute(f"SELECT {entite}_id, {db_config.COLONNES_STATS} FROM stats_{entite}s ORDER BY 1").fetchall()
+
+
+def _reference(conn, entite, jour=None):
+    return conn.execute(f"SELECT * FROM ({db_config.requete_stats(entite, jour)}) ORDER BY 1").fetchall()
+
+
+def _meta(conn):
+    return dict(conn.execute("SELECT cle, valeur FROM meta").fetchall())
+
+
+def test_base_migree_reconstruite(base_ancienne):
+    conn = db_config.connect_db(base_ancienne)
+    # Statistiques vides et marquées à reconstruire après la migration d'une base existante
+    assert not db_config.stats_a_jour(conn)
+    assert db_config.actualiser_stats(conn)
+    for entite in ENTITES:
+        assert _stats(conn, entite) == _reference(conn, entite)
+    assert conn.execute("SELECT centimes_total, nb_ventes FROM stats_clients").fetchall() == [(6750, 302)]
+    conn.close()
+
+
+def test_insertion_avant_premiere_lecture(base_remplie):
+    # Statistiques jamais construites (stats_jour = 0) : les insertions ne doivent pas échouer
+    resultat = ops.insert_vente(date.today(), 1, 1, 2)
+    assert resultat['montant'] == 25.0
+    with db_config.connexion() as conn:
+        assert _meta(conn)['stats_jour'] == 0
+        assert conn.execute("SELECT COUNT(*) FROM stats_clients").fetchone()[0] == 0
+
+
+def test_lecture_sans_reconstruction(base_remplie):
+    with db_config.connexion() as conn:
+        avant = _meta(conn)
+        attendu = _reference(conn, 'client')
+    classement = ops.classement_clients('montant_total', limit=None)
+    # Calcul à la volée depuis l'agrégat, sans écriture dans les tables de statistiques
+    with db_config.connexion() as conn:
+        assert _meta(conn) == avant
+        assert conn.execute("SELECT COUNT(*) FROM stats_clients").fetchone()[0] == 0
+    assert sorted(classement['client_id']) == [ligne[0] for ligne in attendu]
+    totaux = {ligne[0]: ligne[1] / 100 for ligne in attendu}
+    assert dict(zip(classement['client_id'], classement['montant_total'])) == pytest.approx(totaux)
+
+
+def test_cumul_incremental_egal_reconstruction(base_remplie):
+    with db_config.connexion() as conn:
+        assert db_config.actualiser_stats(conn)
+        assert db_config.stats_a_jour(conn)
+        assert not db_config.actualiser_stats(conn)
+    aujourd_hui = date.today()
+    inserer_ventes([(aujourd_hui.isoformat(), 2, 1, 3), ((aujourd_hui - timedelta(days=45)).isoformat(), 3, 2, 1),
+                    ('2020-06-01', 1, None, 1), ('2025-01-01 08:15:00', 1, 2, 2)])
+    with db_config.connexion() as conn:
+        assert db_config.stats_a_jour(conn)
+        for entite in ENTITES:
+            assert _stats(conn, entite) == _reference(conn, entite)
+
+
+def test_suppression_puis_reconstruction(base_remplie):
+    with db_config.connexion() as conn:
+        db_config.actualiser_stats(conn)
+        with conn:
+            conn.execute("DELETE FROM ventes WHERE id IN (SELECT id FROM ventes WHERE client_id = 1 LIMIT 5)")
+        assert not db_config.stats_a_jour(conn)
+    # Les lectures ne voient pas les statistiques périmées
+    classement = ops.classement_clients('nb_ventes', limit=None)
+    with db_config.connexion() as conn:
+        nb_ventes = dict(conn.execute("SELECT client_id, COUNT(*) FROM ventes WHERE client_id IS NOT NULL "
+                                      "GROUP BY client_id").fetchall())
+        assert dict(zip(classement['client_id'], classement['nb_ventes'])) == nb_ventes
+        assert db_config.actualiser_stats(conn)
+        for entite in ENTITES:
+            assert _stats(conn, entite) == _reference(conn, entite)
+
+
+def test_changement_de_jour(base_remplie):
+    aujourd_hui = date.today()
+    inserer_ventes([((aujourd_hui - timedelta(days=d)).isoformat(), 1 + d % 3, 1 + d % 2, 1) for d in range(0, 120, 7)])
+    with db_config.connexion() as conn:
+        db_config.actualiser_stats(conn, aujourd_hui)
+        lendemain = aujourd_hui + timedelta(days=40)
+        assert not db_config.stats_a_jour(conn, lendemain)
+        assert db_config.actualiser_stats(conn, lendemain)
+        for entite in ENTITES:
+            assert _stats(conn, entite) == _reference(conn, entite, lendemain)
+
+
+def test_top_produits_depuis_les_stats(base_remplie):
+    attendu = ops.agreger_top_produits.sans_cache(None, critere='montant')
+    with db_config.connexion() as conn:
+        db_config.actualiser_stats(conn)
+    assert ops._lecture_stats_possible('produits', {})
+    pd.testing.assert_frame_equal(ops.agreger_top_produits.sans_cache(None, critere='montant'), attendu,
+                                  check_dtype=False)
+
+
+def test_arrondi_des_prix_hors_centimes(base_remplie):
+    # 0,335 € : trois ventes arrondies une à une font 1,02 €, leur somme arrondie seulement 1,01 €
+    with db_config.connexion() as conn:
+        db_config.actualiser_stats(conn)
+        with conn:
+            conn.execute("INSERT INTO produits (id, nom, categorie, prix_unitaire) VALUES (4, 'Vis', 'quincaillerie', 0.335)")
+            id_max = conn.execute("SELECT MAX(id) FROM ventes").fetchone()[0]
+            conn.executemany("INSERT INTO ventes (date_vente, produit_id, client_id, quantite, montant) "
+                             "VALUES (?, 4, 1, 1, 0.335)", [('2024-05-02',)] * 3)
+            db_config.cumuler_nouvelles_ventes(conn, id_max)
+            db_config.incrementer_version(conn)
+        for entite in ENTITES:
+            assert _stats(conn, entite) == _reference(conn, entite)
+        assert conn.execute("SELECT centimes_total FROM stats_produits WHERE produit_id = 4").fetchone()[0] == 102
+    top = ops.agreger_top_produits.sans_cache(None, critere='montant')
+    assert top.loc['Vis', 'montant'] == pytest.approx(1.02)
@@ -1,30 +1,92 @@
-from turtle import st
-import matplotlib.pyplot as plt
-import seaborn as sns
+import hashlib
+import io
+import numpy as np
 import pandas as pd
-import streamlit
-import streamlit as st
+from cache import CacheLRU
+from instrumentation import mesurer
 
-def plot_ventes_par_periode(df, periode):
-    """Visualise les ventes par période (mensuelle, trimestrielle, annuelle)"""
-    df_period = df.copy()
-    df_period['date_vente'] = pd.to_datetime(df_period['date_vente'])
+def marge(df, colonne):
+    """Demi-largeur de l'intervalle de confiance d'une colonne estimée (colonne_marge), ou None si exacte"""
+    return df[f'{colonne}_marge'] if f'{colonne}_marge' in df.columns else None
 
-    if periode == 'Mensuel':
-        df_period['periode'] = df_period['date_vente'].dt.to_period('M')
+
+# Images PNG déjà rendues, indexées par graphique et empreinte des données agrégées
+_cache_figures = CacheLRU(taille_max=64, ttl=3600)
+
+
+def empreinte_donnees(df):
+    """Calcule une empreinte stable du contenu (valeurs et index) d'un DataFrame ou d'une Series"""
+    valeurs = pd.util.hash_pandas_object(df, index=True).values
+    colonnes = repr(list(df.columns)) if isinstance(df, pd.DataFrame) else repr(df.name)
+    return hashlib.sha1(valeurs.tobytes() + colonnes.encode()).hexdigest()
+
+
+def rendre_en_cache(fonction_plot, donnees, *args, **kwargs):
+    """Rend un graphique en PNG une seule fois pour des données agrégées données
+
+    Retourne (image PNG ou None, tableau de données) ; les entrées les moins récemment
+    utilisées sont évincées.
+    """
+    cle = (fonction_plot.__name__, empreinte_donnees(donnees), args, tuple(sorted(kwargs.items())))
+    trouve, resultat = _cache_figures.obtenir(cle)
+    if trouve:
+        return resultat
+
+    # Import différé : matplotlib n'est chargé qu'au premier graphique rendu
+    import matplotlib.pyplot as plt
+
+    with mesurer(f"rendu.{fonction_plot.__name__}", lignes=len(donnees)) as span:
+        fig, tableau = fonction_plot(donnees, *args, **kwargs)
+        image = None
+        if fig is not None:
+            tampon = io.BytesIO()
+            fig.savefig(tampon, format='png', bbox_inches='tight')
+            plt.close(fig)
+            image = tampon.getvalue()
+            span.attributs['octets'] = len(image)
+
+    resultat = (image, tableau)
+    _cache_figures.stocker(cle, resultat)
+    return resultat
+
+
+def plot_par_produit(df_produits, colonne, palette='viridis', ylabel='', format_valeur='{:.2f}'):
+    """Visualise une mesure déjà agrégée par produit (montant ou quantité) avec ses valeurs annotées"""
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 4))
+    barres = ax.bar(
+        df_produits.index.astype(str),
+        df_produits[colonne],
+        yerr=marge(df_produits, colonne),
+        capsize=3,
+        color=plt.get_cmap(palette)(np.linspace(0.1, 0.9, len(df_produits)))
+    )
+    ax.bar_label(barres, labels=[format_valeur.format(v) for v in df_produits[colonne]], padding=3)
+    ax.tick_params(axis='x', rotation=45)
+    ax.set_ylabel(ylabel)
+    ax.set_xlabel("")
+    plt.tight_layout()
+
+    return fig, df_produits[[c for c in (colonne, f'{colonne}_marge') if c in df_produits.columns]]
+
+
+def plot_ventes_par_periode(df_grouped, periode):
+    """Visualise les ventes par période (mensuelle, trimestrielle, annuelle) à partir des agrégats"""
+    import matplotlib.pyplot as plt
+
+    if periode == 'Journalier':
+        title = "Ventes journalières"
+    elif periode == 'Mensuel':
         title = "Ventes mensuelles"
     elif periode == 'Trimestriel':
-        df_period['periode'] = df_period['date_vente'].dt.to_period('Q')
         title = "Ventes trimestrielles"
     else:  # Annuel
-        df_period['periode'] = df_period['date_vente'].dt.to_period('Y')
         title = "Ventes annuelles"
 
-    df_grouped = df_period.groupby('periode').agg({'montant': 'sum', 'quantite': 'sum'}).reset_index()
-    df_grouped['periode'] = df_grouped['periode'].astype(str)
-
     fig, ax = plt.subplots(figsize=(10, 5))
-    ax.bar(df_grouped['periode'], df_grouped['montant'], color='skyblue')
+    ax.bar(df_grouped['periode'], df_grouped['montant'], yerr=marge(df_grouped, 'montant'), capsize=3,
+           color='skyblue')
     ax.set_title(title)
     ax.set_xlabel('Période')
     ax.set_ylabel('Montant total')
@@ -33,34 +95,23 @@ def plot_ventes_par_periode(df, periode):
     return fig, df_grouped
 
 
-def plot_top_produits(df, top_n=5):
-    """Visualise les top produits par quantité et montant"""
+def plot_top_produits(df_top, top_n=5):
+    """Visualise les top produits par quantité et montant à partir des agrégats"""
+    import matplotlib.pyplot as plt
+    import streamlit as st
+
     # Vérification des colonnes nécessaires
-    required_columns = ['produit', 'quantite', 'montant']
-    missing_cols = [col for col in required_columns if col not in df.columns]
+    required_columns = ['quantite', 'montant']
+    missing_cols = [col for col in required_columns if col not in df_top.columns]
 
     if missing_cols:
         raise ValueError(f"Colonnes manquantes dans le DataFrame: {missing_cols}")
 
-    # Conversion des colonnes numériques
-    df = df.copy()
-    df['quantite'] = pd.to_numeric(df['quantite'], errors='coerce')
-    df['montant'] = pd.to_numeric(df['montant'], errors='coerce')
-
-    # Vérification des valeurs NaN après conversion
-    if df['quantite'].isna().any() or df['montant'].isna().any():
-        st.warning("Certaines valeurs numériques sont invalides et ont été remplacées par NaN")
-
-    # Agrégation des données
-    df_top = df.groupby('produit').agg({'quantite': 'sum', 'montant': 'sum'})
-
     # Vérification si le DataFrame est vide
     if df_top.empty:
         st.warning("Aucune donnée disponible pour le graphique")
         return None, df_top
-    if df_top.empty:
-        streamlit.warning("Aucune donnée disponible pour le graphique")
-        return None, df_top
+
     # Sélection des top produits
     df_top = df_top.sort_values('quantite', ascending=False).head(top_n)
 
@@ -69,8 +120,11 @@ def plot_top_produits(df, top_n=5):
 
     try:
         # Top produits par quantité
-        df_top.sort_values('quantite', ascending=True).plot.barh(
+        par_quantite = df_top.sort_values('quantite', ascending=True)
+        par_quantite.plot.barh(
             y='quantite',
+            xerr=marge(par_quantite, 'quantite'),
+            capsize=3,
             ax=ax1,
             color='green',
             xlabel='Quantité vendue'
@@ -78,8 +132,11 @@ def plot_top_produits(df, top_n=5):
         ax1.set_title(f'Top {top_n} produits (quantité)')
 
         # Top produits par montant
-        df_top.sort_values('montant', ascending=True).plot.barh(
+        par_montant = df_top.sort_values('montant', ascending=True)
+        par_montant.plot.barh(
             y='montant',
+            xerr=marge(par_montant, 'montant'),
+            capsize=3,
             ax=ax2,
             color='orange',
             xlabel='Montant total'
@@ -95,22 +152,21 @@ def plot_top_produits(df, top_n=5):
     return fig, df_top
 
 
-def plot_repartition(df, by='categorie'):
-    """Visualise la répartition des ventes par catégorie ou client"""
+def plot_repartition(df_repartition, by='categorie'):
+    """Visualise la répartition des ventes par catégorie ou client à partir des agrégats"""
+    import matplotlib.pyplot as plt
 
     # Vérification des données d'entrée
-    if df.empty or 'montant' not in df.columns:
+    if df_repartition.empty or 'montant' not in df_repartition.columns:
         raise ValueError("Le DataFrame est vide ou ne contient pas de colonne 'montant'")
+    if by not in df_repartition.columns:
+        raise ValueError(f"La colonne '{by}' n'existe pas dans le DataFrame")
 
+    data = df_repartition.set_index(by)['montant']
+    marges = marge(df_repartition.set_index(by), 'montant')
     if by == 'categorie':
-        if 'categorie' not in df.columns:
-            raise ValueError("La colonne 'categorie' n'existe pas dans le DataFrame")
-        data = df.groupby('categorie')['montant'].sum()
         title = "Répartition par catégorie"
     else:  # par client
-        if 'client' not in df.columns:
-            raise ValueError("La colonne 'client' n'existe pas dans le DataFrame")
-        data = df.groupby('client')['montant'].sum().nlargest(10)
         title = "Top 10 clients par montant"
 
     # Vérification qu'il y a des données à afficher
@@ -134,8 +190,11 @@ def plot_repartition(df, by='categorie'):
         ax1.axis('off')  # Cache le subplot s'il y a trop de catégories
 
     # Barplot
-    data.sort_values(ascending=False).plot.bar(
+    data_triee = data.sort_values(ascending=False)
+    data_triee.plot.bar(
         ax=ax2,
+        yerr=marges.reindex(data_triee.index) if marges is not None else None,
+        capsize=3,
         color='skyblue'
     )
     ax2.set_title(f"{title} (en valeur absolue)")
@@ -144,4 +203,7 @@ def plot_repartition(df, by='categorie'):
 
     plt.tight_layout()
 
-    return fig, data.reset_index()
+    tableau = data.reset_index()
+    if marges is not None:
+        tableau['montant_marge'] = marges.to_numpy()
+    return fig, tableau